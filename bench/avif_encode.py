@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""AVIF encode of a composited mosaic: write_to_memory → PIL vs viz.build_mosaic.
+
+Usage:  python bench/avif_encode.py [--canvas 16384] [--n 2000] [--effort 2] [--threads 8]
+
+Composites --n of bench/mosaic.py's synthetic thumbnails (read through
+thumbcache.py) onto a --canvas² canvas and encodes it. "pillow" is the
+previous build_mosaic tail, composited the same way: write_to_memory, a
+NumPy view, Image.fromarray and pillow-avif (quality 80, speed 6, one
+thread). "heifsave" calls viz.build_mosaic itself (canvas size, thumbnail
+dir and output dir pointed at the bench's), which streams the pipeline into
+libheif's AV1 encoder at viz.AVIF_Q, --effort and --threads. Each variant
+runs in a fresh interpreter against a throw-away DR_DB/DR_CACHE and reports
+encode time, peak RSS (ru_maxrss, compositing included) and file size; a
+variant killed for lack of memory is reported as such.
+"""
+import argparse, json, os, shutil, subprocess, sys, tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from mosaic import thumbnails                      # bench/mosaic.py
+
+CHILD = r"""
+import json, os, resource, sys, time
+from pathlib import Path
+sys.path.insert(0, sys.argv[1])
+import numpy as np
+import pyvips
+import viz, mosaic, thumbcache
+thumbs, n, side, variant, effort, threads, out = (sys.argv[2], int(sys.argv[3]), int(sys.argv[4]),
+                                                  sys.argv[5], int(sys.argv[6]), int(sys.argv[7]),
+                                                  sys.argv[8])
+names = np.array([f"t{i % 5000}.avif" for i in range(n)])
+x, y = viz.normalise(np.random.default_rng(0).standard_normal((n, 2)), side, side)
+scale = viz.thumb_scale(n, side)
+load = thumbcache.ThumbCache(thumbs).load
+if variant == "pillow":
+    import pillow_avif
+    from PIL import Image
+    cell = max(1, round(viz.THUMB_PX * scale))
+    comp = mosaic.Compositor(thumbs, names, x, y, cell, side, side, load=load)
+    arr = np.zeros((side, side, 3), np.uint8)
+    for tx, ty, tile in comp.tiles():
+        arr[ty * comp.tile:ty * comp.tile + tile.shape[0],
+            tx * comp.tile:tx * comp.tile + tile.shape[1]] = tile
+    canvas = pyvips.Image.new_from_memory(arr.data, side, side, 3, format="uchar")
+    t0 = time.perf_counter()
+    raw = canvas.write_to_memory()
+    img = Image.fromarray(np.frombuffer(raw, np.uint8).reshape((side, side, 3)), mode="RGB")
+    img.save(out, format="AVIF", quality=80)
+    dt = time.perf_counter() - t0
+else:
+    viz.CANVAS_W = viz.CANVAS_H = side
+    viz.THUMB_DIR, viz.OUT_DIR = Path(thumbs), Path(out).parent
+    pts = {"filenames": names, "viz_x": x, "viz_y": y}
+    dt = viz.build_mosaic(pts, scale, out, "bench", load=load, effort=effort,
+                          encode_threads=threads)["encode_s"]
+print(json.dumps({"seconds": dt, "peak_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                  / 1024, "bytes": os.path.getsize(out)}))
+"""
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--canvas", type=int, default=16_384)
+    ap.add_argument("--n", type=int, default=2_000)
+    ap.add_argument("--effort", type=int, default=2, help="heifsave effort, 0-9")
+    ap.add_argument("--threads", type=int, default=os.cpu_count())
+    args = ap.parse_args()
+
+    root = thumbnails(5000)
+    tmp = tempfile.mkdtemp(prefix="dr_bench_")
+    env = dict(os.environ, DR_DB=os.path.join(tmp, "bench.sqlite"),
+               DR_CACHE=os.path.join(tmp, "cache"))
+    subprocess.run([sys.executable, os.path.join(ROOT, "thumbcache.py"), "build", "--dir", root],
+                   capture_output=True, text=True, env=env, check=True)
+    print(f"{args.canvas:,}² canvas ({args.canvas ** 2 * 3 / 2**20:,.0f} MiB raw), "
+          f"n={args.n:,}, {os.cpu_count()} CPUs")
+    for variant in ("pillow", "heifsave"):
+        p = subprocess.run(
+            [sys.executable, "-c", CHILD, ROOT, root, str(args.n), str(args.canvas), variant,
+             str(args.effort), str(args.threads), os.path.join(tmp, f"{variant}.avif")],
+            capture_output=True, text=True, env=env,
+        )
+        if p.returncode != 0:
+            why = "killed (out of memory?)" if p.returncode < 0 else p.stderr.strip().splitlines()[-1]
+            print(f"{variant:>9}: {why}")
+            continue
+        r = json.loads(p.stdout.strip().splitlines()[-1])
+        print(f"{variant:>9}: encode {r['seconds']:7.1f}s  peak RSS {r['peak_mib']:7,.0f} MiB  "
+              f"{r['bytes'] / 2**20:6.1f} MiB file")
+    shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
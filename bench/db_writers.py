@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""Stress test: N processes × T threads writing configs + points concurrently.
+
+Usage:  python bench/db_writers.py --procs 8 --threads 4 --runs 25
+        python bench/db_writers.py --mode legacy      # old per-call connections
+
+Writes to a throw-away database in a temp dir and reports wall time,
+runs/s and how many writes failed with "database is locked".
+"""
+import argparse, multiprocessing as mp, os, sys, tempfile, threading, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def worker(proc_idx: int, threads: int, runs: int, points: int, out: "mp.Queue"):
+    sys.path.insert(0, ROOT)
+    import db   # DR_DB / DR_DB_MODE come from the parent's environment
+
+    # projection_runs only stores the rowids, so the bench needs no embeddings
+    meta = [{"rowid": i + 1, "filename": f"f{i}.avif", "artist": "bench"} for i in range(points)]
+    coords = [(float(i), float(-i)) for i in range(points)]
+    errors, done = [], [0]
+    lock = threading.Lock()
+
+    def loop(t_idx: int):
+        for r in range(runs):
+            key = (proc_idx * threads + t_idx) * runs + r
+            try:
+                cfg_id = db.upsert_config(
+                    "umap", {"n_neighbors": key, "random_state": 0},
+                    "random", points, 0.0
+                )
+                db.save_points("umap", cfg_id, meta, coords)
+                with lock:
+                    done[0] += 1
+            except Exception as e:
+                with lock:
+                    errors.append(repr(e))
+
+    ts = [threading.Thread(target=loop, args=(t,)) for t in range(threads)]
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    out.put((done[0], errors))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--procs", type=int, default=8)
+    ap.add_argument("--threads", type=int, default=4)
+    ap.add_argument("--runs", type=int, default=25, help="runs per thread")
+    ap.add_argument("--points", type=int, default=250, help="points per run")
+    ap.add_argument("--mode", choices=["wal", "legacy"], default="wal")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="dr_bench_")
+    os.environ["DR_DB"] = os.path.join(tmp, "bench.sqlite")
+    os.environ["DR_DB_MODE"] = args.mode
+    os.environ["DR_CACHE"] = os.path.join(tmp, "cache")
+
+    ctx = mp.get_context("spawn")
+    out = ctx.Queue()
+    t0 = time.time()
+    ps = [ctx.Process(target=worker, args=(i, args.threads, args.runs, args.points, out))
+          for i in range(args.procs)]
+    for p in ps:
+        p.start()
+    results = [out.get() for _ in ps]
+    for p in ps:
+        p.join()
+    wall = time.time() - t0
+
+    done = sum(r[0] for r in results)
+    errors = [e for r in results for e in r[1]]
+    locked = sum("locked" in e or "busy" in e for e in errors)
+    total = args.procs * args.threads * args.runs
+    print(f"mode={args.mode}  writers={args.procs}×{args.threads}  db={os.environ['DR_DB']}")
+    print(f"runs ok {done}/{total}   errors {len(errors)} (locked/busy {locked})")
+    print(f"wall {wall:.2f}s   {done / wall:.1f} runs/s   "
+          f"{done * args.points / wall:,.0f} points/s")
+    if errors:
+        print("first error:", errors[0])
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
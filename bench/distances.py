@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""Pairwise distances: squareform(pdist) vs distcache's float32 tiles.
+
+Usage:  python bench/distances.py [--n 10000] [--dim 1536]
+
+Each variant runs in a fresh interpreter on the same random float32
+matrix and reports wall time and peak RSS (ru_maxrss). The distcache
+variant writes into a memory-mapped .npy as the run-time cache does, so
+its resident size is what the OS chooses to keep, not a heap allocation.
+"""
+import argparse, json, os, subprocess, sys, tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import json, resource, sys, time
+sys.path.insert(0, sys.argv[1])
+import numpy as np
+n, dim, variant, tmp = int(sys.argv[2]), int(sys.argv[3]), sys.argv[4], sys.argv[5]
+X = np.random.default_rng(0).standard_normal((n, dim)).astype(np.float32)
+base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+t0 = time.perf_counter()
+if variant == "pdist":
+    from scipy.spatial.distance import pdist, squareform
+    D = squareform(pdist(X, metric="euclidean"))
+else:
+    import distcache
+    D = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=(n, n))
+    distcache.compute(X, D)
+    D.flush()
+dt = time.perf_counter() - t0
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({"seconds": dt, "peak_mib": peak / 1024, "delta_mib": (peak - base) / 1024,
+                  "dtype": str(D.dtype)}))
+"""
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=10000)
+    ap.add_argument("--dim", type=int, default=1536)
+    args = ap.parse_args()
+
+    tmp = os.path.join(tempfile.mkdtemp(prefix="dr_bench_"), "square.npy")
+    env = dict(os.environ, DR_CACHE=os.path.dirname(tmp))
+    print(f"n={args.n:,}  dim={args.dim}  (float32 n×n = {args.n ** 2 * 4 / 2**20:,.0f} MiB)")
+    for variant in ("pdist", "distcache"):
+        out = subprocess.run(
+            [sys.executable, "-c", CHILD, ROOT, str(args.n), str(args.dim), variant, tmp],
+            capture_output=True, text=True, env=env, check=True,
+        ).stdout.strip().splitlines()[-1]
+        r = json.loads(out)
+        print(f"{variant:>10}: {r['seconds']:7.2f}s  peak RSS {r['peak_mib']:8,.0f} MiB "
+              f"(+{r['delta_mib']:,.0f} MiB)  {r['dtype']}")
+    os.remove(tmp)
+
+
+if __name__ == "__main__":
+    main()
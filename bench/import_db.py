@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""How much SQL does `import db` cost on an up-to-date database?
+
+Usage:  python bench/import_db.py [--repeat 20]
+
+Creates a migrated temp DB, then imports db in fresh interpreters and times
+init_schema() (connect + pragmas + version check) separately from the
+whole import, which also includes Python-level module imports.
+For comparison it also times replaying every migration's DDL, which is
+what each import used to pay.
+"""
+import argparse, json, os, statistics, subprocess, sys, tempfile, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import json, sys, time
+sys.path.insert(0, sys.argv[1])
+import numpy                       # keep numpy's own import out of the number
+t0 = time.perf_counter()
+import db                          # runs init_schema() once
+t1 = time.perf_counter()
+t2 = time.perf_counter()
+db.init_schema()                   # warm connection: just the version SELECT
+t3 = time.perf_counter()
+db._local.pid = None               # force a fresh connection + pragmas
+t4 = time.perf_counter()
+db.init_schema()                   # cold: connect, WAL pragmas, version SELECT
+t5 = time.perf_counter()
+print(json.dumps({"import": t1 - t0, "warm_check": t3 - t2, "cold_check": t5 - t4}))
+"""
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="dr_bench_")
+    env = dict(os.environ, DR_DB=os.path.join(tmp, "bench.sqlite"),
+               DR_CACHE=os.path.join(tmp, "cache"))
+    subprocess.run([sys.executable, "-c", CHILD, ROOT], env=env, check=True,
+                   stdout=subprocess.DEVNULL)          # first import migrates
+
+    runs = []
+    for _ in range(args.repeat):
+        out = subprocess.run([sys.executable, "-c", CHILD, ROOT], env=env,
+                             check=True, capture_output=True, text=True).stdout
+        runs.append(json.loads(out.strip().splitlines()[-1]))
+
+    os.environ.update(env)
+    sys.path.insert(0, ROOT)
+    import db
+    with db.conn() as c:
+        t0 = time.perf_counter()
+        for _, fn in db.MIGRATIONS:
+            fn(c)
+        db._sync_param_cols(c)
+        replay = time.perf_counter() - t0
+
+    ms = lambda xs: statistics.median(xs) * 1e3
+    print(f"db={env['DR_DB']}  repeats={args.repeat}")
+    print(f"import db (module + connect + version check): {ms([r['import'] for r in runs]):.3f} ms median")
+    print(f"init_schema() on a fresh connection:         {ms([r['cold_check'] for r in runs]):.3f} ms median")
+    print(f"init_schema() on warm connection:            {ms([r['warm_check'] for r in runs]):.3f} ms median")
+    print(f"full DDL replay (old per-import cost):        {replay * 1e3:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""Mosaic compositing: one pyvips insert per thumbnail vs mosaic.Compositor.
+
+Usage:  python bench/mosaic.py [--n 50000] [--legacy-n 2000] [--threads 8]
+
+Writes --n synthetic 256 px AVIF thumbnails once (kept in the temp dir for
+later runs), lays them out with viz.normalise and composites a 16384² canvas.
+"insert-chain" is the previous build_mosaic loop (Pillow decode → bytes →
+new_from_memory → resize → insert, then one evaluation of the graph); it
+is run at --legacy-n points only, since it grows superlinearly. "tiles" is
+mosaic.Compositor decoding every AVIF, and "cached" is the same compositor
+reading thumbcache.py's memory-mapped store (built once first, timed
+separately), both at --legacy-n and at --n. Each variant runs in a fresh
+interpreter against a throw-away DR_DB/DR_CACHE and reports wall time and
+peak RSS (ru_maxrss; for "cached" this includes the mapped cache pages,
+which are shared page cache); the AVIF encode, the same for all, is not
+included.
+"""
+import argparse, json, os, shutil, subprocess, sys, tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import json, resource, sys, time
+sys.path.insert(0, sys.argv[1])
+import numpy as np
+import viz, mosaic, thumbcache
+thumbs, n, variant, threads = sys.argv[2], int(sys.argv[3]), sys.argv[4], int(sys.argv[5])
+names = np.array([f"t{i}.avif" for i in range(n)])
+xy = np.random.default_rng(0).standard_normal((n, 2))
+x, y = viz.normalise(xy)
+scale = min(1.0, (viz.MAX_IMAGES_BEFORE_SHRINK / n) ** 0.5)
+cell = max(1, round(viz.THUMB_PX * scale))
+W = H = viz.CANVAS_W
+base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+t0 = time.perf_counter()
+if variant == "insert-chain":
+    import pyvips
+    import pillow_avif
+    from PIL import Image
+    canvas = pyvips.Image.black(W, H, bands=3)
+    for name, px, py in zip(names, x.tolist(), y.tolist()):
+        arr = np.asarray(Image.open(f"{thumbs}/{name}").convert("RGB"))
+        thumb = pyvips.Image.new_from_memory(arr.tobytes(), arr.shape[1], arr.shape[0], 3,
+                                             format="uchar")
+        if scale < 1.0:
+            thumb = thumb.resize(scale)
+        canvas = canvas.insert(thumb, px, py)
+    raw = canvas.write_to_memory()
+else:
+    load = thumbcache.ThumbCache(thumbs).load if variant == "cached" else mosaic.decode
+    comp = mosaic.Compositor(thumbs, names, x, y, cell, W, H, threads=threads, load=load)
+    arr = np.zeros((H, W, 3), np.uint8)
+    for tx, ty, tile in comp.tiles():
+        arr[ty * comp.tile:ty * comp.tile + tile.shape[0],
+            tx * comp.tile:tx * comp.tile + tile.shape[1]] = tile
+dt = time.perf_counter() - t0
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({"seconds": dt, "peak_mib": peak / 1024, "delta_mib": (peak - base) / 1024,
+                  "cell": cell}))
+"""
+
+
+def _write_thumb(args):
+    path, seed = args
+    import numpy as np
+    import pillow_avif                             # registers AVIF support in Pillow
+    from PIL import Image
+    rng = np.random.default_rng(seed)
+    h, w = (256, int(rng.integers(160, 257))) if seed % 2 else (int(rng.integers(160, 257)), 256)
+    base = rng.integers(0, 256, 3, dtype=np.uint8)
+    img = np.clip(base + rng.integers(-40, 40, (h // 8, w // 8, 3)), 0, 255).astype(np.uint8)
+    Image.fromarray(img).resize((w, h)).save(path, format="AVIF", quality=60, speed=10)
+
+
+def thumbnails(n: int) -> str:
+    root = os.path.join(tempfile.gettempdir(), "dr_bench_thumbs")
+    os.makedirs(root, exist_ok=True)
+    todo = [(os.path.join(root, f"t{i}.avif"), i) for i in range(n)
+            if not os.path.exists(os.path.join(root, f"t{i}.avif"))]
+    if todo:
+        print(f"writing {len(todo):,} thumbnails to {root} ...")
+        with ProcessPoolExecutor() as pool:
+            list(pool.map(_write_thumb, todo, chunksize=256))
+    return root
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=50_000)
+    ap.add_argument("--legacy-n", type=int, default=2_000)
+    ap.add_argument("--threads", type=int, default=os.cpu_count())
+    args = ap.parse_args()
+
+    root = thumbnails(max(args.n, args.legacy_n))
+    tmp = tempfile.mkdtemp(prefix="dr_bench_")
+    env = dict(os.environ, DR_DB=os.path.join(tmp, "bench.sqlite"),
+               DR_CACHE=os.path.join(tmp, "cache"))
+    print(subprocess.run([sys.executable, os.path.join(ROOT, "thumbcache.py"), "build",
+                          "--dir", root], capture_output=True, text=True, env=env,
+                         check=True).stdout.strip().splitlines()[-1])
+    print(f"16384² canvas, {os.cpu_count()} CPUs, --threads {args.threads}")
+    runs = [("insert-chain", args.legacy_n), ("tiles", args.legacy_n), ("cached", args.legacy_n),
+            ("tiles", args.n), ("cached", args.n)]
+    for variant, n in runs:
+        out = subprocess.run(
+            [sys.executable, "-c", CHILD, ROOT, root, str(n), variant, str(args.threads)],
+            capture_output=True, text=True, env=env, check=True,
+        ).stdout.strip().splitlines()[-1]
+        r = json.loads(out)
+        print(f"{variant:>12} n={n:>7,}  cell={r['cell']:>3}px  {r['seconds']:8.1f}s  "
+              f"peak RSS {r['peak_mib']:7,.0f} MiB (+{r['delta_mib']:,.0f} MiB)")
+    shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
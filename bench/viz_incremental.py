@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""Tiled re-render after a small layout change: full redraw vs incremental.
+
+Usage:  python bench/viz_incremental.py [--n 10000] [--canvas 32768] [--touch 0.01]
+
+Renders --n points (bench/mosaic.py's synthetic thumbnails, read through
+thumbcache.py) as a DZI pyramid with viz.render_tiles, then moves --touch
+of them by up to 400 px (random points, or with --cluster the ones nearest
+one spot). The changed layout is rendered twice: once with
+full=True, and once incrementally against the first render, which redraws
+only the tiles the moved points touch. Runs in a fresh interpreter against a
+throw-away DR_DB/DR_CACHE and reports wall time and tiles written.
+"""
+import argparse, json, os, shutil, subprocess, sys, tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from mosaic import thumbnails                      # bench/mosaic.py
+
+CHILD = r"""
+import json, sys, time
+from pathlib import Path
+sys.path.insert(0, sys.argv[1])
+import numpy as np
+import viz, thumbcache
+thumbs, n, side, touch, out = sys.argv[2], int(sys.argv[3]), int(sys.argv[4]), float(sys.argv[5]), sys.argv[6]
+cluster = sys.argv[7] == "1"
+viz.THUMB_DIR = Path(thumbs)
+thumbcache.update(thumbs)
+load = thumbcache.ThumbCache(thumbs).load
+rng = np.random.default_rng(0)
+x, y = viz.normalise(rng.standard_normal((n, 2)), side, side)
+pts = {"point_ids": np.arange(1, n + 1, dtype=np.int64), "artists": np.full(n, "a"),
+       "filenames": np.array([f"t{i % 5000}.avif" for i in range(n)]), "viz_x": x, "viz_y": y}
+scale = viz.thumb_scale(n, side)
+res = {}
+t0 = time.time()
+_, s = viz.render_tiles("bench", 1, pts, scale, side, out, load=load, full=True)
+res["first"] = (time.time() - t0, s["tiles"])
+k = max(1, int(n * touch))
+if cluster:                                        # e.g. one artist's new works
+    m = np.argsort((x - x[0]) ** 2 + (y - y[0]) ** 2)[:k]
+else:
+    m = rng.choice(n, k, replace=False)
+lo, hi = viz.MARGIN, side - 1 - viz.MARGIN
+pts["viz_x"], pts["viz_y"] = x.copy(), y.copy()
+pts["viz_x"][m] = np.clip(x[m] + rng.integers(-400, 401, len(m)), lo, hi)
+pts["viz_y"][m] = np.clip(y[m] + rng.integers(-400, 401, len(m)), lo, hi)
+t0 = time.time()
+_, s = viz.render_tiles("bench", 2, pts, scale, side, out, load=load, full=True)
+res["full"] = (time.time() - t0, s["tiles"])
+t0 = time.time()
+_, s = viz.render_tiles("bench", 1, pts, scale, side, out, load=load)
+res["incremental"] = (time.time() - t0, s["tiles"])
+res["moved"] = len(m)
+print(json.dumps(res))
+"""
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=10_000)
+    ap.add_argument("--canvas", type=int, default=32_768)
+    ap.add_argument("--touch", type=float, default=0.01, help="share of points moved")
+    ap.add_argument("--cluster", action="store_true",
+                    help="move the points nearest one spot instead of random ones")
+    args = ap.parse_args()
+
+    root = thumbnails(5000)
+    tmp = tempfile.mkdtemp(prefix="dr_bench_")
+    env = dict(os.environ, DR_DB=os.path.join(tmp, "bench.sqlite"),
+               DR_CACHE=os.path.join(tmp, "cache"))
+    out = os.path.join(tmp, "visualizations")
+    os.makedirs(out)
+    r = json.loads(subprocess.run(
+        [sys.executable, "-c", CHILD, ROOT, root, str(args.n), str(args.canvas),
+         str(args.touch), out, str(int(args.cluster))],
+        capture_output=True, text=True, env=env, check=True,
+    ).stdout.strip().splitlines()[-1])
+    print(f"n={args.n:,} points on {args.canvas:,}², {r['moved']:,} "
+          f"{'clustered' if args.cluster else 'random'} points moved, {os.cpu_count()} CPUs")
+    for k in ("first", "full", "incremental"):
+        print(f"{k:>12}: {r[k][0]:7.1f}s  {r[k][1]:>6,} tiles written")
+    print(f"incremental / full: {r['incremental'][0] / r['full'][0]:.1%} of the time")
+    shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""viz.py pre-render step: per-point dicts vs NumPy arrays.
+
+Usage:  python bench/viz_prerender.py [--n 1000000]
+
+Times what happens between reading a run's points and drawing the mosaic:
+canvas positions, the point-id blob and the viz_points insert. "dicts" is
+the previous path (tuples → dicts → normalise → struct.pack → row tuples);
+"arrays" is viz.normalise + db.pack_ids + db.insert_viz_points. Each
+variant runs in a fresh interpreter against its own throw-away database,
+starting from the arrays get_projection_points(as_arrays=True) returns, and
+reports wall time per stage and peak RSS (ru_maxrss).
+"""
+import argparse, json, os, subprocess, sys, tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import json, resource, struct, sys, time
+sys.path.insert(0, sys.argv[1])
+import numpy as np
+import db, viz
+n, variant = int(sys.argv[2]), sys.argv[3]
+rng = np.random.default_rng(0)
+pts = {"point_ids": np.arange(1, n + 1, dtype=np.int64),
+       "coords": rng.standard_normal((n, 2)).astype(np.float32) * [3, 1],
+       "filenames": np.array([f"Artist_{i % 997}_{i}.avif" for i in range(n)]),
+       "artists": np.array([f"Artist_{i % 997}" for i in range(n)])}
+base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+t, t0 = {}, time.perf_counter()
+if variant == "dicts":
+    xs, ys = pts["coords"][:, 0].tolist(), pts["coords"][:, 1].tolist()
+    raw = list(zip(pts["point_ids"].tolist(), pts["filenames"].tolist(),
+                   pts["artists"].tolist(), xs, ys))
+    points = [dict(point_id=r[0], filename=r[1], artist=r[2], x=r[3], y=r[4],
+                   method="bench", config_id=1) for r in raw]
+    W = H = viz.CANVAS_W
+    px, py = [p["x"] for p in points], [p["y"] for p in points]
+    min_x, max_x, min_y, max_y = min(px), max(px), min(py), max(py)
+    span_x, span_y = max_x - min_x or 1.0, max_y - min_y or 1.0
+    normed = [{**p, "viz_x": int(round((p["x"] - min_x) / span_x * (W - 1))),
+               "viz_y": int(round((p["y"] - min_y) / span_y * (H - 1)))} for p in points]
+    t["normalise"] = time.perf_counter() - t0
+    blob = struct.pack(f"{len(points)}I", *(p["point_id"] for p in points))
+    t["blob"] = time.perf_counter() - t0 - sum(t.values())
+    viz_id = db.insert_viz_config("bench", "bench.avif", 1, blob)
+    rows = [(viz_id, p["point_id"], p["viz_x"], p["viz_y"]) for p in normed]
+    db._write(lambda c: c.executemany(
+        "INSERT INTO viz_points (viz_id, point_id, viz_x, viz_y) VALUES (?, ?, ?, ?)", rows))
+else:
+    viz_x, viz_y = viz.normalise(pts["coords"])
+    t["normalise"] = time.perf_counter() - t0
+    blob = db.pack_ids(pts["point_ids"])
+    t["blob"] = time.perf_counter() - t0 - sum(t.values())
+    viz_id = db.insert_viz_config("bench", "bench.avif", 1, blob)
+    db.insert_viz_points(viz_id, pts["point_ids"], viz_x, viz_y)
+t["insert"] = time.perf_counter() - t0 - sum(t.values())
+t["total"] = time.perf_counter() - t0
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({"t": t, "peak_mib": peak / 1024, "delta_mib": (peak - base) / 1024}))
+"""
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=1_000_000)
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="dr_bench_")
+    print(f"n={args.n:,} points")
+    for variant in ("dicts", "arrays"):
+        env = dict(os.environ, DR_DB=os.path.join(tmp, f"{variant}.sqlite"),
+                   DR_CACHE=os.path.join(tmp, "cache"))
+        out = subprocess.run(
+            [sys.executable, "-c", CHILD, ROOT, str(args.n), variant],
+            capture_output=True, text=True, env=env, check=True,
+        ).stdout.strip().splitlines()[-1]
+        r = json.loads(out)
+        t = r["t"]
+        print(f"{variant:>7}: {t['total']:6.2f}s  (normalise {t['normalise']:.2f}s, "
+              f"blob {t['blob']:.3f}s, insert {t['insert']:.2f}s)  "
+              f"peak RSS {r['peak_mib']:7,.0f} MiB (+{r['delta_mib']:,.0f} MiB)")
+
+
+if __name__ == "__main__":
+    main()
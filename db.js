@@ -2,43 +2,33 @@ import { Database } from "bun:sqlite";
 
 const art = new Database("art.sqlite", { readonly: true });
 
-// PARAM_COLS mapping (copy from db.py)
-const PARAM_COLS = {
-  umap: ["n_neighbors", "min_dist", "spread", "set_op_mix_ratio", "local_connectivity", "n_components", "metric", "random_state"],
-  tsne: ["perplexity", "n_components", "random_state", "learning_rate", "n_iter", "early_exaggeration", "n_iter_without_progress", "min_grad_norm", "metric", "early_exaggeration_iter", "theta", "negative_gradient_method", "initialization", "n_jobs"],
-  isomap: ["n_neighbors", "n_components"],
-  lle: ["n_neighbors", "n_components", "random_state"],
-  spectral: ["n_neighbors", "n_components", "random_state"],
-  mds: ["n_components", "random_state"],
-  sammon_random: ["n_dims", "n_iter", "tol", "input_type", "random_state"],
-  pca: ["n_components", "random_state"],
-  ipca: ["n_components", "batch_size", "random_state"],
-  svd: ["n_components", "random_state"],
-  fa: ["n_components", "random_state"],
-  ica: ["n_components", "max_iter", "random_state"],
-  agg: ["n_clusters"],
-  kpca: ["n_components", "kernel", "gamma", "fit_inverse_transform", "random_state"],
-  nystroem_pca: ["n_components", "nystroem_components", "kernel", "gamma", "random_state"],
-  grp: ["n_components", "eps", "random_state"],
-  srp: ["n_components", "density", "eps", "random_state"],
-  nmf: ["n_components", "init", "random_state"],
-  dictlearn: ["n_components", "random_state"],
-  phate: ["n_components", "knn", "decay", "t", "gamma", "random_state"],
-  trimap: ["n_dims", "n_inliers", "n_outliers", "n_random", "distance", "weight_temp", "lr", "n_iters", "random_state", "opt_method", "apply_pca"],
-  spacemap: ["n_components", "n_near_field", "n_middle_field", "d_local", "d_global", "eta", "n_epochs", "init", "metric", "verbose", "plot_results", "num_plots"],
-  glle: ["method", "k_neighbors", "max_iterations", "n_components", "n_generation_of_embedding", "verbosity"],
-  paramrepulsor: ["n_components", "n_neighbors", "n_epochs", "lr", "spread", "repulsion_strength", "apply_pca", "init", "verbose"],
-  pacmap: ["n_components", "n_neighbors", "MN_ratio", "FP_ratio", "num_iters", "lr", "apply_pca", "init", "random_state", "verbose"],
-  clmds: ["n_clusters", "max_iter", "random_state"],
-  tsne_pso: ["n_components", "perplexity", "n_particles", "n_iter", "random_state", "inertia_weight", "h", "f", "use_hybrid", "learning_rate", "init", "metric", "early_exaggeration", "min_grad_norm", "parameter_optimization", "dynamic_weight_adaptation", "small_dataset_handling", "numerical_robustness"],
-  slisemap: ["radius", "lasso", "use_slipmap", "y"],
-  tsimcne: ["n_components", "total_epochs", "random_state"]
-};
+// Method columns and capabilities, mirrored from registry.py into the
+// `methods` table by db.py's schema sync (see README, registry.py).
+const COMMON_COLS = ["config_id", "subset_strategy", "subset_size", "runtime", "compile_time", "subset_id", "run_hash", "preprocess", "embedding_tier"];
+
+function loadMethods() {
+  try {
+    return Object.fromEntries(
+      art.query(`SELECT name, info FROM methods ORDER BY rowid`).all()
+        .map((r) => [r.name, JSON.parse(r.info)])
+    );
+  } catch {
+    // database not yet migrated by db.py: fall back to the *_configs tables
+    const tables = art.query(`SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB '*_configs'`).all();
+    return Object.fromEntries(tables.map(({ name }) => [
+      name.slice(0, -"_configs".length),
+      { params: art.query(`PRAGMA table_info(${name})`).all().map((c) => c.name).filter((c) => !COMMON_COLS.includes(c)) }
+    ]));
+  }
+}
+
+const METHODS = loadMethods();
+const PARAM_COLS = Object.fromEntries(Object.entries(METHODS).map(([m, info]) => [m, info.params]));
 
 // Fetch all configs for a method
 function getConfigs(method = "umap") {
   const cols = PARAM_COLS[method] || [];
-  const selectCols = ["config_id", "subset_strategy", "subset_size", "runtime", ...cols].join(", ");
+  const selectCols = ["config_id", "subset_strategy", "subset_size", "subset_id", "preprocess", "runtime", "compile_time", ...cols].join(", ");
   return art
     .query(`SELECT ${selectCols} FROM ${method}_configs ORDER BY config_id DESC`)
     .all();
@@ -47,19 +37,42 @@ function getConfigs(method = "umap") {
 // Fetch a single config by method and config_id
 function getConfig(method, config_id) {
   const cols = PARAM_COLS[method] || [];
-  const selectCols = ["config_id", "subset_strategy", "subset_size", "runtime", ...cols].join(", ");
+  const selectCols = ["config_id", "subset_strategy", "subset_size", "subset_id", "preprocess", "runtime", "compile_time", ...cols].join(", ");
   return art
     .query(`SELECT ${selectCols} FROM ${method}_configs WHERE config_id = ?`)
     .get(config_id);
 }
 
-// Fetch projection points for a method and config_id
+// Fetch projection points for a method and config_id.
+// Runs live in projection_runs as packed blobs (int64 point ids + float32
+// n×dim coords); decode them into the same row shape as the legacy table.
 function getProjectionPoints(method, config_id) {
-  return art
-    .query(
-      `SELECT point_id, filename, artist, x, y FROM projection_points WHERE method = ? AND config_id = ?`
-    )
-    .all(method, config_id);
+  const run = art
+    .query(`SELECT n, dim, point_ids, coords FROM projection_runs WHERE method = ? AND config_id = ?`)
+    .get(method, config_id);
+  if (!run) {
+    return art
+      .query(
+        `SELECT point_id, filename, artist, x, y FROM projection_points WHERE method = ? AND config_id = ?`
+      )
+      .all(method, config_id);
+  }
+  // slice() copies into a fresh, aligned ArrayBuffer
+  const ids = Array.from(new BigInt64Array(run.point_ids.slice().buffer), Number);
+  const xy = new Float32Array(run.coords.slice().buffer);
+  const meta = new Map(
+    art
+      .query(`SELECT rowid AS id, filename, artist FROM embeddings WHERE rowid IN (SELECT value FROM json_each(?))`)
+      .all(JSON.stringify(ids))
+      .map((r) => [r.id, r])
+  );
+  return ids.map((id, i) => ({
+    point_id: id,
+    filename: meta.get(id)?.filename ?? "",
+    artist: meta.get(id)?.artist ?? "",
+    x: xy[i * run.dim],
+    y: run.dim > 1 ? xy[i * run.dim + 1] : 0,
+  }));
 }
 
 // Fetch all viz_config rows (for dropdown population)
@@ -89,4 +102,4 @@ function artists() {
     .all();
 }
 
-export { getConfigs, getConfig, getProjectionPoints, getVizConfig, getVizPoints, getAllVizConfigs, artists, PARAM_COLS };
+export { getConfigs, getConfig, getProjectionPoints, getVizConfig, getVizPoints, getAllVizConfigs, artists, PARAM_COLS, METHODS };
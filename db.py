@@ -1,242 +1,241 @@
 # db.py
 #!/usr/bin/env python3
 """SQLite helpers – one config table per DR method, explicit cols, no JSON."""
-import os, sqlite3, numpy as np
+import hashlib, itertools, json, os, queue, random, sqlite3, threading, time, zlib, numpy as np
+from concurrent.futures import Future
 from contextlib import contextmanager
 from typing import Dict, Any, List
+# Columns relevant to each method come from registry.py with the rest of its
+# metadata; it imports no method library, so neither does the schema.
+from registry import METHODS, PARAM_COLS, describe as _describe_method
 
 DB_PATH = os.getenv("DR_DB", "art.sqlite")
+CACHE_DIR = os.getenv("DR_CACHE", "cache")   # derived on-disk artifacts (see embstore.py)
 
-# Columns relevant to each method (UMAP has 3 new ones)
-PARAM_COLS: Dict[str, List[str]] = {
-    "umap":     [
-        "n_neighbors",
-        "min_dist",
-        "spread",
-        "set_op_mix_ratio",
-        "local_connectivity",
-        "n_components",
-        "metric",
-        "random_state"
-    ],
-    "tsne":     [
-        "perplexity",
-        "n_components",
-        "random_state",
-        "learning_rate",
-        "n_iter",
-        "early_exaggeration",
-        "n_iter_without_progress",
-        "min_grad_norm",
-        "metric",
-        "early_exaggeration_iter",
-        "theta",
-        "negative_gradient_method",
-        "initialization",
-        "n_jobs"
-    ],
-    "isomap":   ["n_neighbors", "n_components"],
-    "lle":      ["n_neighbors", "n_components", "random_state"],
-    "spectral": ["n_neighbors", "n_components", "random_state"],
-    "mds":      ["n_components", "random_state"],
-    "sammon_random": [
-        "n_dims", "n_iter", "tol", "input_type", "random_state"
-    ],
-    "pca": [
-        "n_components",
-        "random_state"
-    ],
-    "ipca": [
-        "n_components",
-        "batch_size",
-        "random_state"
-    ],
-    "svd": [
-        "n_components",
-        "random_state"
-    ],
-    "fa": [
-        "n_components",
-        "random_state"
-    ],
-    "ica": [
-        "n_components",
-        "max_iter",
-        "random_state"
-    ],
-    "agg": [
-        "n_clusters"
-    ],
-    "kpca": [
-        "n_components",
-        "kernel",
-        "gamma",
-        "fit_inverse_transform",
-        "random_state"
-    ],
-    "nystroem_pca": [
-        "n_components",
-        "nystroem_components",
-        "kernel",
-        "gamma",
-        "random_state"
-    ],
-    "grp": [
-        "n_components",
-        "eps",
-        "random_state"
-    ],
-    "srp": [
-        "n_components",
-        "density",
-        "eps",
-        "random_state"
-    ],
-    "nmf": [
-        "n_components",
-        "init",
-        "random_state"
-    ],
-    "dictlearn": [
-        "n_components",
-        "random_state"
-    ],
-    "phate": [
-        "n_components",
-        "knn",
-        "decay",
-        "t",
-        "gamma",
-        "random_state"
-    ],
-    "trimap": [
-        "n_dims",
-        "n_inliers",
-        "n_outliers",
-        "n_random",
-        "distance",
-        "weight_temp",
-        "lr",
-        "n_iters",
-        "random_state",
-        "opt_method",
-        "apply_pca"
-    ],
-    "spacemap": [
-        "n_components", "n_near_field", "n_middle_field", "d_local", "d_global",
-        "eta", "n_epochs", "init", "metric", "verbose", "plot_results", "num_plots"
-    ],
-    "glle": [
-        "method",
-        "k_neighbors",
-        "max_iterations",
-        "n_components",
-        "n_generation_of_embedding",
-        "verbosity"
-    ],
-    "paramrepulsor": [
-        "n_components",
-        "n_neighbors",
-        "n_epochs",
-        "lr",
-        "spread",
-        "repulsion_strength",
-        "apply_pca",      # stored as INTEGER (0 or 1)
-        "init",           # e.g. 'pca', 'random'
-        "verbose"         # optional for debugging
-    ],
-    "pacmap": [
-        "n_components",
-        "n_neighbors",
-        "MN_ratio",
-        "FP_ratio",
-        "num_iters",
-        "lr",
-        "apply_pca",
-        "init",
-        "random_state",
-        "verbose"
-    ],
-    "clmds": [
-        "n_clusters",
-        "max_iter",
-        "random_state"
-    ],
-    "tsne_pso": [
-        "n_components",
-        "perplexity",
-        "n_particles",
-        "n_iter",
-        "random_state",
-        "inertia_weight",
-        "h",  # dynamic cognitive weight param
-        "f",  # dynamic social weight param
-        "use_hybrid",
-        "learning_rate",
-        "init",  # initialization method or array
-        "metric",
-        "early_exaggeration",
-        "min_grad_norm",
-        "parameter_optimization",  # auto-tuning flag
-        "dynamic_weight_adaptation",  # auto-adapt flag
-        "small_dataset_handling",  # special init for small N
-        "numerical_robustness"  # error/numerical stability flag
-    ],
-    "slisemap": [
-        "radius",
-        "lasso",
-        "use_slipmap",
-        "y"  # target values (may be handled specially)
-    ],
-    "tsimcne": [
-        "n_components",
-        "total_epochs",
-        "random_state"
-    ],
-}
+# "wal"    – WAL journal, tuned pragmas, one connection per thread/process and
+#            all writes funnelled through a single batched writer thread.
+# "legacy" – rollback journal, fresh connection per call, inline writes.
+DB_MODE = os.getenv("DR_DB_MODE", "wal")
+
+BUSY_TIMEOUT_MS = 30_000
+WRITE_RETRIES   = 8        # extra attempts after SQLITE_BUSY despite busy_timeout
+WRITE_BATCH     = 64       # max queued write ops committed in one transaction
+WAL_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA mmap_size=268435456",      # 256 MiB
+    "PRAGMA cache_size=-65536",        # 64 MiB
+    "PRAGMA temp_store=MEMORY",
+)
+
+def _connect(isolation_level: str = "") -> sqlite3.Connection:
+    if DB_MODE != "wal":
+        con = sqlite3.connect(DB_PATH)
+        con.row_factory = sqlite3.Row
+        return con
+    con = sqlite3.connect(
+        DB_PATH, timeout=BUSY_TIMEOUT_MS / 1000,
+        isolation_level=isolation_level, check_same_thread=False
+    )
+    con.row_factory = sqlite3.Row
+    for pragma in WAL_PRAGMAS:
+        con.execute(pragma)
+    return con
+
+_local = threading.local()
+
+def _thread_conn() -> sqlite3.Connection:
+    """Persistent per-thread connection (re-opened after fork)."""
+    pid = os.getpid()
+    if getattr(_local, "pid", None) != pid:
+        _local.con, _local.pid = _connect(), pid
+    return _local.con
 
 @contextmanager
 def conn():
-    con = sqlite3.connect(DB_PATH)
-    con.row_factory = sqlite3.Row
+    if DB_MODE != "wal":
+        con = _connect()
+        try:
+            yield con
+            con.commit()
+        finally:
+            con.close()
+        return
+    con = _thread_conn()
     try:
         yield con
         con.commit()
-    finally:
-        con.close()
+    except BaseException:
+        con.rollback()
+        raise
+
+def _is_busy(e: Exception) -> bool:
+    msg = str(e).lower()
+    return "locked" in msg or "busy" in msg
+
+class _Writer(threading.Thread):
+    """Single writer: drains queued ops, commits them in batched transactions.
+
+    Each op runs inside its own SAVEPOINT so a failing op only rolls back
+    itself; SQLITE_BUSY on BEGIN/COMMIT retries the whole batch with
+    jittered exponential backoff.
+    """
+
+    def __init__(self):
+        super().__init__(name="db-writer", daemon=True)
+        self.q: "queue.Queue" = queue.Queue()
+        self.pid = os.getpid()
+        self.start()
+
+    def submit(self, fn, *args) -> Future:
+        fut: Future = Future()
+        self.q.put((fn, args, fut))
+        return fut
+
+    def run(self):
+        con = _connect(isolation_level=None)
+        batch = []
+        try:
+            while True:
+                batch = [self.q.get()]
+                while len(batch) < WRITE_BATCH:
+                    try:
+                        batch.append(self.q.get_nowait())
+                    except queue.Empty:
+                        break
+                try:
+                    self._commit(con, batch)
+                except Exception as e:     # e.g. ROLLBACK on a broken connection
+                    for _, _, fut in batch:
+                        if not fut.done():
+                            fut.set_exception(e)
+                    con.close()
+                    con = _connect(isolation_level=None)
+        finally:                           # a dying writer must not keep the write lock
+            if con.in_transaction:
+                con.rollback()
+            con.close()
+            while True:                    # nor leave callers waiting; _write starts a new one
+                try:
+                    batch.append(self.q.get_nowait())
+                except queue.Empty:
+                    break
+            for _, _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(RuntimeError("db writer thread died"))
+
+    def _commit(self, con, batch):
+        for attempt in range(WRITE_RETRIES + 1):
+            results = []
+            try:
+                con.execute("BEGIN IMMEDIATE")
+                for fn, args, fut in batch:
+                    con.execute("SAVEPOINT op")
+                    try:
+                        results.append((fut, fn(con, *args), None))
+                    except sqlite3.OperationalError as e:
+                        if _is_busy(e):
+                            raise
+                        con.execute("ROLLBACK TO op")
+                        results.append((fut, None, e))
+                    except Exception as e:
+                        con.execute("ROLLBACK TO op")
+                        results.append((fut, None, e))
+                    con.execute("RELEASE op")
+                con.execute("COMMIT")
+            except Exception as e:         # any DatabaseError at BEGIN/COMMIT fails the batch
+                if con.in_transaction:
+                    con.execute("ROLLBACK")
+                if isinstance(e, sqlite3.OperationalError) and _is_busy(e) and attempt < WRITE_RETRIES:
+                    time.sleep(min(2.0, 0.05 * 2 ** attempt) * (0.5 + random.random()))
+                    continue
+                for _, _, fut in batch:
+                    fut.set_exception(e)
+                return
+            for fut, res, err in results:
+                if err is None:
+                    fut.set_result(res)
+                else:
+                    fut.set_exception(err)
+            return
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def _write(fn, *args):
+    """Run fn(con, *args) as a write; blocks until committed, returns its result."""
+    global _writer
+    if DB_MODE != "wal":
+        with conn() as c:
+            return fn(c, *args)
+    with _writer_lock:
+        if _writer is None or _writer.pid != os.getpid() or not _writer.is_alive():
+            _writer = _Writer()
+    return _writer.submit(fn, *args).result()
 
 def _sql_type(col: str) -> str:
     if col in ("metric", "subset_strategy"):
         return "TEXT"
     if col.endswith("_components") or col in (
         "n_neighbors", "random_state", "n_iter",
-        "n_iter_without_progress", "subset_size"
+        "n_iter_without_progress", "subset_size", "subset_id"
     ):
         return "INTEGER"
     return "REAL"
 
-def init_schema() -> None:
-    common = "subset_strategy TEXT, subset_size INTEGER, runtime REAL"
-    stmts = [
-        "PRAGMA foreign_keys=ON;",
-        """
+# ── Schema migrations ─────────────────────────────────────────────────────
+# schema_version holds one row: the last applied migration and a hash of
+# PARAM_COLS and the registry. On an up-to-date database import costs a single
+# SELECT; a new entry in MIGRATIONS or a changed registry triggers the runner.
+COMMON_COLS = [
+    ("subset_strategy", "TEXT"),
+    ("subset_size",     "INTEGER"),
+    ("runtime",         "REAL"),
+    ("subset_id",       "INTEGER REFERENCES subsets(subset_id)"),
+    ("preprocess",      "TEXT"),      # preprocess.pipeline_id(), NULL = raw embeddings
+    ("compile_time",    "REAL"),      # numba compile seconds within runtime (jit.py), NULL = no numba
+    ("run_hash",        "TEXT"),      # run.run_hash(): content address of the run, UNIQUE
+    ("embedding_tier",  "TEXT"),      # embstore tier the run was fitted on, NULL = f32
+]
+
+def _m001_baseline(c) -> None:
+    """Tables that used to be (re)created by init_schema on every import."""
+    c.execute("""
         CREATE TABLE IF NOT EXISTS embeddings(
             filename TEXT PRIMARY KEY,
             artist   TEXT,
             embedding BLOB
-        );"""
-    ]
-    # Method-specific config tables
-    for m, cols in PARAM_COLS.items():
-        cols_sql = ",\n            ".join(f"{c} {_sql_type(c)}" for c in cols)
-        stmts.append(f"""
-        CREATE TABLE IF NOT EXISTS {m}_configs(
-            config_id INTEGER PRIMARY KEY,
-            {common},
-            {cols_sql}
-        );""")
-    # Projection points
-    stmts.append("""
+        )""")
+    # Bumped by triggers on every write to `embeddings`; derived artifacts
+    # (embstore.py) compare against it to know when they are stale.
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS embeddings_state(
+            id         INTEGER PRIMARY KEY CHECK (id = 0),
+            generation INTEGER NOT NULL
+        )""")
+    c.execute("INSERT OR IGNORE INTO embeddings_state(id, generation) VALUES(0, 0)")
+    for op in ("INSERT", "UPDATE", "DELETE"):
+        c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS embeddings_gen_{op.lower()}
+        AFTER {op} ON embeddings
+        BEGIN
+            UPDATE embeddings_state SET generation = generation + 1 WHERE id = 0;
+        END""")
+    # Materialised subsets: a packed array of embeddings.rowid per
+    # (strategy, size, seed), shared by every config that asks for it.
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS subsets(
+            subset_id  INTEGER PRIMARY KEY,
+            strategy   TEXT    NOT NULL,
+            size       INTEGER NOT NULL,
+            seed       INTEGER NOT NULL,
+            n          INTEGER NOT NULL,
+            row_ids    BLOB    NOT NULL,
+            generation INTEGER,
+            created_at TEXT    DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(strategy, size, seed)
+        )""")
+    c.execute("""
         CREATE TABLE IF NOT EXISTS projection_points(
             point_id INTEGER PRIMARY KEY,
             method TEXT,
@@ -244,12 +243,8 @@ def init_schema() -> None:
             filename TEXT,
             artist TEXT,
             x REAL, y REAL
-        );""")
-    with conn() as c:
-        c.executescript("\n".join(stmts))
-    # Add viz_config and viz_points tables and indexes
-    with conn() as c:
-        c.executescript("""
+        )""")
+    c.execute("""
         CREATE TABLE IF NOT EXISTS viz_config (
             viz_id      INTEGER PRIMARY KEY AUTOINCREMENT,
             method      TEXT    NOT NULL,
@@ -257,7 +252,8 @@ def init_schema() -> None:
             low_res     TEXT    NOT NULL,
             point_ids   BLOB    NOT NULL,
             created_at  TEXT    DEFAULT CURRENT_TIMESTAMP
-        );
+        )""")
+    c.execute("""
         CREATE TABLE IF NOT EXISTS viz_points (
             viz_id      INTEGER  NOT NULL,
             point_id    INTEGER  NOT NULL,
@@ -266,12 +262,155 @@ def init_schema() -> None:
             PRIMARY KEY (viz_id, point_id),
             FOREIGN KEY (viz_id)   REFERENCES viz_config(viz_id),
             FOREIGN KEY (point_id) REFERENCES projection_points(point_id)
-        );
-        CREATE INDEX IF NOT EXISTS idx_viz_config_method 
-            ON viz_config(method, config_id);
-        CREATE INDEX IF NOT EXISTS idx_viz_points_viz
-            ON viz_points(viz_id);
-        """)
+        )""")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_viz_config_method ON viz_config(method, config_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_viz_points_viz ON viz_points(viz_id)")
+
+def _m002_lookup_indexes(c) -> None:
+    """Back the per-run DELETE/SELECT and per-artist lookups with indexes."""
+    c.execute("CREATE INDEX IF NOT EXISTS idx_projection_points_run "
+              "ON projection_points(method, config_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_artist ON embeddings(artist)")
+
+def _m003_projection_runs(c) -> None:
+    """Columnar per-run projection store (one row per run, n-D float32 coords)."""
+    # point_ids: packed little-endian int64 embeddings.rowid, one per point
+    # coords:    float32 (n × dim), C order – written/read straight from NumPy
+    # Legacy per-point rows stay in projection_points and are still readable.
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS projection_runs(
+            method     TEXT    NOT NULL,
+            config_id  INTEGER NOT NULL,
+            n          INTEGER NOT NULL,
+            dim        INTEGER NOT NULL,
+            point_ids  BLOB    NOT NULL,
+            coords     BLOB    NOT NULL,
+            created_at TEXT    DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (method, config_id)
+        )""")
+
+def _m004_embedding_rewrites(c) -> None:
+    """Count UPDATE/DELETE on embeddings separately so pure appends stay incremental."""
+    if "rewrites" not in {r[1] for r in c.execute("PRAGMA table_info(embeddings_state)")}:
+        c.execute("ALTER TABLE embeddings_state ADD COLUMN rewrites INTEGER NOT NULL DEFAULT 0")
+    for op in ("UPDATE", "DELETE"):
+        c.execute(f"DROP TRIGGER IF EXISTS embeddings_gen_{op.lower()}")
+        c.execute(f"""
+        CREATE TRIGGER embeddings_gen_{op.lower()}
+        AFTER {op} ON embeddings
+        BEGIN
+            UPDATE embeddings_state
+               SET generation = generation + 1, rewrites = rewrites + 1
+             WHERE id = 0;
+        END""")
+
+def _m005_methods(c) -> None:
+    """Mirror registry.py in a `methods` table for db.js and the UI."""
+    # params: JSON list of *_configs columns; info: JSON of registry.describe()
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS methods(
+            name   TEXT PRIMARY KEY,
+            params TEXT NOT NULL,
+            info   TEXT NOT NULL
+        )""")
+
+def _m006_run_metrics(c) -> None:
+    """Layout-quality scores per run (metrics.py)."""
+    # k: neighbourhood size, 0 for metrics without one; label: artist for
+    # per-artist scores, '' for the whole run; n: points the score is computed on
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS run_metrics(
+            method      TEXT    NOT NULL,
+            config_id   INTEGER NOT NULL,
+            metric      TEXT    NOT NULL,
+            k           INTEGER NOT NULL DEFAULT 0,
+            label       TEXT    NOT NULL DEFAULT '',
+            value       REAL,
+            n           INTEGER,
+            computed_at TEXT    DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (method, config_id, metric, k, label)
+        )""")
+
+def _m007_drop_viz_points_index(c) -> None:
+    """Drop idx_viz_points_viz: the (viz_id, point_id) primary key already covers it."""
+    c.execute("DROP INDEX IF EXISTS idx_viz_points_viz")
+
+MIGRATIONS = [
+    (1, _m001_baseline),
+    (2, _m002_lookup_indexes),
+    (3, _m003_projection_runs),
+    (4, _m004_embedding_rewrites),
+    (5, _m005_methods),
+    (6, _m006_run_metrics),
+    (7, _m007_drop_viz_points_index),
+]
+
+def _param_cols_hash() -> str:
+    registry = {m: _describe_method(m) for m in METHODS}
+    blob = json.dumps([PARAM_COLS, COMMON_COLS, registry], sort_keys=True).encode()
+    return f"{zlib.crc32(blob):08x}"
+
+def _sync_param_cols(c) -> None:
+    """Create missing *_configs tables and ADD COLUMN anything PARAM_COLS gained."""
+    c.execute("DELETE FROM methods")
+    c.executemany("INSERT INTO methods(name, params, info) VALUES(?,?,?)",
+                  [(m, json.dumps(PARAM_COLS[m]), json.dumps(_describe_method(m)))
+                   for m in METHODS])
+    for m, cols in PARAM_COLS.items():
+        have = {r[1] for r in c.execute(f"PRAGMA table_info({m}_configs)")}
+        wanted = COMMON_COLS + [(col, _sql_type(col)) for col in cols]
+        if not have:
+            cols_sql = ",\n            ".join(f"{n} {t}" for n, t in wanted)
+            c.execute(f"""
+        CREATE TABLE {m}_configs(
+            config_id INTEGER PRIMARY KEY,
+            {cols_sql}
+        )""")
+        else:
+            for name, typ in wanted:
+                if name not in have:
+                    # ALTER TABLE cannot add a REFERENCES column with a default; keep it plain
+                    c.execute(f"ALTER TABLE {m}_configs ADD COLUMN {name} {typ.split()[0]}")
+        # NULLs (rows from before run hashes) don't collide
+        c.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{m}_configs_run_hash "
+                  f"ON {m}_configs(run_hash)")
+
+def _schema_state(c):
+    try:
+        row = c.execute("SELECT version, param_hash FROM schema_version").fetchone()
+    except sqlite3.OperationalError:   # no schema_version table yet
+        return None
+    return (row[0], row[1]) if row else None
+
+def _apply_migrations(c, target) -> None:
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version(
+            id         INTEGER PRIMARY KEY CHECK (id = 0),
+            version    INTEGER NOT NULL,
+            param_hash TEXT,
+            updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )""")
+    state = _schema_state(c)            # re-check under the write lock
+    if state == target:
+        return
+    version = state[0] if state else 0
+    for v, fn in MIGRATIONS:
+        if v > version:
+            fn(c)
+            print(f"[db] applied migration {v}: {fn.__doc__.strip().splitlines()[0]}")
+    _sync_param_cols(c)
+    c.execute(
+        "INSERT OR REPLACE INTO schema_version(id, version, param_hash, updated_at) "
+        "VALUES(0, ?, ?, CURRENT_TIMESTAMP)", target
+    )
+
+def init_schema() -> None:
+    """Bring the schema up to date; one SELECT when nothing changed."""
+    target = (MIGRATIONS[-1][0], _param_cols_hash())
+    with conn() as c:
+        if _schema_state(c) == target:
+            return
+    _write(_apply_migrations, target)
 
 def table_counts() -> dict:
     with conn() as c:
@@ -280,88 +419,303 @@ def table_counts() -> dict:
             for t in c.execute("SELECT name FROM sqlite_master WHERE type='table'")
         }
 
-def fetch_subset(strategy: str, size: int):
+SUBSET_STRATEGIES = ("random", "artist_first5")
+
+def insert_embeddings(rows, replace: bool = False) -> int:
+    """Bulk-write (filename, artist, float32 bytes) rows in one transaction.
+
+    Existing filenames are skipped, or updated in place with replace=True
+    (an UPSERT, so the row keeps its rowid). Returns rows written.
+    """
+    return _write(_insert_embeddings, rows, replace)
+
+def _insert_embeddings(c, rows, replace) -> int:
+    # rowcount sums sqlite3_changes(), which excludes the trigger's writes
+    if replace:
+        cur = c.executemany(
+            "INSERT INTO embeddings(filename, artist, embedding) VALUES(?,?,?) "
+            "ON CONFLICT(filename) DO UPDATE SET "
+            "artist=excluded.artist, embedding=excluded.embedding",
+            rows
+        )
+    else:
+        cur = c.executemany(
+            "INSERT OR IGNORE INTO embeddings(filename, artist, embedding) VALUES(?,?,?)",
+            rows
+        )
+    return cur.rowcount
+
+def pack_ids(ids) -> bytes:
+    return np.asarray(ids, dtype="<i8").tobytes()
+
+def unpack_ids(blob: bytes) -> np.ndarray:
+    return np.frombuffer(blob, dtype="<i8").astype(np.int64)
+
+def get_subset(strategy: str, size: int, seed: int = 0) -> int:
+    """Return the subset_id for (strategy, size, seed), sampling it once if new."""
+    import embstore
+    if strategy not in SUBSET_STRATEGIES:
+        raise ValueError(f"Unknown subset strategy {strategy!r}")
     with conn() as c:
-        if strategy == "artist_first5":
-            rows = c.execute("""
-                WITH ranked AS (
-                    SELECT filename, artist, embedding,
-                           ROW_NUMBER() OVER (
-                             PARTITION BY artist ORDER BY filename
-                           ) rn
-                    FROM embeddings
-                )
-                SELECT * FROM ranked WHERE rn <= 5;
-            """).fetchall()
-        else:
-            rows = c.execute(
-                "SELECT * FROM embeddings ORDER BY random() LIMIT ?",
-                (size,)
-            ).fetchall()
-    embeds = np.vstack([np.frombuffer(r["embedding"], np.float32) for r in rows])
-    meta   = [dict(r) for r in rows]
+        row = c.execute(
+            "SELECT subset_id, generation FROM subsets WHERE strategy=? AND size=? AND seed=?",
+            (strategy, size, seed)
+        ).fetchone()
+        if row and row["generation"] == embstore.generation(c):
+            return row["subset_id"]
+        if row:                           # embeddings changed since: drop deleted rows
+            subset_row_ids(row["subset_id"])
+            return row["subset_id"]
+        store = embstore.open_store(c)
+    if strategy == "artist_first5":
+        ids = store.first_per_artist(5)
+    else:
+        ids = store.sample_random(size, seed)
+    return _write(_insert_subset, strategy, size, seed, ids, store.generation)
+
+def _insert_subset(c, strategy, size, seed, ids, generation) -> int:
+    # OR IGNORE: a concurrent run may have materialised the same triple first
+    c.execute(
+        "INSERT OR IGNORE INTO subsets(strategy, size, seed, n, row_ids, generation) "
+        "VALUES(?,?,?,?,?,?)",
+        (strategy, size, seed, len(ids), pack_ids(ids), generation)
+    )
+    return c.execute(
+        "SELECT subset_id FROM subsets WHERE strategy=? AND size=? AND seed=?",
+        (strategy, size, seed)
+    ).fetchone()[0]
+
+def subset_row_ids(subset_id: int) -> np.ndarray:
+    """A subset's embeddings rowids. If embeddings changed since it was sampled,
+    rowids that no longer exist are dropped from it (and from the DB row)."""
+    import embstore
+    with conn() as c:
+        row = c.execute(
+            "SELECT row_ids, generation FROM subsets WHERE subset_id=?", (subset_id,)
+        ).fetchone()
+        if row is None:
+            raise ValueError(f"No subset with subset_id={subset_id}")
+        ids = unpack_ids(row["row_ids"])
+        if row["generation"] == embstore.generation(c):
+            return ids
+        store = embstore.open_store(c)
+    live = np.isin(ids, store.rowids)
+    if not live.all():
+        print(f"[db] subset {subset_id}: dropping {int((~live).sum())} deleted embeddings "
+              f"({int(live.sum())} left)")
+        ids = ids[live]
+    _write(_refresh_subset, subset_id, ids, store.generation)
+    return ids
+
+def _refresh_subset(c, subset_id, ids, generation) -> None:
+    c.execute("UPDATE subsets SET n=?, row_ids=?, generation=? WHERE subset_id=?",
+              (len(ids), pack_ids(ids), generation, subset_id))
+
+def load_subset(subset_id: int, with_stats: bool = False, tier: str = "f32"):
+    """Gather a materialised subset from the embedding store (no BLOB reads):
+    (embeddings, meta), meta being embstore.take's parallel rowid/filename/artist arrays.
+
+    tier="f16"/"i8" reads the quantized matrix (2–4× less I/O) and returns
+    it dequantized to float32.
+    """
+    import embstore
+    rowids = subset_row_ids(subset_id)
+    with conn() as c:
+        store = embstore.open_store(c)
+    embeds, meta = store.take(rowids, tier)
+    if with_stats:
+        return embeds, meta, store.subset_stats(rowids)
     return embeds, meta
 
-def _identity_cols(method: str) -> List[str]:
-    # treat all hyperparams except random_state as identity
-    return [c for c in PARAM_COLS[method] if c != "random_state"]
+def fetch_subset(strategy: str, size: int, with_stats: bool = False, seed: int = 0,
+                 tier: str = "f32"):
+    return load_subset(get_subset(strategy, size, seed), with_stats=with_stats, tier=tier)
+
+def subset_digest(subset_id: int) -> str:
+    """Hash of a subset's members and of embeddings_state.rewrites (run hashes)."""
+    with conn() as c:
+        row = c.execute("SELECT row_ids FROM subsets WHERE subset_id=?", (subset_id,)).fetchone()
+        if row is None:
+            raise ValueError(f"No subset with subset_id={subset_id}")
+        rewrites = c.execute("SELECT rewrites FROM embeddings_state WHERE id=0").fetchone()[0]
+    return f"{hashlib.sha256(row['row_ids']).hexdigest()}-{rewrites}"
+
+def find_run(method: str, run_hash: str):
+    """config_id of the completed run with this hash (points stored), else None."""
+    with conn() as c:
+        row = c.execute(
+            f"SELECT config_id FROM {method}_configs t WHERE run_hash=? AND "
+            "EXISTS (SELECT 1 FROM projection_runs WHERE method=? AND config_id=t.config_id)",
+            (run_hash, method)
+        ).fetchone()
+    return row["config_id"] if row else None
 
 def upsert_config(
     method: str,
     params: Dict[str, Any],
     strat: str,
     size: int,
-    runtime: float
+    runtime: float,
+    subset_id: int = None,
+    preprocess: str = None,
+    compile_time: float = None,
+    run_hash: str = None,
+    tier: str = None
 ) -> int:
+    return _write(_upsert_config, method, params, strat, size, runtime, subset_id, preprocess,
+                  compile_time, run_hash, tier)
+
+def _upsert_config(c, method, params, strat, size, runtime, subset_id, preprocess,
+                   compile_time=None, run_hash=None, tier=None) -> int:
+    """The row of this run (by run_hash, else by every column) → its config_id.
+
+    An existing row gets the new runtime and loses its old points; the writer
+    holds the write lock from SELECT to INSERT, so concurrent runs of the same
+    config end up on one row.
+    """
     tbl = f"{method}_configs"
-    id_cols = _identity_cols(method)
-    with conn() as c:
+    row = None
+    if run_hash is not None:
+        row = c.execute(f"SELECT config_id FROM {tbl} WHERE run_hash=?", (run_hash,)).fetchone()
+    if row is None:
+        # unhashed rows (older runs, callers without a hash) match on every
+        # column, random_state included; IS so that NULL matches NULL
         where = " AND ".join(
-            ["subset_strategy=?", "subset_size=?"] +
-            [f"{col}=?" for col in id_cols]
+            ["run_hash IS NULL", "subset_strategy IS ?", "subset_size IS ?", "subset_id IS ?",
+             "preprocess IS ?"] + [f"{col} IS ?" for col in PARAM_COLS[method]]
         )
-        values = [strat, size] + [params.get(col) for col in id_cols]
-        row = c.execute(f"SELECT config_id FROM {tbl} WHERE {where}", values).fetchone()
-
-        if row:
-            cfg_id = row["config_id"]
-            # update runtime & random_state, then wipe old points
-            if "random_state" in PARAM_COLS[method]:
-                c.execute(
-                    f"UPDATE {tbl} SET runtime=?, random_state=? WHERE config_id=?",
-                    (runtime, params.get("random_state"), cfg_id)
-                )
-            else:
-                c.execute(
-                    f"UPDATE {tbl} SET runtime=? WHERE config_id=?",
-                    (runtime, cfg_id)
-                )
-            c.execute(
-                "DELETE FROM projection_points WHERE method=? AND config_id=?",
-                (method, cfg_id)
-            )
-        else:
-            cols = ["subset_strategy", "subset_size", "runtime"] + PARAM_COLS[method]
-            placeholders = ",".join("?" for _ in cols)
-            vals = [strat, size, runtime] + [params.get(col) for col in PARAM_COLS[method]]
-            cur = c.execute(
-                f"INSERT INTO {tbl}({','.join(cols)}) VALUES({placeholders})",
-                vals
-            )
-            cfg_id = cur.lastrowid
+        values = [strat, size, subset_id, preprocess] + \
+            [params.get(col) for col in PARAM_COLS[method]]
+        row = c.execute(f"SELECT config_id FROM {tbl} WHERE {where} LIMIT 1", values).fetchone()
+
+    if row:
+        cfg_id = row["config_id"]
+        c.execute(
+            f"UPDATE {tbl} SET runtime=?, compile_time=?, run_hash=COALESCE(?, run_hash), "
+            "embedding_tier=COALESCE(?, embedding_tier) WHERE config_id=?",
+            (runtime, compile_time, run_hash, tier, cfg_id)
+        )
+        _delete_run(c, method, cfg_id)
+    else:
+        cols = ["subset_strategy", "subset_size", "runtime", "subset_id", "preprocess",
+                "compile_time", "run_hash", "embedding_tier"] + PARAM_COLS[method]
+        placeholders = ",".join("?" for _ in cols)
+        vals = [strat, size, runtime, subset_id, preprocess, compile_time, run_hash, tier] + \
+            [params.get(col) for col in PARAM_COLS[method]]
+        cur = c.execute(
+            f"INSERT INTO {tbl}({','.join(cols)}) VALUES({placeholders})",
+            vals
+        )
+        cfg_id = cur.lastrowid
     return cfg_id
 
 def save_points(method: str, cfg_id: int, meta: list, coords) -> None:
-    with conn() as c:
-        c.executemany(
-            "INSERT INTO projection_points("
-            "method, config_id, filename, artist, x, y) VALUES(?,?,?,?,?,?)",
-            [
-                (method, cfg_id, m["filename"], m["artist"],
-                 float(x), float(y))
-                for m, (x, y) in zip(meta, coords)
-            ]
+    """Store a run's (N × D) coordinates; meta (fetch_subset's arrays, or one dict
+    per point) supplies each point's rowid."""
+    try:
+        point_ids = (meta["rowids"] if isinstance(meta, dict) else
+                     np.fromiter((m["rowid"] for m in meta), np.int64, len(meta)))
+    except KeyError:
+        raise ValueError("save_points needs each point's embeddings rowid (meta['rowids'], or "
+                         "a 'rowid' per meta dict); or call save_run with point_ids") from None
+    save_run(method, cfg_id, point_ids, coords)
+
+def save_run(method: str, cfg_id: int, point_ids, coords) -> None:
+    coords = np.ascontiguousarray(np.asarray(coords, dtype="<f4"))
+    if coords.ndim == 1:
+        coords = coords[:, None]
+    if coords.shape[0] != len(point_ids):
+        raise ValueError(f"{coords.shape[0]} coordinates for {len(point_ids)} points")
+    _write(_replace_run, method, cfg_id, pack_ids(point_ids), coords)
+
+def _replace_run(c, method, cfg_id, ids_blob, coords) -> None:
+    _delete_run(c, method, cfg_id)
+    c.execute(
+        "INSERT INTO projection_runs(method, config_id, n, dim, point_ids, coords) "
+        "VALUES(?,?,?,?,?,?)",
+        (method, cfg_id, coords.shape[0], coords.shape[1], ids_blob, coords.tobytes())
+    )
+
+def _delete_run(c, method, cfg_id) -> None:
+    c.execute("DELETE FROM projection_runs WHERE method=? AND config_id=?", (method, cfg_id))
+    # runs written before projection_runs existed
+    c.execute("DELETE FROM projection_points WHERE method=? AND config_id=?", (method, cfg_id))
+    c.execute("DELETE FROM run_metrics WHERE method=? AND config_id=?", (method, cfg_id))
+
+def delete_run(method: str, cfg_id: int) -> None:
+    _write(_delete_run, method, cfg_id)
+
+def append_run(method: str, cfg_id: int, point_ids, coords) -> int:
+    """Append points to an existing run (out-of-sample placement).
+
+    Ids already in the run are skipped; returns how many were added.
+    """
+    coords = np.ascontiguousarray(np.asarray(coords, dtype="<f4"))
+    if coords.ndim == 1:
+        coords = coords[:, None]
+    if coords.shape[0] != len(point_ids):
+        raise ValueError(f"{coords.shape[0]} coordinates for {len(point_ids)} points")
+    return _write(_append_run, method, cfg_id, np.asarray(point_ids, dtype=np.int64), coords)
+
+def _append_run(c, method, cfg_id, point_ids, coords) -> int:
+    run = c.execute(
+        "SELECT n, dim, point_ids, coords FROM projection_runs WHERE method=? AND config_id=?",
+        (method, cfg_id)
+    ).fetchone()
+    if run is None:
+        raise ValueError(f"No stored run for method={method}, config_id={cfg_id}")
+    if coords.shape[1] != run["dim"]:
+        raise ValueError(f"{coords.shape[1]}-d coordinates for a {run['dim']}-d run")
+    keep = ~np.isin(point_ids, unpack_ids(run["point_ids"]))
+    added = int(keep.sum())
+    if added:
+        # (blob || blob is TEXT in SQLite, so concatenate here)
+        c.execute(
+            "UPDATE projection_runs SET n=?, point_ids=?, coords=? WHERE method=? AND config_id=?",
+            (run["n"] + added, run["point_ids"] + pack_ids(point_ids[keep]),
+             run["coords"] + coords[keep].tobytes(), method, cfg_id)
         )
+        # scores were computed on the points before; stale once the run grows
+        c.execute("DELETE FROM run_metrics WHERE method=? AND config_id=?", (method, cfg_id))
+    return added
+
+def save_metrics(method: str, cfg_id: int, rows) -> None:
+    """Replace a run's scores with (metric, k, label, value, n) rows."""
+    _write(_save_metrics, method, cfg_id, list(rows))
+
+def _save_metrics(c, method, cfg_id, rows) -> None:
+    c.execute("DELETE FROM run_metrics WHERE method=? AND config_id=?", (method, cfg_id))
+    c.executemany(
+        "INSERT INTO run_metrics(method, config_id, metric, k, label, value, n) "
+        "VALUES(?,?,?,?,?,?,?)",
+        [(method, cfg_id, m, k, label, None if v != v else v, n) for m, k, label, v, n in rows]
+    )
+
+def get_metrics(method: str = None, cfg_id: int = None, methods=None) -> list:
+    """run_metrics rows as dicts, optionally for one run or some methods."""
+    where, args = [], []
+    if method is not None:
+        where.append("method=?")
+        args.append(method)
+    if cfg_id is not None:
+        where.append("config_id=?")
+        args.append(cfg_id)
+    if methods:
+        where.append("method IN (SELECT value FROM json_each(?))")
+        args.append(json.dumps(list(methods)))
+    sql = "SELECT * FROM run_metrics" + (" WHERE " + " AND ".join(where) if where else "")
+    with conn() as c:
+        return [dict(r) for r in c.execute(sql + " ORDER BY method, config_id, metric, k, label",
+                                           args)]
+
+def rowids_for_filenames(filenames) -> dict:
+    """filename → embeddings.rowid for the filenames that exist."""
+    with conn() as c:
+        rows = c.execute(
+            "SELECT filename, rowid FROM embeddings WHERE filename IN (SELECT value FROM json_each(?))",
+            (json.dumps(list(filenames)),)
+        ).fetchall()
+    return {fn: rid for fn, rid in rows}
 
 # Fetches the config parameters for a given method and config_id.
 def get_dr_config(method: str, config_id: int) -> dict:
@@ -374,31 +728,64 @@ def get_dr_config(method: str, config_id: int) -> dict:
             raise ValueError(f"No config found for method={method}, config_id={config_id}")
         return dict(row)
 
-# Fetches all projection points (point_id, filename, artist, x, y) for a given method and config_id.
-def get_projection_points(method: str, config_id: int) -> list:
+# Fetches all projection points for a given method and config_id.
+# Default: list of (point_id, filename, artist, x, y) tuples (x, y = first two
+# dims). as_arrays=True: dict of NumPy arrays, no per-point Python objects.
+def get_projection_points(method: str, config_id: int, as_arrays: bool = False):
+    import embstore
     with conn() as c:
-        rows = c.execute(
-            "SELECT point_id, filename, artist, x, y FROM projection_points WHERE method = ? AND config_id = ?",
+        run = c.execute(
+            "SELECT n, dim, point_ids, coords FROM projection_runs "
+            "WHERE method = ? AND config_id = ?",
             (method, config_id)
-        ).fetchall()
+        ).fetchone()
+        if run is None:
+            return _legacy_projection_points(c, method, config_id, as_arrays)
+        store = embstore.open_store(c)
+    point_ids = unpack_ids(run["point_ids"])
+    coords = np.frombuffer(run["coords"], dtype="<f4").reshape(run["n"], run["dim"])
+    filenames, artists = store.lookup(point_ids)
+    if as_arrays:
+        return {"point_ids": point_ids, "coords": coords,
+                "filenames": filenames, "artists": artists}
+    xs = coords[:, 0].tolist()
+    ys = coords[:, 1].tolist() if run["dim"] > 1 else [0.0] * run["n"]
+    return list(zip(point_ids.tolist(), filenames.tolist(), artists.tolist(), xs, ys))
+
+def _legacy_projection_points(c, method, config_id, as_arrays):
+    rows = c.execute(
+        "SELECT point_id, filename, artist, x, y FROM projection_points WHERE method = ? AND config_id = ?",
+        (method, config_id)
+    ).fetchall()
+    if not as_arrays:
         return [tuple(r) for r in rows]  # Each row is (point_id, filename, artist, x, y)
+    if not rows:
+        return None
+    cols = list(zip(*rows))
+    return {
+        "point_ids": np.asarray(cols[0], dtype=np.int64),
+        "coords":    np.column_stack([cols[3], cols[4]]).astype(np.float32),
+        "filenames": np.asarray(cols[1], dtype=str),
+        "artists":   np.asarray(cols[2], dtype=str),
+    }
 
 # Inserts a new viz_config row and returns the new viz_id.
 def insert_viz_config(method: str, low_res: str, config_id: int, point_ids_blob: bytes) -> int:
-    with conn() as c:
-        cur = c.execute(
-            "INSERT INTO viz_config (method, low_res, config_id, point_ids) VALUES (?, ?, ?, ?)",
-            (method, low_res, config_id, point_ids_blob)
-        )
-        return cur.lastrowid
+    return _write(_insert_viz_config, method, low_res, config_id, point_ids_blob)
+
+def _insert_viz_config(c, method, low_res, config_id, point_ids_blob) -> int:
+    cur = c.execute(
+        "INSERT INTO viz_config (method, low_res, config_id, point_ids) VALUES (?, ?, ?, ?)",
+        (method, low_res, config_id, point_ids_blob)
+    )
+    return cur.lastrowid
 
 # Updates the low_res image path for a given viz_id.
 def update_viz_config_image(viz_id: int, low_res: str) -> None:
-    with conn() as c:
-        c.execute(
-            "UPDATE viz_config SET low_res = ? WHERE viz_id = ?",
-            (low_res, viz_id)
-        )
+    _write(lambda c: c.execute(
+        "UPDATE viz_config SET low_res = ? WHERE viz_id = ?",
+        (low_res, viz_id)
+    ))
 
 # Fetches all metadata for a given viz_id from viz_config.
 def get_viz_config(viz_id: int) -> dict:
@@ -411,30 +798,43 @@ def get_viz_config(viz_id: int) -> dict:
             raise ValueError(f"No viz_config found for viz_id={viz_id}")
         return dict(row)
 
-# Bulk inserts normalized points for a visualization into viz_points.
-def insert_viz_points(viz_id: int, points: list) -> None:
-    with conn() as c:
-        c.executemany(
-            "INSERT INTO viz_points (viz_id, point_id, viz_x, viz_y) VALUES (?, ?, ?, ?)",
-            [
-                (
-                    viz_id,
-                    p["point_id"],
-                    p["viz_x"],
-                    p["viz_y"]
-                )
-                for p in points
-            ]
-        )
+# Bulk inserts normalized points for a visualization into viz_points:
+# three parallel arrays, written in point_id order (the primary key's order).
+def insert_viz_points(viz_id: int, point_ids, viz_x, viz_y) -> None:
+    point_ids = np.asarray(point_ids, dtype=np.int64)
+    order = np.argsort(point_ids, kind="stable")
+    rows = zip(itertools.repeat(viz_id), point_ids[order].tolist(),
+               np.asarray(viz_x)[order].tolist(), np.asarray(viz_y)[order].tolist())
+    _write(lambda c: c.executemany(
+        "INSERT INTO viz_points (viz_id, point_id, viz_x, viz_y) VALUES (?, ?, ?, ?)",
+        rows
+    ))
 
 # Fetches all points (with normalized coordinates) for a given viz_id from viz_points.
-def get_viz_points(viz_id: int) -> list:
+# as_arrays: dict(point_ids, viz_x, viz_y) of parallel arrays in point_id order.
+def get_viz_points(viz_id: int, as_arrays: bool = False):
     with conn() as c:
         rows = c.execute(
             "SELECT * FROM viz_points WHERE viz_id = ?",
             (viz_id,)
         ).fetchall()
-        return [dict(r) for r in rows]
+        if not as_arrays:
+            return [dict(r) for r in rows]
+        a = np.array([(r["point_id"], r["viz_x"], r["viz_y"]) for r in rows],
+                     dtype=np.int64).reshape(-1, 3)
+        a = a[np.argsort(a[:, 0], kind="stable")]
+        return {"point_ids": a[:, 0], "viz_x": a[:, 1].astype(np.int32),
+                "viz_y": a[:, 2].astype(np.int32)}
+
+# Latest viz_config row of a run whose low_res ends with *suffix* (e.g. ".dzi"), or None.
+def latest_viz_config(method: str, config_id: int, suffix: str = "") -> dict:
+    with conn() as c:
+        row = c.execute(
+            "SELECT * FROM viz_config WHERE method = ? AND config_id = ? AND low_res LIKE ? "
+            "ORDER BY viz_id DESC LIMIT 1",
+            (method, config_id, "%" + suffix)
+        ).fetchone()
+        return dict(row) if row else None
 
 # auto-init
 init_schema()
\ No newline at end of file
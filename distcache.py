@@ -0,0 +1,133 @@
+# distcache.py
+#!/usr/bin/env python3
+"""Shared float32 pairwise-distance matrices for the O(n²) methods.
+
+clmds, mds and sammon_random all need the full n×n distance matrix of a
+subset. Instead of each computing its own float64 copy (plus pdist's
+condensed one), the matrix is computed once per (subset, preprocessing,
+metric) in BLAS-backed tiles and kept on disk, memory-mapped read-only:
+
+    <DR_CACHE>/dist/s<subset_id>_<prep>_<metric>/
+        square.npy   float32 (n, n), exactly symmetric, zero diagonal
+        meta.json    n, metric, embeddings_state.rewrites
+
+Every run on that subset is handed the same mapped buffer. Before anything
+is allocated the projected footprint – the matrix plus the dense n×n
+float64 work arrays the method itself allocates – is checked against
+DR_DIST_BUDGET_GB (default 8); over budget the run is refused with the
+largest subset size that would fit.
+"""
+import json, os, time
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import db, registry
+
+DIST_DIR = Path(db.CACHE_DIR) / "dist"
+BUDGET_BYTES = int(float(os.getenv("DR_DIST_BUDGET_GB", "8")) * 2**30)
+TILE = 2048
+
+# Methods that can take a precomputed matrix → rough number of dense n×n
+# float64 arrays they allocate on top of it (SMACOF keeps distances, B and
+# the previous iterate; Sammon its delta/gradient terms; cl-MDS one copy)
+DIST_METHODS = {name: m.distances for name, m in registry.METHODS.items() if m.distances}
+
+
+class DistanceBudgetError(ValueError):
+    pass
+
+
+def wants_distances(method: str, cfg: dict) -> bool:
+    """Whether this method/config would compute Euclidean distances itself."""
+    if method == "mds":
+        return cfg.get("dissimilarity", "euclidean") == "euclidean"
+    if method == "sammon_random":
+        return cfg.get("input_type", "vector") == "vector"
+    return method in DIST_METHODS
+
+
+def footprint(n: int, method: str) -> int:
+    """Projected bytes: float32 matrix + the method's float64 work arrays."""
+    return n * n * (4 + 8 * DIST_METHODS.get(method, 0))
+
+
+def check_budget(n: int, method: str, budget: int = BUDGET_BYTES) -> None:
+    need = footprint(n, method)
+    if need > budget:
+        n_max = int((budget / footprint(1, method)) ** 0.5)
+        raise DistanceBudgetError(
+            f"{method} on {n:,} points needs ~{need / 2**20:,.0f} MiB of pairwise "
+            f"distances (budget {budget / 2**20:,.0f} MiB, DR_DIST_BUDGET_GB); "
+            f"subsample to subset_size <= {n_max:,} or raise the budget"
+        )
+
+
+def compute(X: np.ndarray, out: np.ndarray, metric: str = "euclidean", tile: int = TILE) -> None:
+    """Fill *out* (n×n float32, e.g. a memmap) tile by tile over the upper
+    triangle, mirroring each tile so the result is exactly symmetric."""
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    n = len(X)
+    sq = (X * X).sum(axis=1)
+    for i in range(0, n, tile):
+        a = X[i:i + tile]
+        for j in range(i, n, tile):
+            b = X[j:j + tile]
+            if metric == "euclidean":
+                d = sq[i:i + tile, None] - 2.0 * (a @ b.T) + sq[None, j:j + tile]
+                np.sqrt(np.maximum(d, 0, out=d), out=d)
+            else:
+                from sklearn.metrics import pairwise_distances
+                d = pairwise_distances(a, b, metric=metric).astype(np.float32)
+            if i == j:
+                d = (d + d.T) / 2               # a + b == b + a, so exactly symmetric
+                np.fill_diagonal(d, 0)
+            out[i:i + tile, j:j + tile] = d
+            out[j:j + tile, i:i + tile] = d.T
+
+
+def matrix_dir(subset_id: int, metric: str, prep: str = "f32") -> Path:
+    return DIST_DIR / f"s{subset_id}_{prep}_{metric}"
+
+
+def _load(root: Path, n: int, rewrites: int) -> Optional[np.ndarray]:
+    try:
+        with open(root / "meta.json") as f:
+            meta = json.load(f)
+        if meta["n"] != n or meta["rewrites"] != rewrites:
+            return None
+        return np.load(root / "square.npy", mmap_mode="r")
+    except (FileNotFoundError, ValueError, KeyError):
+        return None
+
+
+def get_distances(X: np.ndarray, subset_id: int, method: str, metric: str = "euclidean",
+                  prep: str = "f32") -> np.ndarray:
+    """Read-only memory-mapped n×n distances of subset *subset_id* (rows in
+    subset order), computing them from X on a miss. Raises
+    DistanceBudgetError if *method* on this subset would exceed the budget."""
+    from embstore import _locked, _write_meta, state
+    n = len(X)
+    check_budget(n, method)
+    with db.conn() as c:
+        rewrites = state(c)[1]
+    root = matrix_dir(subset_id, metric, prep)
+    D = _load(root, n, rewrites)
+    if D is not None:
+        return D
+    with _locked(root):
+        D = _load(root, n, rewrites)          # another process may have built it
+        if D is not None:
+            return D
+        t0 = time.time()
+        tmp = root / "square.tmp.npy"
+        out = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=(n, n))
+        compute(X, out, metric)
+        out.flush()
+        del out
+        os.replace(tmp, root / "square.npy")
+        _write_meta(root, {"subset_id": subset_id, "prep": prep, "metric": metric,
+                           "n": n, "rewrites": rewrites, "seconds": round(time.time() - t0, 3)})
+        print(f"[distcache] computed {n:,}×{n:,} {metric} distances for subset {subset_id} "
+              f"({n * n * 4 / 2**20:.0f} MiB) in {time.time() - t0:.2f}s")
+    return _load(root, n, rewrites)
@@ -0,0 +1,549 @@
+# embstore.py
+#!/usr/bin/env python3
+"""Memory-mapped float32 copy of the `embeddings` table.
+
+The matrix lives under ``<DR_CACHE>/embeddings/`` as plain ``.npy`` files:
+
+    matrix.npy     float32 (N, D), row i = i-th embedding in rowid order
+    rowids.npy     int64   (N,)    embeddings.rowid of each matrix row (sorted)
+    filenames.npy  str     (N,)
+    artists.npy    str     (N,)
+    rowstats.npy   (N,) records: norm, min, max, nan, inf
+    keys.npy       uint64  (N,)    64-bit hash of the filename (subset sampling)
+    meta.json      generation, shape and corpus-wide stats
+
+Optional quantized tiers (built on first use, rebuilt with the store):
+
+    matrix_f16.npy float16 (N, D)
+    matrix_i8.npy  int8    (N, D)  x ≈ code * scale + offset, per dimension
+    i8_params.npy  float32 (2, D)  rows: scale, offset
+    tier_<t>.json  generation the tier was derived from
+
+Triggers on `embeddings` bump `embeddings_state.generation` on every
+INSERT/UPDATE/DELETE (and `rewrites` on UPDATE/DELETE only). A store whose
+meta.json carries another generation is refreshed on next use – appended
+in place if only inserts happened, rebuilt otherwise – so readers never
+see stale rows.
+"""
+import fcntl, hashlib, json, os, time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+import db
+
+STORE_DIR = Path(db.CACHE_DIR) / "embeddings"
+CHUNK_ROWS = 4096
+TIERS = ("f32", "f16", "i8")
+
+ROWSTATS_DTYPE = np.dtype([
+    ("norm", np.float32),
+    ("min",  np.float32),
+    ("max",  np.float32),
+    ("nan",  np.bool_),
+    ("inf",  np.bool_),
+])
+
+_cached = None   # process-wide EmbeddingStore, reused while generation matches
+
+
+class EmbeddingStore:
+    """Read-only view over the on-disk matrix and its filename/artist index."""
+
+    def __init__(self, root: Path):
+        self.root = root
+        with open(root / "meta.json") as f:
+            self.meta = json.load(f)
+        self.generation = self.meta["generation"]
+        self.matrix    = np.load(root / "matrix.npy",    mmap_mode="r")
+        self.rowids    = np.load(root / "rowids.npy",    mmap_mode="r")
+        self.filenames = np.load(root / "filenames.npy", mmap_mode="r")
+        self.artists   = np.load(root / "artists.npy",   mmap_mode="r")
+        self.rowstats  = np.load(root / "rowstats.npy",  mmap_mode="r")
+        self.keys      = np.load(root / "keys.npy",      mmap_mode="r")
+        self._tiers: Dict[str, np.ndarray] = {}
+        self._i8_params = None
+
+    def __len__(self) -> int:
+        return self.matrix.shape[0]
+
+    def positions(self, rowids) -> np.ndarray:
+        """Map embeddings.rowid values to matrix row positions."""
+        rowids = np.asarray(rowids, dtype=np.int64)
+        pos = np.searchsorted(self.rowids, rowids)
+        pos = np.minimum(pos, len(self) - 1)
+        if len(self) == 0 or not np.array_equal(self.rowids[pos], rowids):
+            missing = np.setdiff1d(rowids, self.rowids)
+            raise KeyError(f"{len(missing)} rowid(s) not in the embedding store, e.g. "
+                           f"{missing[:3].tolist()} (deleted embeddings? subsets drop them "
+                           f"via db.subset_row_ids)")
+        return pos
+
+    def tier(self, name: str) -> np.ndarray:
+        """Raw (memory-mapped) matrix of a tier, quantizing it on first use."""
+        if name == "f32":
+            return self.matrix
+        if name not in TIERS:
+            raise ValueError(f"Unknown embedding tier {name!r}; expected one of {TIERS}")
+        if name not in self._tiers:
+            try:
+                with open(self.root / f"tier_{name}.json") as f:
+                    fresh = json.load(f)["generation"] == self.generation
+            except FileNotFoundError:
+                fresh = False
+            if not fresh:
+                build_tier(self, name)
+            self._tiers[name] = np.load(self.root / f"matrix_{name}.npy", mmap_mode="r")
+            if name == "i8":
+                self._i8_params = np.load(self.root / "i8_params.npy")
+        return self._tiers[name]
+
+    def tier_dtype(self, name: str):
+        return {"f32": np.float32, "f16": np.float16, "i8": np.int8}[name]
+
+    def decode(self, codes: np.ndarray, name: str) -> np.ndarray:
+        """Tier codes → float32 (a no-op view for f32)."""
+        if name == "i8":
+            scale, offset = self._i8_params
+            return codes.astype(np.float32) * scale + offset
+        return np.asarray(codes, dtype=np.float32)
+
+    def take(self, rowids, tier: str = "f32") -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """Gather rows by rowid → (contiguous float32 matrix, meta), meta being
+        parallel arrays {"rowids", "filenames", "artists"}, one entry per row."""
+        pos = self.positions(rowids)
+        X = np.ascontiguousarray(self.decode(self.tier(tier)[pos], tier))
+        meta = {"rowids": self.rowids[pos], "filenames": self.filenames[pos],
+                "artists": self.artists[pos]}
+        return X, meta
+
+    def lookup(self, rowids) -> Tuple[np.ndarray, np.ndarray]:
+        """(filenames, artists) for rowids; rows deleted since get ""."""
+        rowids = np.asarray(rowids, dtype=np.int64)
+        if len(self) == 0:
+            empty = np.full(len(rowids), "", dtype=str)
+            return empty, empty
+        pos = np.minimum(np.searchsorted(self.rowids, rowids), len(self) - 1)
+        hit = self.rowids[pos] == rowids
+        fns = np.where(hit, self.filenames[pos], "")
+        arts = np.where(hit, self.artists[pos], "")
+        return fns, arts
+
+    def sample_random(self, size: int, seed: int) -> np.ndarray:
+        """Seeded bottom-k sample over filename hashes → sorted rowids.
+
+        Each row's rank depends only on (filename, seed), so re-sampling a
+        grown corpus keeps almost every previously chosen row.
+        """
+        if size >= len(self):
+            return np.array(self.rowids, dtype=np.int64)
+        h = _mix64(self.keys ^ _mix64(np.uint64(seed % 2**64)))
+        pos = np.argpartition(h, size - 1)[:size]
+        return np.sort(self.rowids[pos]).astype(np.int64)
+
+    def first_per_artist(self, per_artist: int = 5) -> np.ndarray:
+        """First *per_artist* filenames of every artist → sorted rowids."""
+        order = np.lexsort((self.filenames, self.artists))
+        arts = self.artists[order]
+        starts = np.flatnonzero(np.r_[True, arts[1:] != arts[:-1]])
+        group_start = np.repeat(starts, np.diff(np.r_[starts, len(arts)]))
+        rank = np.arange(len(arts)) - group_start
+        return np.sort(self.rowids[order[rank < per_artist]]).astype(np.int64)
+
+    def subset_stats(self, rowids) -> dict:
+        """Stats of a subset from the per-row stats recorded at write time (O(k))."""
+        rs = self.rowstats[self.positions(rowids)]
+        if len(rs) == 0:
+            return {"n": 0, "dim": self.meta["dim"]}
+        return {
+            "n":         int(len(rs)),
+            "dim":       self.meta["dim"],
+            "min":       float(rs["min"].min()),
+            "max":       float(rs["max"].max()),
+            "mean_norm": float(rs["norm"].mean()),
+            "has_nan":   bool(rs["nan"].any()),
+            "has_inf":   bool(rs["inf"].any()),
+        }
+
+
+def _mix64(x):
+    """splitmix64 finaliser, vectorised over uint64 (wrap-around intended)."""
+    x = np.asarray(x, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def filename_key(filename: str) -> int:
+    return int.from_bytes(hashlib.blake2b(filename.encode(), digest_size=8).digest(), "little")
+
+
+def state(c) -> Tuple[int, int]:
+    """(generation, rewrites): every write vs. only UPDATE/DELETE on embeddings."""
+    row = c.execute("SELECT generation, rewrites FROM embeddings_state WHERE id=0").fetchone()
+    return (row[0], row[1]) if row else (0, 0)
+
+
+def generation(c) -> int:
+    return state(c)[0]
+
+
+@contextmanager
+def _locked(root: Path):
+    """Serialise builders/appenders across processes."""
+    root.mkdir(parents=True, exist_ok=True)
+    with open(root / ".lock", "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _save(path: Path, arr: np.ndarray) -> None:
+    tmp = path.with_suffix(".tmp.npy")
+    np.save(tmp, arr)
+    os.replace(tmp, path)
+
+
+def _append_npy(path: Path, arr: np.ndarray) -> None:
+    """Append rows to a C-order .npy in place, patching the shape in its header.
+
+    NumPy pads headers so axis 0 can grow without moving the data; string
+    arrays that need a wider dtype are rewritten instead.
+    """
+    fmt = np.lib.format
+    readers = {(1, 0): fmt.read_array_header_1_0, (2, 0): fmt.read_array_header_2_0}
+    writers = {(1, 0): fmt.write_array_header_1_0, (2, 0): fmt.write_array_header_2_0}
+    with open(path, "r+b") as f:
+        version = fmt.read_magic(f)
+        if version not in readers:
+            raise ValueError(f"{path.name}: unsupported .npy version {version}")
+        shape, fortran, dtype = readers[version](f)
+        offset = f.tell()
+        arr = np.ascontiguousarray(arr)
+        if arr.dtype.kind == "U" and dtype.kind == "U" and arr.dtype.itemsize <= dtype.itemsize:
+            arr = arr.astype(dtype)
+        if fortran or arr.dtype != dtype or arr.shape[1:] != shape[1:]:
+            if arr.dtype.kind == "U" and dtype.kind == "U":
+                old = np.load(path)
+                wide = np.concatenate([old, arr])
+                f.close()
+                _save(path, wide)
+                return
+            raise ValueError(f"cannot append {arr.dtype}{arr.shape} to {dtype}{shape}")
+        f.seek(0, os.SEEK_END)
+        f.write(arr.tobytes())
+        f.seek(0)
+        header = {"descr": fmt.dtype_to_descr(dtype), "fortran_order": False,
+                  "shape": (shape[0] + len(arr),) + shape[1:]}
+        writers[version](f, header)
+        if f.tell() != offset:
+            raise RuntimeError(f"{path.name}: .npy header grew while appending")
+
+
+def _encode_rows(rows, dim: int):
+    """DB rows (rowid, filename, artist, embedding) → arrays for one chunk."""
+    k = len(rows)
+    blob = b"".join(r[3] for r in rows)
+    if len(blob) != k * dim * 4:
+        raise ValueError(f"embeddings have inconsistent dimensionality (expected {dim})")
+    block = np.frombuffer(blob, np.float32).reshape(k, dim)
+    rowstats = np.empty(k, ROWSTATS_DTYPE)
+    with np.errstate(invalid="ignore", over="ignore"):
+        rowstats["norm"] = np.linalg.norm(block.astype(np.float64), axis=1)
+        rowstats["min"] = block.min(axis=1) if dim else 0
+        rowstats["max"] = block.max(axis=1) if dim else 0
+    rowstats["nan"] = np.isnan(block).any(axis=1)
+    rowstats["inf"] = np.isinf(block).any(axis=1)
+    return (block,
+            np.fromiter((r[0] for r in rows), np.int64, k),
+            [r[1] for r in rows],
+            [r[2] or "" for r in rows],
+            rowstats)
+
+
+def _corpus_stats(rowstats: np.ndarray) -> dict:
+    n = len(rowstats)
+    return {
+        "min":       float(np.nanmin(rowstats["min"])) if n else None,
+        "max":       float(np.nanmax(rowstats["max"])) if n else None,
+        "mean_norm": float(np.nanmean(rowstats["norm"])) if n else None,
+        "nan_rows":  int(rowstats["nan"].sum()),
+        "inf_rows":  int(rowstats["inf"].sum()),
+    }
+
+
+def _write_meta(root: Path, meta: dict) -> None:
+    # meta.json goes last: it is what marks the store as valid
+    tmp = root / "meta.json.tmp"
+    with open(tmp, "w") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp, root / "meta.json")
+
+
+def _write_tier_meta(store: "EmbeddingStore", name: str, dtype) -> None:
+    tmp = store.root / f"tier_{name}.json.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"generation": store.generation, "dtype": np.dtype(dtype).name}, f)
+    os.replace(tmp, store.root / f"tier_{name}.json")
+
+
+def _i8_params(matrix: np.ndarray) -> np.ndarray:
+    """Per-dimension affine params mapping [min, max] onto int8 [-128, 127]."""
+    lo = np.full(matrix.shape[1], np.inf, np.float32)
+    hi = np.full(matrix.shape[1], -np.inf, np.float32)
+    for i in range(0, matrix.shape[0], CHUNK_ROWS):
+        block = np.nan_to_num(matrix[i:i + CHUNK_ROWS], posinf=0, neginf=0)
+        lo = np.minimum(lo, block.min(axis=0))
+        hi = np.maximum(hi, block.max(axis=0))
+    scale = (hi - lo) / 255.0
+    scale[~(scale > 0)] = 1.0           # constant dims (and empty stores)
+    offset = lo + 128.0 * scale
+    return np.stack([scale, offset]).astype(np.float32)
+
+
+def _quantize(block: np.ndarray, name: str, params=None) -> np.ndarray:
+    block = np.nan_to_num(block, posinf=0, neginf=0)
+    if name == "i8":
+        scale, offset = params
+        return np.clip(np.rint((block - offset) / scale), -128, 127).astype(np.int8)
+    return block.astype(np.float16)
+
+
+def build_tier(store: EmbeddingStore, name: str) -> None:
+    """Quantize the float32 matrix chunk-by-chunk into tier *name*."""
+    t0 = time.time()
+    src = store.matrix
+    n, dim = src.shape
+    tmp = store.root / f"matrix_{name}.tmp.npy"
+    dtype = np.float16 if name == "f16" else np.int8
+    out = np.lib.format.open_memmap(tmp, mode="w+", dtype=dtype, shape=(n, dim))
+    params = _i8_params(src) if name == "i8" else None
+    for i in range(0, n, CHUNK_ROWS):
+        out[i:i + CHUNK_ROWS] = _quantize(src[i:i + CHUNK_ROWS], name, params)
+    out.flush()
+    del out
+    os.replace(tmp, store.root / f"matrix_{name}.npy")
+    if name == "i8":
+        _save(store.root / "i8_params.npy", params)
+    _write_tier_meta(store, name, dtype)
+    print(f"[embstore] built {name} tier {n}×{dim} in {time.time() - t0:.2f}s")
+
+
+def _live_tiers(root: Path) -> List[str]:
+    return [t for t in TIERS[1:] if (root / f"tier_{t}.json").exists()]
+
+
+def build(c, root: Path = STORE_DIR) -> EmbeddingStore:
+    """Stream the `embeddings` table into a fresh store under *root*."""
+    gen, rewrites = state(c)
+    # tiers in use before the rebuild are re-derived afterwards
+    tiers = _live_tiers(root)
+    n = c.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+    first = c.execute("SELECT embedding FROM embeddings LIMIT 1").fetchone()
+    dim = len(first[0]) // 4 if first else 0
+
+    root.mkdir(parents=True, exist_ok=True)
+    tmp_matrix = root / "matrix.tmp.npy"
+    matrix = np.lib.format.open_memmap(tmp_matrix, mode="w+", dtype=np.float32, shape=(n, dim))
+    rowids = np.empty(n, np.int64)
+    rowstats = np.empty(n, ROWSTATS_DTYPE)
+    filenames: List[str] = []
+    artists: List[str] = []
+
+    t0 = time.time()
+    cur = c.execute("SELECT rowid, filename, artist, embedding FROM embeddings ORDER BY rowid")
+    i = 0
+    while True:
+        rows = cur.fetchmany(CHUNK_ROWS)
+        if not rows:
+            break
+        k = len(rows)
+        block, ids, fns, arts, rs = _encode_rows(rows, dim)
+        matrix[i:i + k] = block
+        rowids[i:i + k] = ids
+        rowstats[i:i + k] = rs
+        filenames.extend(fns)
+        artists.extend(arts)
+        i += k
+    matrix.flush()
+    del matrix
+    if i != n:
+        raise RuntimeError("embeddings changed while building the store; retry")
+
+    os.replace(tmp_matrix, root / "matrix.npy")
+    _save(root / "rowids.npy", rowids)
+    _save(root / "filenames.npy", np.array(filenames, dtype=str))
+    _save(root / "artists.npy", np.array(artists, dtype=str))
+    _save(root / "rowstats.npy", rowstats)
+    _save(root / "keys.npy", np.fromiter((filename_key(f) for f in filenames), np.uint64, n))
+    _write_meta(root, {
+        "generation": gen,
+        "rewrites":   rewrites,
+        "n":          n,
+        "dim":        dim,
+        **_corpus_stats(rowstats),
+        "built_at":   time.strftime("%Y-%m-%d %H:%M:%S"),
+    })
+    print(f"[embstore] built {n}×{dim} store (generation {gen}) in {time.time() - t0:.2f}s")
+    store = EmbeddingStore(root)
+    for t in tiers:
+        build_tier(store, t)
+    return store
+
+
+def append(c, store: EmbeddingStore) -> EmbeddingStore:
+    """Bring *store* up to date when rows were only INSERTed since it was built.
+
+    New rows (rowid > last stored rowid) are appended to every array and
+    quantized tier in place; the int8 tier keeps its scale/offset and clips.
+    Falls back to a full build() if anything else changed.
+    """
+    gen, rewrites = state(c)
+    root, meta = store.root, dict(store.meta)
+    last = int(store.rowids[-1]) if len(store) else 0
+    n_new = c.execute("SELECT COUNT(*) FROM embeddings WHERE rowid > ?", (last,)).fetchone()[0]
+    n_all = c.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+    if meta.get("rewrites") != rewrites or n_all != len(store) + n_new or meta["dim"] == 0:
+        return build(c, root)
+
+    t0 = time.time()
+    tiers = [t for t in _live_tiers(root) if store.tier(t) is not None]
+    params = store._i8_params
+    new_stats = []
+    cur = c.execute("SELECT rowid, filename, artist, embedding FROM embeddings "
+                    "WHERE rowid > ? ORDER BY rowid", (last,))
+    while True:
+        rows = cur.fetchmany(CHUNK_ROWS)
+        if not rows:
+            break
+        block, ids, fns, arts, rs = _encode_rows(rows, meta["dim"])
+        _append_npy(root / "matrix.npy", block)
+        _append_npy(root / "rowids.npy", ids)
+        _append_npy(root / "filenames.npy", np.array(fns, dtype=str))
+        _append_npy(root / "artists.npy", np.array(arts, dtype=str))
+        _append_npy(root / "rowstats.npy", rs)
+        _append_npy(root / "keys.npy", np.fromiter((filename_key(f) for f in fns), np.uint64, len(fns)))
+        for t in tiers:
+            _append_npy(root / f"matrix_{t}.npy", _quantize(block, t, params))
+        new_stats.append(rs)
+
+    store = None                              # drop the old (shorter) mmaps
+    rowstats = np.load(root / "rowstats.npy", mmap_mode="r")
+    meta.update({"generation": gen, "n": len(rowstats), **_corpus_stats(rowstats),
+                 "appended_at": time.strftime("%Y-%m-%d %H:%M:%S")})
+    _write_meta(root, meta)
+    store = EmbeddingStore(root)
+    for t in tiers:
+        _write_tier_meta(store, t, store.tier_dtype(t))
+    print(f"[embstore] appended {n_new} rows (generation {gen}) in {time.time() - t0:.2f}s")
+    return store
+
+
+def open_store(c, root: Path = STORE_DIR) -> EmbeddingStore:
+    """Return a store in sync with the `embeddings` table.
+
+    Pure appends are applied incrementally; any UPDATE/DELETE since the
+    store was built triggers a full rebuild.
+    """
+    global _cached
+    gen = generation(c)
+    if _cached is not None and _cached.root == root and _cached.generation == gen:
+        return _cached
+    with _locked(root):
+        try:
+            store = EmbeddingStore(root)       # may have been refreshed by another process
+            if store.generation != gen:
+                store = append(c, store)
+        except (FileNotFoundError, ValueError, KeyError):
+            store = build(c, root)
+    _cached = store
+    return store
+
+
+def blockwise_knn(blocks: Iterable[np.ndarray], queries: np.ndarray, k: int) -> np.ndarray:
+    """Exact Euclidean kNN indices of *queries* into the rows of *blocks* taken
+    as one matrix, nearest first. Only one block is alive at a time."""
+    q = np.asarray(queries, dtype=np.float32)
+    q_sq = (q * q).sum(axis=1)[:, None]
+    best_d = np.full((len(q), k), np.inf, np.float32)
+    best_i = np.zeros((len(q), k), np.int64)
+    s = 0
+    for b in blocks:
+        d = q_sq - 2.0 * (q @ b.T) + (b * b).sum(axis=1)[None, :]
+        cand_d = np.concatenate([best_d, d], axis=1)
+        cand_i = np.concatenate([best_i, np.arange(s, s + len(b))[None, :].repeat(len(q), 0)], axis=1)
+        top = np.argpartition(cand_d, k - 1, axis=1)[:, :k]
+        best_d = np.take_along_axis(cand_d, top, axis=1)
+        best_i = np.take_along_axis(cand_i, top, axis=1)
+        s += len(b)
+    order = np.argsort(best_d, axis=1)
+    return np.take_along_axis(best_i, order, axis=1)
+
+
+def array_knn(ref: np.ndarray, queries: np.ndarray, k: int, block: int = 8192) -> np.ndarray:
+    """blockwise_knn of *queries* into an in-memory matrix *ref*."""
+    return blockwise_knn((ref[s:s + block] for s in range(0, len(ref), block)), queries, k)
+
+
+def exact_knn(store: EmbeddingStore, queries: np.ndarray, k: int,
+              tier: str = "f32", block: int = 8192) -> np.ndarray:
+    """Exact Euclidean kNN of float32 *queries* against a whole tier, blockwise.
+
+    Only one decoded block of the corpus is alive at a time, so this works
+    on the full corpus without materializing it as float32.
+    """
+    codes = store.tier(tier)
+    return blockwise_knn((store.decode(codes[s:s + block], tier)
+                          for s in range(0, len(store), block)), queries, k)
+
+
+def tier_report(store: EmbeddingStore, sample: int = 1000, k: int = 10, seed: int = 0) -> List[dict]:
+    """Size, reconstruction error and kNN recall@k of each tier against f32."""
+    rng = np.random.default_rng(seed)
+    q_pos = np.sort(rng.choice(len(store), size=min(sample, len(store)), replace=False))
+    q = np.asarray(store.matrix[q_pos], dtype=np.float32)
+    k = min(k, len(store))
+    ref = exact_knn(store, q, k, "f32")
+    report = []
+    for t in TIERS:
+        codes = store.tier(t)
+        err = store.decode(codes[q_pos], t) - q
+        nbrs = ref if t == "f32" else exact_knn(store, q, k, t)
+        recall = np.mean([len(np.intersect1d(a, b)) / k for a, b in zip(ref, nbrs)])
+        report.append({
+            "tier":      t,
+            "bytes":     int(codes.nbytes),
+            "ratio":     store.matrix.nbytes / max(codes.nbytes, 1),
+            "rmse":      float(np.sqrt(np.mean(err ** 2))),
+            "max_abs":   float(np.abs(err).max()) if err.size else 0.0,
+            "rel_err":   float(np.mean(np.linalg.norm(err, axis=1) /
+                                       np.maximum(np.linalg.norm(q, axis=1), 1e-12))),
+            f"recall@{k}": float(recall),
+        })
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Build the embedding store / quantized tiers.")
+    ap.add_argument("--tiers", nargs="*", choices=TIERS[1:], default=[],
+                    help="also (re)build these quantized tiers")
+    ap.add_argument("--report", action="store_true",
+                    help="print reconstruction error and kNN recall of every tier")
+    ap.add_argument("--sample", type=int, default=1000, help="query points for --report")
+    ap.add_argument("-k", type=int, default=10, help="neighbours for --report")
+    args = ap.parse_args()
+    with db.conn() as c:
+        s = build(c)
+    for t in args.tiers:
+        build_tier(s, t)
+    print(json.dumps(s.meta, indent=2))
+    if args.report:
+        print(f"{'tier':5} {'MiB':>9} {'×':>5} {'rmse':>10} {'max_abs':>10} {'rel_err':>9} {'recall@' + str(args.k):>10}")
+        for r in tier_report(s, args.sample, args.k):
+            print(f"{r['tier']:5} {r['bytes'] / 2**20:9.1f} {r['ratio']:5.1f} {r['rmse']:10.2e} "
+                  f"{r['max_abs']:10.2e} {r['rel_err']:9.2e} {list(r.values())[-1]:10.4f}")
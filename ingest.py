@@ -0,0 +1,163 @@
+# ingest.py
+#!/usr/bin/env python3
+"""Stream embeddings from .npy/.npz files or a manifest into `embeddings`.
+
+Usage:  python ingest.py assets/embeddings/                 # dir of .npy/.npz
+        python ingest.py --manifest vectors.jsonl --replace
+        python ingest.py part1.npz part2.npz --ext .avif --batch 10000
+
+Sources
+  <name>.npy              one 1-D vector; filename = <name> + --ext
+  <file>.npz              arrays `filenames` + `embeddings` (+ optional
+                          `artists`), or one 1-D array per key (key = filename)
+  manifest .jsonl         {"filename": ..., "artist": ..., "embedding": [...]}
+                          or {"filename": ..., "path": "x.npy"} per line
+
+Rows are written in batches through db.insert_embeddings (one transaction
+per batch), deduplicated by filename within a batch and against the table
+(skip, or update in place with --replace). Memory stays bounded by --batch
+regardless of corpus size. Afterwards the embedding store and its quantized
+tiers are brought up to date incrementally (embstore.append).
+"""
+import argparse, itertools, json, os, re, time
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+import db
+
+Row = Tuple[str, Optional[str], np.ndarray]
+
+_TRAILING_NUM = re.compile(r"_\d+$")
+NPZ_CHUNK = 4096                        # rows read at a time from an .npz member
+
+def artist_from_filename(filename: str) -> str:
+    """'Vincent_van_Gogh_113.avif' → 'Vincent van Gogh'."""
+    stem = Path(filename).stem
+    return _TRAILING_NUM.sub("", stem).replace("_", " ")
+
+def _npz_rows(z, key: str, chunk: int = NPZ_CHUNK) -> Iterator[np.ndarray]:
+    """Rows of one .npz member, read *chunk* rows at a time (np.load cannot
+    memory-map members, and z[key] would decompress the whole array)."""
+    fmt = np.lib.format
+    with z.zip.open(key + ".npy") as f:
+        version = fmt.read_magic(f)
+        header = fmt.read_array_header_1_0 if version == (1, 0) else fmt.read_array_header_2_0
+        shape, fortran, dtype = header(f)
+        if fortran and len(shape) > 1:
+            yield from z[key]
+            return
+        row = int(np.prod(shape[1:], dtype=np.int64)) * dtype.itemsize
+        for start in range(0, shape[0] if shape else 0, chunk):
+            n = min(chunk, shape[0] - start)
+            yield from np.frombuffer(f.read(n * row), dtype).reshape((n,) + shape[1:])
+
+def _iter_npz(path: Path, ext: str) -> Iterator[Row]:
+    with np.load(path, allow_pickle=False) as z:
+        if "filenames" in z.files and "embeddings" in z.files:
+            fns, embs = _npz_rows(z, "filenames"), _npz_rows(z, "embeddings")
+            arts = _npz_rows(z, "artists") if "artists" in z.files else itertools.repeat(None)
+            for fn, art, vec in zip(fns, arts, embs):
+                yield str(fn), (str(art) if art is not None else None), vec
+        else:
+            for key in z.files:
+                fn = key if Path(key).suffix else key + ext
+                yield fn, None, z[key]
+
+def _iter_manifest(path: Path) -> Iterator[Row]:
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            rec = json.loads(line)
+            if "embedding" in rec:
+                vec = np.asarray(rec["embedding"], dtype=np.float32)
+            else:
+                vec = np.load(path.parent / rec["path"], mmap_mode="r")
+            yield rec["filename"], rec.get("artist"), vec
+
+def iter_sources(paths, ext: str) -> Iterator[Row]:
+    """Lazily walk every source; directories are scanned recursively in name order."""
+    for p in map(Path, paths):
+        if p.is_dir():
+            for root, dirs, files in os.walk(p):
+                dirs.sort()
+                yield from iter_sources(
+                    [Path(root) / f for f in sorted(files)
+                     if f.endswith((".npy", ".npz"))], ext)
+        elif p.suffix == ".npy":
+            yield p.stem + ext, None, np.load(p, mmap_mode="r")
+        elif p.suffix == ".npz":
+            yield from _iter_npz(p, ext)
+        elif p.suffix in (".jsonl", ".json"):
+            yield from _iter_manifest(p)
+        else:
+            print(f"WARNING: skipping unsupported source {p}")
+
+def _expected_dim() -> Optional[int]:
+    with db.conn() as c:
+        row = c.execute("SELECT length(embedding) FROM embeddings LIMIT 1").fetchone()
+    return row[0] // 4 if row else None
+
+def ingest(rows: Iterator[Row], batch: int = 5000, replace: bool = False,
+           dim: Optional[int] = None) -> dict:
+    dim = dim or _expected_dim()
+    stats = {"seen": 0, "written": 0, "dup_in_batch": 0, "bad_dim": 0}
+    pending = {}
+    t0 = last = time.time()
+
+    def flush():
+        if pending:
+            stats["written"] += db.insert_embeddings(list(pending.values()), replace)
+            pending.clear()
+
+    for filename, artist, vec in rows:
+        stats["seen"] += 1
+        vec = np.asarray(vec, dtype=np.float32).reshape(-1)
+        if dim is None:
+            dim = vec.size
+        if vec.size != dim:
+            stats["bad_dim"] += 1
+            if stats["bad_dim"] <= 10:
+                print(f"WARNING: {filename}: {vec.size}-d vector, expected {dim}; skipped")
+            continue
+        if filename in pending:
+            stats["dup_in_batch"] += 1       # last occurrence wins
+        pending[filename] = (filename, artist or artist_from_filename(filename), vec.tobytes())
+        if len(pending) >= batch:
+            flush()
+            if time.time() - last > 5:
+                last = time.time()
+                print(f"  {stats['seen']:,} rows read, {stats['written']:,} written, "
+                      f"{stats['written'] / (last - t0):,.0f} rows written/s")
+    flush()
+    stats["seconds"] = time.time() - t0
+    stats["rows_per_s"] = stats["written"] / max(stats["seconds"], 1e-9)   # rows written
+    return stats
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Bulk-load embeddings into the DB.")
+    ap.add_argument("sources", nargs="*", help=".npy/.npz files, directories or .jsonl manifests")
+    ap.add_argument("--manifest", action="append", default=[], help="filename→vector JSONL manifest")
+    ap.add_argument("--ext", default=".avif", help="image extension appended to .npy stems")
+    ap.add_argument("--batch", type=int, default=5000, help="rows per transaction")
+    ap.add_argument("--replace", action="store_true", help="update existing filenames instead of skipping")
+    args = ap.parse_args(argv)
+    if not args.sources and not args.manifest:
+        ap.error("give at least one source or --manifest")
+
+    stats = ingest(iter_sources(args.sources + args.manifest, args.ext),
+                   batch=args.batch, replace=args.replace)
+    print(f"✅ ingested {stats['written']:,}/{stats['seen']:,} rows in {stats['seconds']:.2f}s "
+          f"({stats['rows_per_s']:,.0f} rows written/s); "
+          f"{stats['dup_in_batch']} in-batch duplicates, {stats['bad_dim']} wrong-dim skipped")
+
+    import embstore
+    t0 = time.time()
+    with db.conn() as c:
+        store = embstore.open_store(c)
+    print(f"embedding store: {len(store):,} rows, refreshed in {time.time() - t0:.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+# jit.py
+#!/usr/bin/env python3
+"""Numba compile cache and ahead-of-time warm-up for the numba-based methods.
+
+UMAP (with pynndescent), PaCMAP and TriMap JIT-compile their kernels with
+numba; kernels declared with cache=True are written to NUMBA_CACHE_DIR and
+loaded from there by later processes. Most of their kernels are not
+declared that way, so prepare() – called by run.py before it imports one of
+these methods – also makes cache=True the default of numba.njit/numba.jit
+(DR_NUMBA_CACHE_ALL=0 turns that off), and configure() points the cache at
+``<DR_CACHE>/numba`` unless NUMBA_CACHE_DIR is already set. Every run.py
+process, sweep worker and `run.py --serve` worker then shares one writable
+cache: a fresh-process UMAP fit on 500 points drops from ~18 s (88 kernels
+compiled) to ~1.3 s (none compiled).
+
+    python jit.py warmup                  # every installed numba method
+    python jit.py warmup --methods umap pacmap
+    python jit.py status                  # cache location, files, size
+    python jit.py clear
+
+warmup fits each method on a small synthetic float32 matrix along the same
+path run.py takes (shared kNN graph included), once per distinct metric in
+configs.yaml, and reports the compile seconds. Every run records
+`compile_time` – seconds numba spent compiling during the fit – next to
+`runtime` in its *_configs row, so a cold cache is visible per run.
+"""
+import argparse, functools, os, shutil, sys, time
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import db, registry
+
+JIT_DIR = Path(db.CACHE_DIR) / "numba"
+JIT_METHODS = [name for name, m in registry.METHODS.items() if "numba" in m.imports]
+CACHE_ALL = os.getenv("DR_NUMBA_CACHE_ALL", "1") != "0"
+
+
+def configure() -> None:
+    """Use the managed cache directory; call before numba is imported."""
+    os.environ.setdefault("NUMBA_CACHE_DIR", str(JIT_DIR.resolve()))
+    if "numba" in sys.modules:                # already imported: make it re-read the env
+        from numba.core.config import reload_config
+        reload_config()
+
+
+def _cache_by_default(decorator):
+    @functools.wraps(decorator)
+    def wrapper(*args, **kwargs):
+        kwargs.setdefault("cache", True)
+        return decorator(*args, **kwargs)
+    wrapper._dr_cached = True
+    return wrapper
+
+
+def prepare(method: str) -> None:
+    """Before importing *method*: route its numba kernels to the disk cache."""
+    if method not in JIT_METHODS:
+        return
+    configure()
+    if not CACHE_ALL:
+        return
+    import numba
+    if not getattr(numba.njit, "_dr_cached", False):
+        # kernels that can't be cached (closures, dynamic globals) warn and compile as before
+        numba.njit = _cache_by_default(numba.njit)
+        numba.jit = _cache_by_default(numba.jit)
+
+
+def _outermost(buffer) -> tuple:
+    """(seconds, functions) of compile events, not double-counting nested ones."""
+    seconds, functions, depth, start = 0.0, 0, 0, 0.0
+    for t, ev in sorted(buffer, key=lambda e: e[0]):
+        if ev.is_start:
+            functions += 1
+            if depth == 0:
+                start = t
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                seconds += t - start
+    return seconds, functions
+
+
+@contextmanager
+def compile_timer():
+    """Yield a dict filled with the numba compile time spent inside the block.
+
+    {"seconds": None} when numba was never imported (the method doesn't use it).
+    """
+    out = {"seconds": None, "functions": 0}
+    if "numba" not in sys.modules:
+        yield out
+        return
+    from numba.core import event
+    with event.install_recorder("numba:compile") as rec:
+        try:
+            yield out
+        finally:
+            out["seconds"], out["functions"] = _outermost(rec.buffer)
+
+
+def _warm_configs(method: str, cfgs: dict) -> list:
+    """One config per distinct metric: the kernels numba specialises on."""
+    seen, picked = set(), []
+    for c in cfgs.get(method, []):
+        key = (c.get("metric"), c.get("distance"))
+        if key not in seen:
+            seen.add(key)
+            picked.append(c)
+    return picked or [{"name": "default"}]
+
+
+def warmup(methods=None, n: int = 500, dim: int = 32, seed: int = 0) -> list:
+    """Compile the hot kernels of *methods* → [(method, config, compile s, total s)]."""
+    import knncache, preprocess
+    import run as runner
+    cfgs = runner.load_configs()
+    X = np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+    stats = preprocess._stats(X)
+    out = []
+    for method in methods or JIT_METHODS:
+        if not registry.available(method):
+            print(f"[jit] {method}: libraries not installed, skipped")
+            continue
+        mod = runner.load_method(method)
+        for c in _warm_configs(method, cfgs):
+            cfg = dict(c)
+            runner.split_config(cfg)
+            run_cfg = dict(cfg, input_stats=stats)
+            if knncache.wants_graph(method, cfg):
+                metric = knncache.config_metric(cfg)
+                idx, dist, _ = knncache.build(X, knncache.config_k(method, cfg), metric)
+                run_cfg["knn_graph"] = knncache.KNNGraph(idx, dist, metric)
+            t0 = time.time()
+            with compile_timer() as ct:
+                runner.fit(mod, X, run_cfg)
+            out.append((method, c["name"], ct["seconds"] or 0.0, time.time() - t0))
+            print(f"[jit] {method}:{c['name']}  compile={out[-1][2]:.2f}s  "
+                  f"total={out[-1][3]:.2f}s  ({ct['functions']} functions)")
+        if "pynndescent" in registry.get(method).imports:
+            # --save-model and transform() search with pynndescent instead of the cache
+            from pynndescent import NNDescent
+            t0 = time.time()
+            with compile_timer() as ct:
+                NNDescent(X, n_neighbors=15, random_state=seed).query(X[:10], k=15)
+            out.append(("pynndescent", "default", ct["seconds"] or 0.0, time.time() - t0))
+            print(f"[jit] pynndescent  compile={ct['seconds'] or 0.0:.2f}s  "
+                  f"total={out[-1][3]:.2f}s  ({ct['functions']} functions)")
+    return out
+
+
+def _cache_files(root: Path) -> list:
+    return [p for p in root.rglob("*") if p.suffix in (".nbi", ".nbc")] if root.exists() else []
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Numba compile cache for the JIT-compiled methods.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    w = sub.add_parser("warmup", help="compile the methods' kernels into the cache")
+    w.add_argument("--methods", nargs="*", choices=JIT_METHODS, help="default: all installed")
+    w.add_argument("--n", type=int, default=500, help="synthetic points per fit")
+    sub.add_parser("status", help="show the cache directory and its size")
+    sub.add_parser("clear", help="delete the cache")
+    args = ap.parse_args(argv)
+
+    configure()
+    root = Path(os.environ["NUMBA_CACHE_DIR"])
+    if args.cmd == "warmup":
+        t0 = time.time()
+        res = warmup(args.methods, n=args.n)
+        print(f"✅ warmed {len(res)} fits in {time.time() - t0:.1f}s; "
+              f"compile {sum(r[2] for r in res):.1f}s → cache {root}")
+    elif args.cmd == "status":
+        files = _cache_files(root)
+        size = sum(p.stat().st_size for p in files)
+        print(f"{root}: {len(files)} files, {size / 2**20:.1f} MiB")
+    else:
+        shutil.rmtree(root, ignore_errors=True)
+        print(f"removed {root}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+# knncache.py
+#!/usr/bin/env python3
+"""Shared kNN graph cache for the neighbour-graph methods.
+
+UMAP, Isomap, Spectral and LLE all start by searching the k nearest
+neighbours of every point, and that search dominates their runtime. The
+graph only depends on (subset, input preprocessing, metric), so it is
+built once per key, at the largest k any config asks for, and sliced for
+smaller k:
+
+    <DR_CACHE>/knn/s<subset_id>_<prep>_<metric>/
+        indices.npy    int32   (n, k_max + 1)  column 0 is the point itself
+        distances.npy  float32 (n, k_max + 1)  ascending, column 0 is 0
+        meta.json      k, n, metric, algorithm, embeddings_state.rewrites
+
+Small subsets (<= DR_KNN_EXACT_MAX points, default 20000) use exact
+blockwise search; larger ones use methods/knn_hnswlib.py when the metric
+is one hnswlib supports (euclidean, cosine). A graph is rebuilt if the
+subset size changed or embeddings were rewritten since it was built.
+"""
+import json, os, time
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+import db, registry
+
+KNN_DIR = Path(db.CACHE_DIR) / "knn"
+EXACT_MAX_N = int(os.getenv("DR_KNN_EXACT_MAX", "20000"))
+HNSW_SPACES = {"euclidean": "l2", "cosine": "cosine"}
+
+# Methods that accept a cached graph → their wrapper's default n_neighbors
+GRAPH_METHODS = {name: m.knn for name, m in registry.METHODS.items() if m.knn}
+
+
+def config_metric(cfg: dict) -> str:
+    """Metric a config's neighbour search uses, normalised for cache keys."""
+    metric = cfg.get("metric") or "euclidean"
+    if metric in ("minkowski", "l2") and cfg.get("p", 2) == 2:
+        return "euclidean"
+    return metric
+
+
+def wants_graph(method: str, cfg: dict) -> bool:
+    """Whether this method/config would search neighbours the cache can supply."""
+    if method not in GRAPH_METHODS:
+        return False
+    if method == "spectral":
+        return cfg.get("affinity", "nearest_neighbors") == "nearest_neighbors"
+    if method == "lle":
+        return cfg.get("method", "standard") == "standard"
+    return True
+
+
+def config_k(method: str, cfg: dict) -> int:
+    return cfg.get("n_neighbors", GRAPH_METHODS[method])
+
+
+def largest_k(cfgs: dict, strategy: str, size: int, seed: int, metric: str) -> int:
+    """Largest k any graph method in configs.yaml requests on this subset/metric."""
+    ks = [
+        config_k(m, c)
+        for m, entries in cfgs.items()
+        for c in entries
+        if wants_graph(m, c)
+        and (c.get("subset_strategy", "artist_first5"), c.get("subset_size", 250),
+            c.get("subset_seed", 0)) == (strategy, size, seed)
+        and config_metric(c) == metric
+    ]
+    return max(ks, default=0)
+
+
+class KNNGraph:
+    """Memory-mapped kNN graph; column 0 of every row is the point itself."""
+
+    def __init__(self, indices: np.ndarray, distances: np.ndarray, metric: str):
+        self.indices = indices
+        self.distances = distances
+        self.metric = metric
+
+    @property
+    def k(self) -> int:
+        return self.indices.shape[1] - 1
+
+    def __len__(self) -> int:
+        return self.indices.shape[0]
+
+    def neighbors(self, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(indices, distances) with k columns, self included (UMAP convention)."""
+        if k > self.k + 1:
+            raise ValueError(f"graph holds {self.k} neighbours, {k} requested")
+        return (np.ascontiguousarray(self.indices[:, :k]),
+                np.ascontiguousarray(self.distances[:, :k]))
+
+    def sparse(self, k: int):
+        """CSR distance graph of each point's k neighbours plus itself (explicit
+        0), the input sklearn expects for metric/affinity="precomputed*"."""
+        from scipy.sparse import csr_matrix
+        if k > self.k:
+            raise ValueError(f"graph holds {self.k} neighbours, {k} requested")
+        n = len(self)
+        return csr_matrix(
+            (self.distances[:, :k + 1].ravel(), self.indices[:, :k + 1].ravel(),
+             np.arange(0, n * (k + 1) + 1, k + 1)),
+            shape=(n, n),
+        )
+
+
+def _self_first(idx: np.ndarray, dist: np.ndarray, k: int):
+    """Drop each row's own index (or, if absent, its farthest hit), put it first."""
+    n = len(idx)
+    own = idx == np.arange(n)[:, None]
+    drop = own.copy()
+    drop[~own.any(axis=1), -1] = True
+    keep = ~drop
+    idx = np.concatenate([np.arange(n)[:, None], idx[keep].reshape(n, k)], axis=1)
+    dist = np.concatenate([np.zeros((n, 1), np.float32), dist[keep].reshape(n, k)], axis=1)
+    return idx.astype(np.int32), dist.astype(np.float32)
+
+
+def _exact(X: np.ndarray, k: int, metric: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Exact kNN (k + 1 hits incl. self), one block of query rows at a time."""
+    n = len(X)
+    block = max(1, (1 << 25) // max(n, 1))       # ~128 MiB of float32 distances
+    if metric == "cosine":
+        X = X / np.maximum(np.linalg.norm(X, axis=1, keepdims=True), 1e-12)
+    elif metric == "euclidean":
+        sq = (X * X).sum(axis=1)
+    idx = np.empty((n, k + 1), np.int64)
+    dist = np.empty((n, k + 1), np.float32)
+    for s in range(0, n, block):
+        q = X[s:s + block]
+        if metric == "cosine":
+            d = 1.0 - q @ X.T
+        elif metric == "euclidean":
+            d = np.sqrt(np.maximum(sq[s:s + block, None] - 2.0 * (q @ X.T) + sq[None, :], 0))
+        else:
+            from sklearn.metrics import pairwise_distances   # sklearn metric names
+            d = pairwise_distances(q, X, metric=metric).astype(np.float32)
+        top = np.argpartition(d, k, axis=1)[:, :k + 1]
+        td = np.take_along_axis(d, top, axis=1)
+        order = np.argsort(td, axis=1)
+        idx[s:s + block] = np.take_along_axis(top, order, axis=1)
+        dist[s:s + block] = np.take_along_axis(td, order, axis=1)
+    return idx, dist
+
+
+def build(X: np.ndarray, k: int, metric: str = "euclidean") -> Tuple[np.ndarray, np.ndarray, str]:
+    """Search k neighbours of every row → (int32 indices, float32 distances, algorithm)."""
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    k = min(k, len(X) - 1)
+    if len(X) > EXACT_MAX_N and metric in HNSW_SPACES:
+        from methods.knn_hnswlib import knn_hnswlib
+        idx, dist = knn_hnswlib(X, k=k + 1, ef=max(100, 2 * k), space=HNSW_SPACES[metric],
+                                return_distances=True)
+        algo = "hnswlib"
+    else:
+        idx, dist = _exact(X, k, metric)
+        algo = "exact"
+    idx, dist = _self_first(idx, dist, k)
+    return idx, dist, algo
+
+
+def graph_dir(subset_id: int, metric: str, prep: str = "f32") -> Path:
+    return KNN_DIR / f"s{subset_id}_{prep}_{metric}"
+
+
+def _load(root: Path, n: int, k: int, rewrites: int) -> Optional[KNNGraph]:
+    try:
+        with open(root / "meta.json") as f:
+            meta = json.load(f)
+        if meta["n"] != n or meta["k"] < k or meta["rewrites"] != rewrites:
+            return None
+        return KNNGraph(np.load(root / "indices.npy", mmap_mode="r"),
+                        np.load(root / "distances.npy", mmap_mode="r"), meta["metric"])
+    except (FileNotFoundError, ValueError, KeyError):
+        return None
+
+
+def get_graph(X: np.ndarray, subset_id: int, k: int, metric: str = "euclidean",
+              prep: str = "f32") -> KNNGraph:
+    """Cached kNN graph of subset *subset_id* (rows in subset order) with >= k
+    neighbours, building it from X on a miss."""
+    from embstore import _locked, _save, _write_meta, state
+    with db.conn() as c:
+        rewrites = state(c)[1]
+    root = graph_dir(subset_id, metric, prep)
+    k = min(k, len(X) - 1)
+    graph = _load(root, len(X), k, rewrites)
+    if graph is not None:
+        return graph
+    with _locked(root):
+        graph = _load(root, len(X), k, rewrites)      # another process may have built it
+        if graph is not None:
+            return graph
+        t0 = time.time()
+        idx, dist, algo = build(X, k, metric)
+        _save(root / "indices.npy", idx)
+        _save(root / "distances.npy", dist)
+        _write_meta(root, {"subset_id": subset_id, "prep": prep, "metric": metric,
+                           "n": len(X), "k": k, "algorithm": algo, "rewrites": rewrites,
+                           "seconds": round(time.time() - t0, 3)})
+        print(f"[knncache] built {algo} {k}-NN graph ({metric}) for subset {subset_id} "
+              f"in {time.time() - t0:.2f}s")
+    return _load(root, len(X), k, rewrites)
@@ -24,10 +24,13 @@ def run(embeddings, config):
     max_iter = config.get('max_iter', 300)
     # random_state is not supported by cluster_MDS directly
 
-    # cl-MDS expects a distance matrix; compute it from embeddings
-    X = np.asarray(embeddings)
-    from scipy.spatial.distance import pdist, squareform
-    dist_matrix = squareform(pdist(X, metric='euclidean'))
+    # cl-MDS expects a distance matrix; run.py passes the shared one from
+    # distcache.py, otherwise compute it from embeddings
+    dist_matrix = config.get('dist_matrix')
+    if dist_matrix is None:
+        X = np.asarray(embeddings)
+        from scipy.spatial.distance import pdist, squareform
+        dist_matrix = squareform(pdist(X, metric='euclidean'))
 
     # Initialize clMDS class
     clmds = clMDS(dist_matrix=dist_matrix, verbose=True)
@@ -5,9 +5,11 @@ import numpy as np
 def run(embeddings: np.ndarray, cfg: dict) -> np.ndarray:
     print("[GLLE wrapper] embeddings.shape:", embeddings.shape)
     print("[GLLE wrapper] embeddings.dtype:", embeddings.dtype)
-    print("[GLLE wrapper] embeddings has NaN:", np.isnan(embeddings).any())
-    print("[GLLE wrapper] embeddings has inf:", np.isinf(embeddings).any())
-    print("[GLLE wrapper] config:", cfg)
+    stats = cfg.get("input_stats")
+    if stats:
+        print("[GLLE wrapper] embeddings has NaN:", stats["has_nan"])
+        print("[GLLE wrapper] embeddings has inf:", stats["has_inf"])
+    print("[GLLE wrapper] config:", {k: v for k, v in cfg.items() if k != "input_stats"})
     # 1) enforce 2D
     if cfg.get("n_components", 2) != 2:
         raise ValueError("GLLE supports only n_components=2")
@@ -1,24 +1,43 @@
 import numpy as np
 import hnswlib
 
-def knn_hnswlib(embeddings, k=10, ef=50, M=32):
+def knn_hnswlib(embeddings, k=10, ef=50, M=32, decode=None, batch_size=65536,
+                space='l2', return_distances=False):
     """
     Compute k-nearest neighbors using HNSWlib.
     Args:
-        embeddings (np.ndarray): shape (n_samples, n_features)
+        embeddings (np.ndarray): shape (n_samples, n_features); may be a
+            memory-mapped (quantized) matrix, it is fed to the index in batches
         k (int): number of neighbors
         ef (int): size of the dynamic list for the nearest neighbors (higher = more accurate)
         M (int): number of bi-directional links created for every new element during construction
+        decode (callable): maps a batch of rows to float32 (e.g. a quantized
+            embstore tier: ``lambda b: store.decode(b, "i8")``); default astype
+        batch_size (int): rows converted to float32 at a time
+        space (str): 'l2', 'cosine' or 'ip' (hnswlib spaces)
+        return_distances (bool): also return distances (Euclidean for 'l2',
+            hnswlib reports squared ones; 1 - cos for 'cosine')
     Returns:
         np.ndarray: neighbor indices, shape (n_samples, k)
+        (indices, float32 distances) if return_distances
     """
+    decode = decode or (lambda b: np.asarray(b, dtype=np.float32))
     n, d = embeddings.shape
-    index = hnswlib.Index(space='l2', dim=d)
+    index = hnswlib.Index(space=space, dim=d)
     index.init_index(max_elements=n, ef_construction=200, M=M)
-    index.add_items(embeddings.astype(np.float32))
-    index.set_ef(ef)
-    labels, distances = index.knn_query(embeddings, k=k)
-    return labels
+    for s in range(0, n, batch_size):
+        index.add_items(decode(embeddings[s:s + batch_size]), np.arange(s, min(s + batch_size, n)))
+    index.set_ef(max(ef, k))
+    labels = np.empty((n, k), dtype=np.int64)
+    dists = np.empty((n, k), dtype=np.float32)
+    for s in range(0, n, batch_size):
+        labels[s:s + batch_size], dists[s:s + batch_size] = index.knn_query(
+            decode(embeddings[s:s + batch_size]), k=k)
+    if not return_distances:
+        return labels
+    if space == 'l2':
+        np.sqrt(np.maximum(dists, 0, out=dists), out=dists)
+    return labels, dists
 
 if __name__ == "__main__":
     # Example/test: load 100 embeddings from art.sqlite and print neighbors
@@ -34,4 +53,4 @@ if __name__ == "__main__":
     X_pca = PCA(n_components=50).fit_transform(embeddings)
     neighbors = knn_hnswlib(X_pca, k=6)
     for i in range(5):
-        print(f'HNSWlib neighbors for point {i}:', neighbors[i].tolist()) 
\ No newline at end of file
+        print(f'HNSWlib neighbors for point {i}:', neighbors[i].tolist())
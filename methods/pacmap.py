@@ -24,13 +24,15 @@ def run(embeddings, config):
     # Map config keys to PaCMAP arguments
     kwargs = dict(config)
     backend = config.get('backend', 'annoy')
-    for k in ["subset_strategy", "subset_size", "runtime", "config_id", "name", "init", "preprocess_pca", "backend"]:
+    for k in ["subset_strategy", "subset_size", "runtime", "config_id", "name", "init", "preprocess_pca", "backend", "input_stats"]:
         kwargs.pop(k, None)
     kwargs["n_components"] = 2
     if "random_state" in config:
         np.random.seed(config["random_state"])
     print(f"[PaCMAP] embeddings shape: {embeddings.shape}, dtype: {embeddings.dtype}")
-    print(f"[PaCMAP] min: {embeddings.min()}, max: {embeddings.max()}, any NaN: {np.isnan(embeddings).any()}, any inf: {np.isinf(embeddings).any()}")
+    stats = config.get("input_stats")
+    if stats:
+        print(f"[PaCMAP] input min: {stats['min']}, max: {stats['max']}, any NaN: {stats['has_nan']}, any inf: {stats['has_inf']}")
     print(f"[PaCMAP] kwargs: {kwargs}")
     reducer = pacmap.PaCMAP(**kwargs)
     init_val = config.get("init", "pca")
@@ -6,19 +6,20 @@ from parampacmap import ParamPaCMAP
 import numpy as np
 
 
-def run(embeddings, config):
+def fit(embeddings, config):
     """
     Run ParamRepulsor (ParamPaCMAP) dimensionality reduction.
     Args:
         embeddings (np.ndarray): Input data, shape (n_samples, n_features)
         config (dict): Configuration parameters matching PARAM_COLS["paramrepulsor"]
     Returns:
-        np.ndarray: 2D projection, shape (n_samples, 2)
+        (np.ndarray, ParamPaCMAP): 2D projection and the fitted parametric model,
+        whose transform() embeds new points with the trained network
     """
     # Map config keys to ParamPaCMAP arguments
     kwargs = dict(config)
     # Remove keys not accepted by ParamPaCMAP if present
-    for k in ["subset_strategy", "subset_size", "runtime", "config_id", "name", "spread", "repulsion_strength"]:
+    for k in ["subset_strategy", "subset_size", "runtime", "config_id", "name", "spread", "repulsion_strength", "input_stats"]:
         kwargs.pop(k, None)
     # Force 2D output for pipeline consistency
     kwargs["n_components"] = 2
@@ -36,9 +37,15 @@ def run(embeddings, config):
     if "init" in kwargs:
         kwargs["embedding_init"] = kwargs.pop("init")
     print(f"[ParamRepulsor] embeddings shape: {embeddings.shape}, dtype: {embeddings.dtype}")
-    print(f"[ParamRepulsor] min: {embeddings.min()}, max: {embeddings.max()}, any NaN: {np.isnan(embeddings).any()}, any inf: {np.isinf(embeddings).any()}")
+    stats = config.get("input_stats")
+    if stats:
+        print(f"[ParamRepulsor] min: {stats['min']}, max: {stats['max']}, any NaN: {stats['has_nan']}, any inf: {stats['has_inf']}")
     print(f"[ParamRepulsor] kwargs: {kwargs}")
     # Initialize and run ParamPaCMAP
     reducer = ParamPaCMAP(**kwargs)
     Y = reducer.fit_transform(embeddings)
-    return Y 
\ No newline at end of file
+    return Y, reducer
+
+
+def run(embeddings, config):
+    return fit(embeddings, config)[0]
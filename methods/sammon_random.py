@@ -17,6 +17,11 @@ def run(embeddings, config):
     print("Params passed to evomap Sammon:")
     for k, v in params.items():
         print(f"  {k}: {v} (type: {type(v)})")
+    X = embeddings
+    if config.get("dist_matrix") is not None and params.get("input_type", "vector") == "vector":
+        # Shared float32 distance matrix from distcache.py
+        params["input_type"] = "distance"
+        X = config["dist_matrix"]
     sammon = Sammon(**params)
-    y = sammon.fit_transform(embeddings)
+    y = sammon.fit_transform(X)
     return [(float(y[i, 0]), float(y[i, 1])) for i in range(len(embeddings))] 
\ No newline at end of file
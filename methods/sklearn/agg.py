@@ -1,6 +1,6 @@
 import numpy as np
 
-def run(embeddings, config):
+def fit(embeddings, config):
     """
     Run FeatureAgglomeration dimensionality reduction.
 
@@ -9,7 +9,7 @@ def run(embeddings, config):
         config: dictionary with agglomeration parameters
 
     Returns:
-        numpy array of shape (n_samples, 2) with x, y coordinates
+        (coords, fitted estimator); coords has shape (n_samples, 2)
     """
     from sklearn.cluster import FeatureAgglomeration
 
@@ -19,4 +19,7 @@ def run(embeddings, config):
 
     agg = FeatureAgglomeration(**agg_params)
     embedding = agg.fit_transform(embeddings)
-    return embedding 
\ No newline at end of file
+    return embedding, agg
+
+def run(embeddings, config):
+    return fit(embeddings, config)[0]
@@ -1,6 +1,6 @@
 import numpy as np
 
-def run(embeddings, config):
+def fit(embeddings, config):
     """
     Run DictionaryLearning dimensionality reduction.
 
@@ -9,7 +9,7 @@ def run(embeddings, config):
         config: dictionary with DictionaryLearning parameters
 
     Returns:
-        numpy array of shape (n_samples, 2) with x, y coordinates
+        (coords, fitted estimator); coords has shape (n_samples, 2)
     """
     from sklearn.decomposition import DictionaryLearning
 
@@ -21,4 +21,7 @@ def run(embeddings, config):
 
     dictlearn = DictionaryLearning(**dict_params)
     embedding = dictlearn.fit_transform(embeddings)
-    return embedding 
\ No newline at end of file
+    return embedding, dictlearn
+
+def run(embeddings, config):
+    return fit(embeddings, config)[0]
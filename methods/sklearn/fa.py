@@ -1,6 +1,6 @@
 import numpy as np
 
-def run(embeddings, config):
+def fit(embeddings, config):
     """
     Run FactorAnalysis dimensionality reduction.
 
@@ -9,7 +9,7 @@ def run(embeddings, config):
         config: dictionary with FA parameters
 
     Returns:
-        numpy array of shape (n_samples, 2) with x, y coordinates
+        (coords, fitted estimator); coords has shape (n_samples, 2)
     """
     from sklearn.decomposition import FactorAnalysis
 
@@ -21,4 +21,7 @@ def run(embeddings, config):
 
     fa = FactorAnalysis(**fa_params)
     embedding = fa.fit_transform(embeddings)
-    return embedding 
\ No newline at end of file
+    return embedding, fa
+
+def run(embeddings, config):
+    return fit(embeddings, config)[0]
@@ -1,6 +1,6 @@
 import numpy as np
 
-def run(embeddings, config):
+def fit(embeddings, config):
     """
     Run GaussianRandomProjection dimensionality reduction.
 
@@ -9,7 +9,7 @@ def run(embeddings, config):
         config: dictionary with GRP parameters
 
     Returns:
-        numpy array of shape (n_samples, 2) with x, y coordinates
+        (coords, fitted estimator); coords has shape (n_samples, 2)
     """
     from sklearn.random_projection import GaussianRandomProjection
 
@@ -23,4 +23,7 @@ def run(embeddings, config):
 
     grp = GaussianRandomProjection(**grp_params)
     embedding = grp.fit_transform(embeddings)
-    return embedding 
\ No newline at end of file
+    return embedding, grp
+
+def run(embeddings, config):
+    return fit(embeddings, config)[0]
@@ -1,6 +1,6 @@
 import numpy as np
 
-def run(embeddings, config):
+def fit(embeddings, config):
     """
     Run FastICA dimensionality reduction.
 
@@ -9,7 +9,7 @@ def run(embeddings, config):
         config: dictionary with ICA parameters
 
     Returns:
-        numpy array of shape (n_samples, 2) with x, y coordinates
+        (coords, fitted estimator); coords has shape (n_samples, 2)
     """
     from sklearn.decomposition import FastICA
 
@@ -22,4 +22,7 @@ def run(embeddings, config):
 
     ica = FastICA(**ica_params)
     embedding = ica.fit_transform(embeddings)
-    return embedding 
\ No newline at end of file
+    return embedding, ica
+
+def run(embeddings, config):
+    return fit(embeddings, config)[0]
@@ -1,6 +1,6 @@
 import numpy as np
 
-def run(embeddings, config):
+def fit(embeddings, config):
     """
     Run IncrementalPCA dimensionality reduction.
 
@@ -9,7 +9,7 @@ def run(embeddings, config):
         config: dictionary with IPCA parameters
 
     Returns:
-        numpy array of shape (n_samples, 2) with x, y coordinates
+        (coords, fitted estimator); coords has shape (n_samples, 2)
     """
     from sklearn.decomposition import IncrementalPCA
 
@@ -21,4 +21,7 @@ def run(embeddings, config):
 
     ipca = IncrementalPCA(**ipca_params)
     embedding = ipca.fit_transform(embeddings)
-    return embedding 
\ No newline at end of file
+    return embedding, ipca
+
+def run(embeddings, config):
+    return fit(embeddings, config)[0]
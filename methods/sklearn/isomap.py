@@ -4,7 +4,7 @@ Isomap implementation for dimensionality reduction.
 """
 import numpy as np
 
-def run(embeddings, config):
+def fit(embeddings, config):
     """Run Isomap dimensionality reduction
     
     Args:
@@ -12,7 +12,7 @@ def run(embeddings, config):
         config: dictionary with Isomap parameters
     
     Returns:
-        numpy array of shape (n_samples, 2) with x,y coordinates
+        (coords, fitted model); coords has shape (n_samples, 2)
     """
     print(f"ISOMAP_START: Running Isomap on {embeddings.shape[0]} embeddings ({embeddings.shape[1]} dimensions)")
     
@@ -33,6 +33,20 @@ def run(embeddings, config):
             if param in config:
                 isomap_params[param] = config[param]
         
+        # Reuse the cached kNN graph (see knncache.py) instead of searching again
+        X = embeddings
+        graph = config.get('knn_graph')
+        if graph is not None:
+            from scipy.sparse.csgraph import connected_components
+            G = graph.sparse(isomap_params['n_neighbors'])
+            # sklearn only stitches disconnected kNN graphs when it has the raw points
+            if connected_components(G, directed=False)[0] == 1:
+                isomap_params['metric'] = 'precomputed'
+                isomap_params.pop('p', None)
+                X = G
+            else:
+                print("ISOMAP_WARNING: cached kNN graph is disconnected; searching on the raw points")
+        
         print(f"ISOMAP_CONFIG: {isomap_params}")
         
         # Initialize and fit Isomap
@@ -40,7 +54,7 @@ def run(embeddings, config):
         isomap = Isomap(**isomap_params)
         
         print("ISOMAP_PROCESS: Fitting and transforming data...")
-        embedding = isomap.fit_transform(embeddings)
+        embedding = isomap.fit_transform(X)
         
         print(f"ISOMAP_COMPLETE: Produced output shape {embedding.shape}")
         
@@ -51,10 +65,13 @@ def run(embeddings, config):
         if embedding.shape[1] != 2:
             print(f"ISOMAP_WARNING: Output dimensions ({embedding.shape[1]}) is not 2")
         
-        return embedding
+        return embedding, isomap
         
     except Exception as e:
         import traceback
         print(f"ISOMAP_ERROR: {str(e)}")
         print(traceback.format_exc())
         raise
+
+def run(embeddings, config):
+    return fit(embeddings, config)[0]
@@ -1,6 +1,6 @@
 import numpy as np
 
-def run(embeddings, config):
+def fit(embeddings, config):
     """
     Run KernelPCA dimensionality reduction.
 
@@ -9,7 +9,7 @@ def run(embeddings, config):
         config: dictionary with KernelPCA parameters
 
     Returns:
-        numpy array of shape (n_samples, 2) with x, y coordinates
+        (coords, fitted estimator); coords has shape (n_samples, 2)
     """
     from sklearn.decomposition import KernelPCA
 
@@ -24,4 +24,7 @@ def run(embeddings, config):
 
     kpca = KernelPCA(**kpca_params)
     embedding = kpca.fit_transform(embeddings)
-    return embedding 
\ No newline at end of file
+    return embedding, kpca
+
+def run(embeddings, config):
+    return fit(embeddings, config)[0]
@@ -1,10 +1,30 @@
 #!/usr/bin/env python3
 """
 Locally Linear Embedding (LLE) implementation for dimensionality reduction.
+
+With a cached kNN graph, standard LLE runs sklearn's own maths from the
+private sklearn.manifold._locally_linear (barycenter_weights, null_space),
+as of scikit-learn 1.6. If a release moves or changes those, the fit
+falls back to LocallyLinearEmbedding's own neighbour search.
 """
 import numpy as np
 
-def run(embeddings, config):
+def _standard_lle(X, graph, params):
+    """Standard LLE with neighbours taken from a knncache.KNNGraph (sklearn's maths)."""
+    from scipy.sparse import csr_matrix, identity
+    from sklearn.manifold._locally_linear import barycenter_weights, null_space
+    n, k = X.shape[0], params['n_neighbors']
+    ind = np.ascontiguousarray(graph.indices[:, 1:k + 1])   # column 0 is the point itself
+    W = csr_matrix((barycenter_weights(X, X, ind, reg=params['reg']).ravel(), ind.ravel(),
+                    np.arange(0, n * k + 1, k)), shape=(n, n))
+    I_W = identity(n, format='csr') - W
+    Y, _ = null_space((I_W.T @ I_W).tocsr(), params['n_components'], k_skip=1,
+                      eigen_solver=params.get('eigen_solver', 'auto'),
+                      tol=params.get('tol', 1e-6), max_iter=params.get('max_iter', 100),
+                      random_state=params.get('random_state'))
+    return Y
+
+def fit(embeddings, config):
     """Run LLE dimensionality reduction
     
     Args:
@@ -12,7 +32,7 @@ def run(embeddings, config):
         config: dictionary with LLE parameters
     
     Returns:
-        numpy array of shape (n_samples, 2) with x,y coordinates
+        (coords, fitted model); coords has shape (n_samples, 2)
     """
     print(f"LLE_START: Running LLE on {embeddings.shape[0]} embeddings ({embeddings.shape[1]} dimensions)")
     
@@ -40,12 +60,24 @@ def run(embeddings, config):
         
         print(f"LLE_CONFIG: {lle_params}")
         
-        # Initialize and fit LLE
-        print("LLE_PROCESS: Initializing LLE...")
-        lle = LocallyLinearEmbedding(**lle_params)
-        
-        print("LLE_PROCESS: Fitting and transforming data...")
-        embedding = lle.fit_transform(embeddings)
+        graph = config.get('knn_graph')
+        embedding = None
+        if graph is not None and lle_params['method'] == 'standard':
+            # Reuse the cached kNN graph (see knncache.py) instead of searching again
+            print("LLE_PROCESS: Fitting on cached kNN graph...")
+            lle = None
+            try:
+                embedding = _standard_lle(embeddings, graph, lle_params)
+            except (ImportError, TypeError) as e:   # sklearn's private helpers moved
+                print(f"LLE_WARNING: cached-graph LLE unavailable ({e}); "
+                      f"falling back to LocallyLinearEmbedding")
+        if embedding is None:
+            # Initialize and fit LLE
+            print("LLE_PROCESS: Initializing LLE...")
+            lle = LocallyLinearEmbedding(**lle_params)
+            
+            print("LLE_PROCESS: Fitting and transforming data...")
+            embedding = lle.fit_transform(embeddings)
         
         print(f"LLE_COMPLETE: Produced output shape {embedding.shape}")
         
@@ -56,10 +88,13 @@ def run(embeddings, config):
         if embedding.shape[1] != 2:
             print(f"LLE_WARNING: Output dimensions ({embedding.shape[1]}) is not 2")
         
-        return embedding
+        return embedding, lle
         
     except Exception as e:
         import traceback
         print(f"LLE_ERROR: {str(e)}")
         print(traceback.format_exc())
         raise
+
+def run(embeddings, config):
+    return fit(embeddings, config)[0]
@@ -39,6 +39,12 @@ def run(embeddings, config):
             if param in config:
                 mds_params[param] = config[param]
         
+        # Reuse the shared float32 distance matrix (see distcache.py)
+        X = embeddings
+        if config.get('dist_matrix') is not None and mds_params['dissimilarity'] == 'euclidean':
+            mds_params['dissimilarity'] = 'precomputed'
+            X = config['dist_matrix']
+        
         print(f"MDS_CONFIG: {mds_params}")
         
         # Initialize and fit MDS
@@ -46,7 +52,7 @@ def run(embeddings, config):
         mds = MDS(**mds_params)
         
         print("MDS_PROCESS: Fitting and transforming data...")
-        embedding = mds.fit_transform(embeddings)
+        embedding = mds.fit_transform(X)
         
         print(f"MDS_COMPLETE: Produced output shape {embedding.shape}")
         
@@ -1,6 +1,6 @@
 import numpy as np
 
-def run(embeddings, config):
+def fit(embeddings, config):
     """
     Run Non-negative Matrix Factorization (NMF) dimensionality reduction.
 
@@ -9,12 +9,13 @@ def run(embeddings, config):
         config: dictionary with NMF parameters
 
     Returns:
-        numpy array of shape (n_samples, 2) with x, y coordinates
+        (coords, fitted estimator); coords has shape (n_samples, 2)
     """
     from sklearn.decomposition import NMF
 
     # NMF requires non-negative data. Shift so min is zero.
-    embeddings_nmf = embeddings - embeddings.min()
+    shift = float(embeddings.min())
+    embeddings_nmf = embeddings - shift
 
     nmf_params = {
         'n_components': config.get('n_components', 2),
@@ -25,4 +26,12 @@ def run(embeddings, config):
 
     nmf = NMF(**nmf_params)
     embedding = nmf.fit_transform(embeddings_nmf)
-    return embedding 
\ No newline at end of file
+    return embedding, (nmf, shift)
+
+def transform(model, embeddings):
+    # Same shift as the fit; values below the fitted minimum clip to zero
+    nmf, shift = model
+    return nmf.transform(np.maximum(embeddings - shift, 0))
+
+def run(embeddings, config):
+    return fit(embeddings, config)[0]
@@ -1,6 +1,6 @@
 import numpy as np
 
-def run(embeddings, config):
+def fit(embeddings, config):
     """
     Run Nystroem + PCA pipeline for approximate kernel DR.
 
@@ -9,7 +9,7 @@ def run(embeddings, config):
         config: dictionary with Nystroem and PCA parameters
 
     Returns:
-        numpy array of shape (n_samples, 2) with x, y coordinates
+        (coords, fitted estimator); coords has shape (n_samples, 2)
     """
     from sklearn.kernel_approximation import Nystroem
     from sklearn.decomposition import PCA
@@ -30,4 +30,7 @@ def run(embeddings, config):
     pca = PCA(**pca_params)
     pipe = make_pipeline(feat_map, pca)
     embedding = pipe.fit_transform(embeddings)
-    return embedding 
\ No newline at end of file
+    return embedding, pipe
+
+def run(embeddings, config):
+    return fit(embeddings, config)[0]
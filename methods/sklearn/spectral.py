@@ -40,6 +40,13 @@ def run(embeddings, config):
             if param in config:
                 spectral_params[param] = config[param]
         
+        # Reuse the cached kNN graph (see knncache.py) instead of searching again
+        X = embeddings
+        graph = config.get('knn_graph')
+        if graph is not None and spectral_params['affinity'] == 'nearest_neighbors':
+            spectral_params['affinity'] = 'precomputed_nearest_neighbors'
+            X = graph.sparse(spectral_params['n_neighbors'])
+        
         print(f"SPECTRAL_CONFIG: {spectral_params}")
         
         # Initialize and fit Spectral Embedding
@@ -47,7 +54,7 @@ def run(embeddings, config):
         spectral = SpectralEmbedding(**spectral_params)
         
         print("SPECTRAL_PROCESS: Fitting and transforming data...")
-        embedding = spectral.fit_transform(embeddings)
+        embedding = spectral.fit_transform(X)
         
         print(f"SPECTRAL_COMPLETE: Produced output shape {embedding.shape}")
         
@@ -1,6 +1,6 @@
 import numpy as np
 
-def run(embeddings, config):
+def fit(embeddings, config):
     """
     Run SparseRandomProjection dimensionality reduction.
 
@@ -9,7 +9,7 @@ def run(embeddings, config):
         config: dictionary with SRP parameters
 
     Returns:
-        numpy array of shape (n_samples, 2) with x, y coordinates
+        (coords, fitted estimator); coords has shape (n_samples, 2)
     """
     from sklearn.random_projection import SparseRandomProjection
 
@@ -25,4 +25,7 @@ def run(embeddings, config):
 
     srp = SparseRandomProjection(**srp_params)
     embedding = srp.fit_transform(embeddings)
-    return embedding 
\ No newline at end of file
+    return embedding, srp
+
+def run(embeddings, config):
+    return fit(embeddings, config)[0]
@@ -1,6 +1,6 @@
 import numpy as np
 
-def run(embeddings, config):
+def fit(embeddings, config):
     """
     Run TruncatedSVD dimensionality reduction.
 
@@ -9,7 +9,7 @@ def run(embeddings, config):
         config: dictionary with SVD parameters
 
     Returns:
-        numpy array of shape (n_samples, 2) with x, y coordinates
+        (coords, fitted estimator); coords has shape (n_samples, 2)
     """
     from sklearn.decomposition import TruncatedSVD
 
@@ -21,4 +21,7 @@ def run(embeddings, config):
 
     svd = TruncatedSVD(**svd_params)
     embedding = svd.fit_transform(embeddings)
-    return embedding 
\ No newline at end of file
+    return embedding, svd
+
+def run(embeddings, config):
+    return fit(embeddings, config)[0]
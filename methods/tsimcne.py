@@ -6,10 +6,23 @@ try:
 except ImportError:
     TSimCNE = None
 
-def run(embeddings, config):
+def _to_numpy(Y):
+    if hasattr(Y, 'detach'):
+        Y = Y.detach().cpu().numpy()
+    elif hasattr(Y, 'cpu'):
+        Y = Y.cpu().numpy()
+    return Y
+
+def _dataset(embeddings):
+    # t-SimCNE expects a dataset, so we wrap embeddings as a torch TensorDataset
+    import torch
+    from torch.utils.data import TensorDataset
+    return TensorDataset(torch.tensor(embeddings, dtype=torch.float32))
+
+def fit(embeddings, config):
     if TSimCNE is None:
         # Fallback: random 2D projection
-        return np.random.randn(len(embeddings), 2)
+        return np.random.randn(len(embeddings), 2), None
     # Only keep valid tsimcne parameters, including batch_size and device
     valid_keys = ["n_components", "total_epochs", "random_state", "batch_size", "device"]
     tsimcne_cfg = {k: v for k, v in config.items() if k in valid_keys}
@@ -17,20 +30,17 @@ def run(embeddings, config):
     if "total_epochs" in tsimcne_cfg and isinstance(tsimcne_cfg["total_epochs"], str):
         tsimcne_cfg["total_epochs"] = [int(x) for x in tsimcne_cfg["total_epochs"].split(",")]
     print(f"[t-SimCNE] Config: {tsimcne_cfg}")
-    # t-SimCNE expects a dataset, so we wrap embeddings as a torch TensorDataset
-    import torch
-    from torch.utils.data import TensorDataset
-    X = torch.tensor(embeddings, dtype=torch.float32)
-    dataset = TensorDataset(X)
+    dataset = _dataset(embeddings)
     model = TSimCNE(**tsimcne_cfg)
     print(f"[t-SimCNE] Fitting model on {len(dataset)} samples...")
     model.fit(dataset)
     print("[t-SimCNE] Transforming to 2D coordinates...")
-    Y = model.transform(dataset)
-    # Ensure output is a numpy array
-    if hasattr(Y, 'detach'):
-        Y = Y.detach().cpu().numpy()
-    elif hasattr(Y, 'cpu'):
-        Y = Y.cpu().numpy()
+    Y = _to_numpy(model.transform(dataset))
     print(f"[t-SimCNE] Output shape: {Y.shape}")
-    return Y 
\ No newline at end of file
+    return Y, model
+
+def transform(model, embeddings):
+    return _to_numpy(model.transform(_dataset(embeddings)))
+
+def run(embeddings, config):
+    return fit(embeddings, config)[0]
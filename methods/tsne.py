@@ -4,7 +4,7 @@ t-SNE implementation for dimensionality reduction.
 """
 import numpy as np
 
-def run(embeddings, config):
+def fit(embeddings, config):
     """Run t-SNE dimensionality reduction
     
     Args:
@@ -12,7 +12,7 @@ def run(embeddings, config):
         config: dictionary with t-SNE parameters
     
     Returns:
-        numpy array of shape (n_samples, 2) with x,y coordinates
+        (coords, fitted model); coords has shape (n_samples, 2)
     """
     print(f"TSNE_START: Running t-SNE on {embeddings.shape[0]} embeddings ({embeddings.shape[1]} dimensions)")
     
@@ -56,10 +56,13 @@ def run(embeddings, config):
         if embedding.shape[1] != 2:
             print(f"TSNE_WARNING: Output dimensions ({embedding.shape[1]}) is not 2")
         
-        return embedding
+        return embedding, embedding  # TSNEEmbedding carries its own transform()
         
     except Exception as e:
         import traceback
         print(f"TSNE_ERROR: {str(e)}")
         print(traceback.format_exc())
         raise
+
+def run(embeddings, config):
+    return fit(embeddings, config)[0]
@@ -7,9 +7,10 @@ try:
 except ImportError:
     umap = None
 
-def run(embeddings: np.ndarray, cfg: dict) -> np.ndarray:
+def fit(embeddings: np.ndarray, cfg: dict):
+    """Return (coords, fitted UMAP); the reducer is kept for UMAP.transform."""
     if umap is None:
-        return np.random.randn(len(embeddings), 2)
+        return np.random.randn(len(embeddings), 2), None
     # Only keep valid UMAP parameters
     valid_keys = [
         "n_neighbors",
@@ -22,5 +23,16 @@ def run(embeddings: np.ndarray, cfg: dict) -> np.ndarray:
         "random_state"
     ]
     umap_cfg = {k: v for k, v in cfg.items() if k in valid_keys}
+    graph = cfg.get("knn_graph")
+    if graph is not None:
+        # Cached kNN graph (see knncache.py); UMAP counts the point itself as
+        # its first neighbour, as the cache does. Without a search index the
+        # reducer cannot transform(), so run.py skips this with --save-model.
+        idx, dists = graph.neighbors(umap_cfg.get("n_neighbors", 15))
+        umap_cfg["precomputed_knn"] = (idx, dists, None)
+        umap_cfg["force_approximation_algorithm"] = True   # else <4096 points recompute
     reducer = umap.UMAP(**umap_cfg)
-    return reducer.fit_transform(embeddings)
\ No newline at end of file
+    return reducer.fit_transform(embeddings), reducer
+
+def run(embeddings: np.ndarray, cfg: dict) -> np.ndarray:
+    return fit(embeddings, cfg)[0]
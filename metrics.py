@@ -0,0 +1,210 @@
+# metrics.py
+#!/usr/bin/env python3
+"""Layout quality scores, stored per run in the `run_metrics` table.
+
+    knn_preservation(high_idx, Y, k)   mean share of each point's k nearest
+                                       input-space neighbours that are also
+                                       among its k nearest in the layout
+    trust_continuity(X, Y, ks)         trustworthiness (layout neighbours that
+                                       are far in the input) and continuity
+                                       (input neighbours torn apart), per k
+    shepard(X, Y)                      Spearman correlation of input vs layout
+                                       distances over sampled pairs
+    artist_silhouette(Y, artists)      silhouette of the artist labels in the
+                                       layout, overall and per artist
+
+High-dimensional neighbours come from knncache.py's shared graph (column 0
+is the point itself and is dropped); layout neighbours from a KD-tree.
+Trustworthiness/continuity need full distance ranks, so they are computed
+exactly for up to SAMPLE query points, one block of rows at a time, and
+estimated from those above it; Shepard and silhouette use fixed-size samples
+too. Nothing is O(n²) in memory, so 100k-point runs score in seconds.
+
+    python run.py --method umap --config fast --metrics   # score right after the fit
+    python metrics.py                                      # compare stored runs
+    python metrics.py --method umap tsne --sort trustworthiness
+"""
+import argparse, sys
+import numpy as np
+
+BATCH = 65536
+KS = (5, 10, 30)
+SAMPLE = 1000            # trustworthiness/continuity query points, Shepard points
+SILHOUETTE_SAMPLE = 10000
+BLOCK_ELEMS = 1 << 24    # distances held per block of query rows (64 MiB float32)
+
+
+def knn_low(Y: np.ndarray, k: int) -> np.ndarray:
+    """k nearest neighbours of every row of the layout Y, self excluded."""
+    from scipy.spatial import cKDTree
+    Y = np.ascontiguousarray(Y[:, :2], dtype=np.float64)
+    return cKDTree(Y).query(Y, k=k + 1, workers=-1)[1][:, 1:]
+
+
+def knn_preservation(high_idx: np.ndarray, Y: np.ndarray, k: int = 10,
+                     low_idx: np.ndarray = None) -> float:
+    """Mean |N_k^high(i) ∩ N_k^low(i)| / k; 1.0 means every neighbourhood survives.
+
+    low_idx: knn_low(Y, >= k), to share one KD-tree query between several k.
+    """
+    high = np.asarray(high_idx)[:, :k]
+    low = (knn_low(Y, k) if low_idx is None else low_idx)[:, :k]
+    hits = 0
+    for s in range(0, len(high), BATCH):
+        h, l = high[s:s + BATCH], low[s:s + BATCH]
+        hits += int((h[:, :, None] == l[:, None, :]).any(axis=2).sum())
+    return hits / (len(high) * k)
+
+
+def _sample(n: int, size: int, seed: int) -> np.ndarray:
+    if n <= size:
+        return np.arange(n)
+    return np.sort(np.random.default_rng(seed).choice(n, size, replace=False))
+
+
+def _distances(X: np.ndarray, rows: np.ndarray, metric: str, sq=None) -> np.ndarray:
+    """(len(rows), n) distances from X[rows] to every row of X."""
+    q = X[rows]
+    if metric in ("euclidean", "cosine"):      # cosine: X is already unit-normalised
+        d = sq[rows, None] - 2.0 * (q @ X.T) + sq[None, :]
+        return np.sqrt(np.maximum(d, 0, out=d), out=d)
+    from sklearn.metrics import pairwise_distances   # sklearn metric names
+    return pairwise_distances(q, X, metric=metric).astype(np.float32)
+
+
+def trust_continuity(X: np.ndarray, Y: np.ndarray, ks=KS, metric: str = "euclidean",
+                     sample: int = SAMPLE, seed: int = 0) -> dict:
+    """{k: (trustworthiness, continuity)}, exact for n <= sample (same as sklearn's
+    trustworthiness), else averaged over *sample* random query points."""
+    n = len(X)
+    ks = [k for k in ks if 0 < k < (2 * n - 1) / 3]
+    if not ks:
+        return {}
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    if metric == "cosine":
+        X = X / np.maximum(np.linalg.norm(X, axis=1, keepdims=True), 1e-12)
+    Y = np.ascontiguousarray(Y[:, :2], dtype=np.float32)
+    sq_x = (X * X).sum(axis=1) if metric in ("euclidean", "cosine") else None
+    sq_y = (Y * Y).sum(axis=1)
+    rows = _sample(n, sample, seed)
+    kmax = max(ks)
+    trust, cont = dict.fromkeys(ks, 0.0), dict.fromkeys(ks, 0.0)
+
+    block = max(1, BLOCK_ELEMS // n)
+    for s in range(0, len(rows), block):
+        rb = rows[s:s + block]
+        dh = _distances(X, rb, metric, sq_x)
+        dl = _distances(Y, rb, "euclidean", sq_y)
+        dh[np.arange(len(rb)), rb] = np.inf
+        dl[np.arange(len(rb)), rb] = np.inf
+        nh, nl = _nearest(dh, kmax), _nearest(dl, kmax)
+        sh, sl = np.sort(dh, axis=1), np.sort(dl, axis=1)
+        for r in range(len(rb)):
+            for k in ks:
+                # intruders: layout neighbours outside the input neighbourhood
+                u = np.setdiff1d(nl[r, :k], nh[r, :k], assume_unique=True)
+                if len(u):       # 1-based rank among the input distances
+                    rank = np.searchsorted(sh[r], dh[r, u]) + 1
+                    trust[k] += float((np.maximum(rank, k + 1) - k).sum())
+                # extruders: input neighbours missing from the layout neighbourhood
+                v = np.setdiff1d(nh[r, :k], nl[r, :k], assume_unique=True)
+                if len(v):
+                    rank = np.searchsorted(sl[r], dl[r, v]) + 1
+                    cont[k] += float((np.maximum(rank, k + 1) - k).sum())
+
+    m = len(rows)
+    return {k: (1 - 2 / (m * k * (2 * n - 3 * k - 1)) * trust[k],
+                1 - 2 / (m * k * (2 * n - 3 * k - 1)) * cont[k]) for k in ks}
+
+
+def _nearest(d: np.ndarray, k: int) -> np.ndarray:
+    """Column indices of the k smallest entries of each row, ascending."""
+    top = np.argpartition(d, k - 1, axis=1)[:, :k]
+    order = np.argsort(np.take_along_axis(d, top, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(top, order, axis=1)
+
+
+def shepard(X: np.ndarray, Y: np.ndarray, metric: str = "euclidean",
+            sample: int = SAMPLE, seed: int = 0) -> float:
+    """Spearman ρ between input and layout distances of all pairs of a sample."""
+    from scipy.spatial.distance import pdist
+    from scipy.stats import spearmanr
+    rows = _sample(len(X), sample, seed)
+    if len(rows) < 3:
+        return float("nan")
+    dh = pdist(np.asarray(X[rows], dtype=np.float64), metric=metric)
+    dl = pdist(np.asarray(Y[rows, :2], dtype=np.float64))
+    return float(spearmanr(dh, dl).correlation)
+
+
+def artist_silhouette(Y: np.ndarray, artists, sample: int = SILHOUETTE_SAMPLE,
+                      seed: int = 0):
+    """(mean silhouette, {artist: mean silhouette}) of the layout, artists as labels.
+
+    None when there are fewer than two artists (or as many artists as points).
+    """
+    from sklearn.metrics import silhouette_samples
+    rows = _sample(len(Y), sample, seed)
+    labels = np.asarray(artists)[rows]
+    names, inverse = np.unique(labels, return_inverse=True)
+    if not 1 < len(names) < len(rows):
+        return None
+    s = silhouette_samples(np.asarray(Y[rows, :2], dtype=np.float64), inverse)
+    per = np.bincount(inverse, weights=s) / np.bincount(inverse)
+    return float(s.mean()), dict(zip(names.tolist(), per.tolist()))
+
+
+def evaluate(X: np.ndarray, Y: np.ndarray, artists, high_idx: np.ndarray, ks=KS,
+             metric: str = "euclidean", seed: int = 0) -> list:
+    """Every score of one layout → run_metrics rows (metric, k, label, value, n).
+
+    high_idx: input-space neighbours without self, >= max(ks) columns.
+    """
+    n = len(Y)
+    ks = [k for k in ks if k < n and k <= np.shape(high_idx)[1]]
+    rows = []
+    if ks:
+        low = knn_low(Y, max(ks))
+        rows += [("knn_preservation", k, "", knn_preservation(high_idx, Y, k, low), n)
+                 for k in ks]
+    m = min(n, SAMPLE)
+    for k, (t, c) in trust_continuity(X, Y, ks, metric, seed=seed).items():
+        rows += [("trustworthiness", k, "", t, m), ("continuity", k, "", c, m)]
+    rows.append(("shepard", 0, "", shepard(X, Y, metric, seed=seed), m))
+    sil = artist_silhouette(Y, artists, seed=seed)
+    if sil is not None:
+        m = min(n, SILHOUETTE_SAMPLE)
+        rows.append(("silhouette", 0, "", sil[0], m))
+        rows += [("silhouette", 0, artist, v, m) for artist, v in sil[1].items()]
+    return rows
+
+
+def main(argv=None):
+    import db
+    ap = argparse.ArgumentParser(description="Compare stored layout-quality scores.")
+    ap.add_argument("--method", nargs="*", help="only these methods")
+    ap.add_argument("--k", type=int, default=10, help="neighbourhood size to show")
+    ap.add_argument("--sort", default="trustworthiness",
+                    choices=["trustworthiness", "continuity", "knn_preservation", "shepard",
+                             "silhouette"])
+    args = ap.parse_args(argv)
+
+    table = db.get_metrics(methods=args.method)
+    if not table:
+        sys.exit("No scored runs yet; run.py --metrics (or sweep.py --metrics) scores a fit")
+    cols = ["trustworthiness", "continuity", "knn_preservation", "shepard", "silhouette"]
+    runs = {}
+    for r in table:
+        if r["label"] == "" and r["k"] in (0, args.k):
+            runs.setdefault((r["method"], r["config_id"]), {})[r["metric"]] = r["value"]
+    ranked = sorted(runs.items(), key=lambda kv: (kv[1].get(args.sort) is None,
+                                                  -(kv[1].get(args.sort) or 0.0)))
+    print(f"{'method':<15}{'cfg':>5}  " + "  ".join(f"{c[:10]:>10}" for c in cols) +
+          f"   (k={args.k})")
+    for (method, cfg_id), vals in ranked:
+        print(f"{method:<15}{cfg_id:>5}  " + "  ".join(
+            f"{vals[c]:>10.4f}" if vals.get(c) is not None else f"{'-':>10}" for c in cols))
+
+
+if __name__ == "__main__":
+    main()
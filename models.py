@@ -0,0 +1,146 @@
+# models.py
+#!/usr/bin/env python3
+"""Fitted-model artifacts and out-of-sample placement into existing runs.
+
+`python run.py ... --save-model` pickles the fitted estimator of methods
+whose wrapper exposes `fit()` to ``<DR_CACHE>/models/<method>/<config_id>.pkl``.
+New embeddings (already loaded with ingest.py) are then projected into that
+run and appended to its points without refitting:
+
+    python models.py --method umap --config-id 42 Vincent_van_Gogh_901.avif ...
+    python models.py --method mds --config-id 7 --from-file new.txt --k 15
+
+Placement uses the wrapper's `transform(model, X)` if it defines one, else
+the model's own `.transform(X)` (UMAP, openTSNE, ParamRepulsor, sklearn).
+Methods without a saved model fall back to kNN barycentric interpolation:
+each new point is written as the LLE-style reconstruction weights of its k
+nearest run points in embedding space, applied to their 2-D coordinates.
+Runs with a `preprocess:` pipeline push the new rows through the fitted
+pipeline cached by preprocess.py first.
+"""
+import argparse, os, pickle, sys, time
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import db, preprocess
+
+MODEL_DIR = Path(db.CACHE_DIR) / "models"
+
+def model_path(method: str, config_id: int) -> Path:
+    return MODEL_DIR / method / f"{config_id}.pkl"
+
+def save_model(method: str, config_id: int, model, tier: str = "f32",
+               dim: Optional[int] = None, subset_id: Optional[int] = None,
+               pipeline: Optional[str] = None) -> Path:
+    """Pickle *model* with what is needed to feed it matching inputs."""
+    path = model_path(method, config_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".tmp{os.getpid()}")
+    with open(tmp, "wb") as f:
+        pickle.dump({"method": method, "config_id": config_id, "tier": tier, "dim": dim,
+                     "subset_id": subset_id, "pipeline": pipeline, "model": model},
+                    f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+    return path
+
+def load_model(method: str, config_id: int) -> Optional[dict]:
+    try:
+        with open(model_path(method, config_id), "rb") as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+
+def discard_model(method: str, config_id: int) -> None:
+    try:
+        model_path(method, config_id).unlink()
+    except FileNotFoundError:
+        pass
+
+def barycentric(ref_X: np.ndarray, ref_Y: np.ndarray, X: np.ndarray,
+                k: int = 10, reg: float = 1e-3) -> np.ndarray:
+    """Place X at the barycentric (LLE) weights of its k nearest ref points."""
+    import embstore
+    k = min(k, len(ref_X))
+    idx = embstore.array_knn(ref_X, X, k)
+    Z = ref_X[idx] - X[:, None, :]                        # (m, k, d)
+    G = Z @ Z.transpose(0, 2, 1)                          # local Gram, (m, k, k)
+    trace = np.trace(G, axis1=1, axis2=2)
+    G += (reg * np.where(trace > 0, trace, 1.0))[:, None, None] * np.eye(k, dtype=G.dtype)
+    w = np.linalg.solve(G, np.ones((len(X), k, 1), G.dtype))[..., 0]
+    w /= w.sum(axis=1, keepdims=True)
+    return np.einsum("mk,mkc->mc", w, ref_Y[idx])
+
+def transform(method: str, config_id: int, rowids, k: int = 10, force_knn: bool = False):
+    """Project embeddings.rowid *rowids* into a stored run → (rowids, coords, how).
+
+    Rowids already in the run are dropped.
+    """
+    import embstore
+    run = db.get_projection_points(method, config_id, as_arrays=True)
+    if run is None:
+        raise ValueError(f"No stored run for method={method}, config_id={config_id}")
+    rowids = np.asarray(rowids, dtype=np.int64)
+    rowids = rowids[~np.isin(rowids, run["point_ids"])]
+    if len(rowids) == 0:
+        return rowids, np.empty((0, run["coords"].shape[1]), np.float32), "none"
+
+    art = None if force_knn else load_model(method, config_id)
+    # new rows go through the run's fitted preprocessing (preprocess.py) too
+    cfg = db.get_dr_config(method, config_id)
+    tier = art["tier"] if art else cfg.get("embedding_tier") or "f32"
+    fitted = preprocess.load_pipeline(cfg["subset_id"], cfg.get("preprocess"), tier)
+    with db.conn() as c:
+        store = embstore.open_store(c)
+    X = preprocess.transform(store.take(rowids, tier=tier)[0], fitted)
+
+    if art is not None:
+        from run import load_method
+        mod = load_method(method)
+        fn = getattr(mod, "transform", None)
+        Y = fn(art["model"], X) if fn else art["model"].transform(X)
+        how = "native"
+    else:
+        ref_X = preprocess.transform(store.take(run["point_ids"], tier=tier)[0], fitted)
+        Y = barycentric(ref_X, run["coords"].astype(np.float32), X, k=k)
+        how = f"knn(k={min(k, len(ref_X))})"
+    return rowids, np.asarray(Y, dtype=np.float32).reshape(len(rowids), -1), how
+
+def place(method: str, config_id: int, filenames, k: int = 10, force_knn: bool = False) -> dict:
+    """Transform *filenames* into a run and append them to its points."""
+    found = db.rowids_for_filenames(filenames)
+    missing = [fn for fn in filenames if fn not in found]
+    t0 = time.time()
+    rowids, coords, how = transform(method, config_id, list(found.values()), k, force_knn)
+    added = db.append_run(method, config_id, rowids, coords) if len(rowids) else 0
+    return {"added": added, "missing": missing, "how": how, "seconds": time.time() - t0}
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Place new embeddings into an existing DR run.")
+    ap.add_argument("--method", required=True)
+    ap.add_argument("--config-id", type=int, required=True)
+    ap.add_argument("filenames", nargs="*", help="embeddings.filename values to place")
+    ap.add_argument("--from-file", help="text file with one filename per line")
+    ap.add_argument("--k", type=int, default=10, help="neighbours for the kNN fallback")
+    ap.add_argument("--knn", action="store_true", help="use the kNN fallback even if a model is saved")
+    args = ap.parse_args(argv)
+
+    filenames = list(args.filenames)
+    if args.from_file:
+        with open(args.from_file) as f:
+            filenames += [line.strip() for line in f if line.strip()]
+    if not filenames:
+        ap.error("no filenames given")
+
+    try:
+        res = place(args.method, args.config_id, filenames, k=args.k, force_knn=args.knn)
+    except (ValueError, FileNotFoundError) as e:
+        sys.exit(f"❌ {e}")
+    if res["missing"]:
+        print(f"WARNING: {len(res['missing'])} filenames not in embeddings "
+              f"(ingest them first): {res['missing'][:5]}")
+    print(f"✅ {args.method}:{args.config_id}  added={res['added']}  "
+          f"via={res['how']}  time={res['seconds']:.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,343 @@
+# mosaic.py
+#!/usr/bin/env python3
+"""Tile-by-tile thumbnail compositor behind viz.py.
+
+    comp = mosaic.Compositor(THUMB_DIR, filenames, viz_x, viz_y, cell=128,
+                             width=16384, height=16384)
+    for tx, ty, tile in comp.tiles():          # RGB uint8, row-major tile order
+        ...
+
+Every thumbnail is shrunk to fit a `cell`×`cell` box centred on its point
+(viz_x, viz_y); later points are drawn on top. Placements are bucketed into
+TILE×TILE canvas tiles up front. Tiles are produced one row (band) at a
+time: the band's thumbnails are decoded and resized on a thread pool
+(Pillow releases the GIL while decoding and resampling), each tile is
+composited in one NumPy pass, and thumbnails no later band needs are
+dropped. Memory therefore stays at roughly one band of decoded thumbnails
+plus the tiles in flight, independent of the number of points and of the
+canvas size; no pyvips operation graph is built.
+
+    stats = mosaic.write_pyramid(comp, "assets/visualizations/7")   # DZI tiles
+
+write_pyramid streams the same tiles into a Deep Zoom pyramid instead of one
+image: tiles.dzi plus tiles_files/<level>/<col>_<row>.<fmt>, where level L is
+the canvas shrunk 2^(max_level - L) times. Each level keeps the non-blank
+TILE² blocks of one pending row of 2×-downsampled pixels, so a 65536²
+canvas never exists in memory. Blank tiles are not written (the viewer draws them black).
+The manifest gets a tiles.dzi.zst twin for Caddy's `precompressed zstd`
+when the zstd CLI is installed; image tiles are already compressed and are
+served as they are.
+
+    dirty = mosaic.touched(old_x, old_y, cell, w, h) ∪ mosaic.touched(new_x, ...)
+    mosaic.write_pyramid(comp, dir_with_previous_pyramid, only=dirty)
+
+With only=, just those canvas tiles are recomposited. Lower levels rebuild
+only the blocks above them, taking the unchanged quadrants back from the
+tiles already on disk. Every file is written to a temporary name and
+renamed, so a pyramid hardlinked from a previous render is never modified.
+"""
+import os, shutil, subprocess, time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+TILE = 1024
+DZI_TILE = 512
+FORMATS = {"webp": "WEBP", "jpg": "JPEG", "png": "PNG", "avif": "AVIF"}   # → Pillow format
+
+
+def decode(path, cell: int):
+    """RGB uint8 array of the image at *path*, shrunk to fit cell×cell; None if
+    it is missing or unreadable."""
+    import pillow_avif                             # registers AVIF support in Pillow
+    from PIL import Image
+    try:
+        with Image.open(path) as im:
+            im.draft("RGB", (cell, cell))           # JPEG: decode at reduced size
+            im = im.convert("RGB")
+            im.thumbnail((cell, cell), Image.Resampling.LANCZOS, reducing_gap=2.0)
+            return np.asarray(im)
+    except OSError:                                # includes FileNotFoundError
+        return None
+
+
+def _cover(x0, y0, cell: int, width: int, height: int, tile: int):
+    """(tile keys, placement indices, last tile row per placement) for every
+    tile a cell×cell box with top-left (x0, y0) overlaps."""
+    cols, rows = -(-width // tile), -(-height // tile)
+    span = lambda lo, hi: (np.clip(lo // tile, 0, hi), np.clip((lo + cell - 1) // tile, 0, hi))
+    tx0, tx1 = span(x0, cols - 1)
+    ty0, ty1 = span(y0, rows - 1)
+    inside = (x0 + cell > 0) & (x0 < width) & (y0 + cell > 0) & (y0 < height)
+    keys, items = [], []
+    reach = -(-cell // tile) + 1                   # tiles a box can span per axis
+    for dy in range(reach):
+        for dx in range(reach):
+            hit = inside & (ty0 + dy <= ty1) & (tx0 + dx <= tx1)
+            idx = np.nonzero(hit)[0]
+            keys.append((ty0[idx] + dy) * cols + tx0[idx] + dx)
+            items.append(idx)
+    return np.concatenate(keys), np.concatenate(items), ty1
+
+
+def touched(x, y, cell: int, width: int, height: int, tile: int = TILE) -> np.ndarray:
+    """Sorted keys (ty * cols + tx) of the tiles that thumbnails at (x, y) draw into."""
+    cell = int(cell)
+    x0 = np.asarray(x, dtype=np.int64) - cell // 2
+    y0 = np.asarray(y, dtype=np.int64) - cell // 2
+    return np.unique(_cover(x0, y0, cell, width, height, tile)[0])
+
+
+class Compositor:
+    """Thumbnails at canvas positions → composited canvas tiles."""
+
+    def __init__(self, thumb_dir, filenames, x, y, cell: int, width: int, height: int,
+                 tile: int = TILE, threads: int = None, load=decode):
+        self.thumb_dir = Path(thumb_dir)
+        self.filenames = np.asarray(filenames)
+        self.cell, self.width, self.height, self.tile = int(cell), width, height, tile
+        self.threads = threads or os.cpu_count()
+        self.load = load
+        self.cols, self.rows = -(-width // tile), -(-height // tile)
+        self.missing = []
+        self.decoded = 0                           # thumbnails composited so far
+        # placement boxes: cell×cell, centred on the point
+        self.x0 = np.asarray(x, dtype=np.int64) - self.cell // 2
+        self.y0 = np.asarray(y, dtype=np.int64) - self.cell // 2
+        self._index()
+
+    def _index(self) -> None:
+        """Bucket placements into the tiles their box overlaps (CSR, draw order)."""
+        keys, items, ty1 = _cover(self.x0, self.y0, self.cell, self.width, self.height, self.tile)
+        order = np.lexsort((items, keys))
+        self.keys, self.items = keys[order], items[order]
+        self.tile_keys, self.starts = np.unique(self.keys, return_index=True)
+        self.ends = np.append(self.starts[1:], len(self.keys))
+        self.last_row = ty1                        # band after which a thumbnail can go
+
+    def tile_box(self, key: int):
+        """(x, y, w, h) of tile *key* on the canvas."""
+        ty, tx = divmod(int(key), self.cols)
+        x, y = tx * self.tile, ty * self.tile
+        return x, y, min(self.tile, self.width - x), min(self.tile, self.height - y)
+
+    def _decode(self, i: int):
+        img = self.load(self.thumb_dir / self.filenames[i], self.cell)
+        if img is None:
+            self.missing.append(str(self.filenames[i]))
+        return img
+
+    def _composite(self, key: int, thumbs: dict) -> np.ndarray:
+        x, y, w, h = self.tile_box(key)
+        out = np.zeros((h, w, 3), np.uint8)
+        s = np.searchsorted(self.tile_keys, key)
+        for i in self.items[self.starts[s]:self.ends[s]]:
+            img = thumbs.get(i)
+            if img is None:
+                continue
+            ih, iw = img.shape[:2]
+            # the thumbnail is centred in its cell
+            px = self.x0[i] + (self.cell - iw) // 2 - x
+            py = self.y0[i] + (self.cell - ih) // 2 - y
+            a, b = max(px, 0), min(px + iw, w)
+            c, d = max(py, 0), min(py + ih, h)
+            if a < b and c < d:
+                out[c:d, a:b] = img[c - py:d - py, a - px:b - px, :3]
+        return out
+
+    def tiles(self, only=None):
+        """Yield (tx, ty, tile) for every tile holding a thumbnail, band by band.
+
+        only: tile keys (ty * cols + tx) to produce; the rest are skipped.
+        Tiles without any placement are never yielded – they are black.
+        """
+        keys = self.tile_keys if only is None else \
+            self.tile_keys[np.isin(self.tile_keys, np.asarray(list(only), dtype=np.int64))]
+        thumbs = {}
+        with ThreadPoolExecutor(self.threads) as pool:
+            for row in np.unique(keys // self.cols):
+                band = keys[keys // self.cols == row]
+                need = np.unique(np.concatenate([
+                    self.items[self.starts[s]:self.ends[s]]
+                    for s in np.searchsorted(self.tile_keys, band)]))
+                todo = [i for i in need.tolist() if i not in thumbs]
+                imgs = list(pool.map(self._decode, todo))
+                self.decoded += sum(img is not None for img in imgs)
+                thumbs.update(zip(todo, imgs))
+                for key, tile in zip(band, pool.map(lambda k: self._composite(k, thumbs), band)):
+                    ty, tx = divmod(int(key), self.cols)
+                    yield tx, ty, tile
+                for i in [i for i in thumbs if self.last_row[i] <= row]:
+                    del thumbs[i]
+
+
+def _half(a: np.ndarray) -> np.ndarray:
+    """2× box-filter downsample of an (h, w, 3) uint8 array (odd edges repeated)."""
+    h, w = a.shape[:2]
+    if h % 2 or w % 2:
+        a = np.pad(a, ((0, h % 2), (0, w % 2), (0, 0)), mode="edge")
+    s = a[0::2, 0::2].astype(np.uint16)
+    s += a[1::2, 0::2]
+    s += a[0::2, 1::2]
+    s += a[1::2, 1::2]
+    s += 2
+    s >>= 2
+    return s.astype(np.uint8)
+
+
+class _Pyramid:
+    """Canvas blocks (band×band, row-major) → DZI tiles of every level.
+
+    Each level below the top keeps only the blocks of its current band row
+    that something was drawn into; a finished row is written out and halved
+    into the next level down, so work and memory follow the non-blank area.
+    With reuse, quadrants nothing was drawn into are read back from the
+    tiles on disk instead of being left black, and blank tiles are deleted.
+    """
+
+    def __init__(self, out_dir: Path, width: int, height: int, band: int, tile_size: int,
+                 fmt: str, quality: int, pool, reuse: bool = False):
+        if band % tile_size:
+            raise ValueError(f"tile_size {tile_size} must divide the compositor tile {band}")
+        self.files = out_dir / "tiles_files"
+        self.band, self.ts, self.pool = band, tile_size, pool
+        self.fmt, self.quality, self.reuse = fmt, quality, reuse
+        self.max_level = (max(width, height) - 1).bit_length()
+        # level l is the canvas shrunk 2^(max_level - l) times, sizes rounded up
+        self.dims = {l: (-(-width // (1 << (self.max_level - l))),
+                         -(-height // (1 << (self.max_level - l))))
+                     for l in range(self.max_level + 1)}
+        self.pending = {}                  # level → (band row, {block col: [array, fed quadrants]})
+        self.futures, self.written = [], 0
+
+    def add(self, level: int, row: int, col: int, a: np.ndarray) -> None:
+        self._write(level, row, col, a)
+        if level == 0:
+            return
+        lo, r, c, B = level - 1, row // 2, col // 2, self.band
+        if lo in self.pending and self.pending[lo][0] != r:
+            self._flush(lo)
+        blocks = self.pending.setdefault(lo, (r, {}))[1]
+        if c not in blocks:
+            w, h = self.dims[lo]
+            blocks[c] = [np.zeros((min(B, h - r * B), min(B, w - c * B), 3), np.uint8), set()]
+        blocks[c][1].add((row % 2, col % 2))
+        self._paste(blocks[c][0], row % 2, col % 2, a)
+
+    def _paste(self, dst: np.ndarray, qy: int, qx: int, a: np.ndarray) -> None:
+        """Halve child block *a* into quadrant (qy, qx) of its parent block."""
+        half, y0, x0 = _half(a), qy * (self.band // 2), qx * (self.band // 2)
+        dst[y0:y0 + half.shape[0], x0:x0 + half.shape[1]] = \
+            half[:dst.shape[0] - y0, :dst.shape[1] - x0]
+
+    def _flush(self, level: int) -> None:
+        row, blocks = self.pending.pop(level)
+        for col in sorted(blocks):
+            a, fed = blocks[col]
+            if self.reuse:                         # unchanged children: from disk
+                for qy, qx in {(0, 0), (0, 1), (1, 0), (1, 1)} - fed:
+                    child = self._read(level + 1, 2 * row + qy, 2 * col + qx)
+                    if child is not None:
+                        self._paste(a, qy, qx, child)
+            self.add(level, row, col, a)
+
+    def _read(self, level: int, row: int, col: int):
+        """Block (row, col) of *level* assembled from its tile files (missing →
+        black); None if the block lies outside the level."""
+        from PIL import Image
+        if self.fmt == "avif":
+            import pillow_avif                     # registers AVIF support in Pillow
+        w, h = self.dims[level]
+        x, y, B, ts = col * self.band, row * self.band, self.band, self.ts
+        if x >= w or y >= h:
+            return None
+        out = np.zeros((min(B, h - y), min(B, w - x), 3), np.uint8)
+        d = self.files / str(level)
+        for j in range(0, out.shape[0], ts):
+            for i in range(0, out.shape[1], ts):
+                path = d / f"{(x + i) // ts}_{(y + j) // ts}.{self.fmt}"
+                if path.exists():
+                    with Image.open(path) as im:
+                        out[j:j + ts, i:i + ts] = np.asarray(im.convert("RGB"))
+        return out
+
+    def _write(self, level: int, row: int, col: int, a: np.ndarray) -> None:
+        ts, d, x = self.ts, self.files / str(level), col * self.band
+        d.mkdir(parents=True, exist_ok=True)
+        for j in range(0, a.shape[0], ts):
+            for i in range(0, a.shape[1], ts):
+                t = a[j:j + ts, i:i + ts]
+                path = d / f"{(x + i) // ts}_{(row * self.band + j) // ts}.{self.fmt}"
+                if t.any():
+                    self.futures.append(self.pool.submit(self._encode, t, path))
+                    self.written += 1
+                elif self.reuse:
+                    path.unlink(missing_ok=True)
+        while len(self.futures) > 512:             # bound tiles waiting for the encoder
+            self.futures.pop(0).result()
+
+    def _encode(self, t: np.ndarray, path: Path) -> None:
+        from PIL import Image
+        if self.fmt == "avif":
+            import pillow_avif                     # registers AVIF support in Pillow
+        tmp = path.with_name(path.name + ".tmp")  # never write through a hardlink
+        Image.fromarray(np.ascontiguousarray(t)).save(tmp, format=FORMATS[self.fmt],
+                                                      quality=self.quality)
+        os.replace(tmp, path)
+
+    def close(self) -> None:
+        for level in range(self.max_level, -1, -1):    # each flush cascades downwards
+            if level in self.pending:
+                self._flush(level)
+        for f in self.futures:
+            f.result()
+
+
+def write_pyramid(comp: Compositor, out_dir, tile_size: int = DZI_TILE, fmt: str = "webp",
+                  quality: int = 80, only=None) -> dict:
+    """Composite *comp* straight into a DZI pyramid under *out_dir* → stats dict.
+
+    only: compositor tile keys that changed. *out_dir* must then hold the
+    previous pyramid of the same canvas, tile size and format; only these
+    tiles and the blocks above them are rewritten.
+    """
+    out_dir = Path(out_dir)
+    t0 = time.time()
+    with ThreadPoolExecutor(comp.threads) as pool:
+        pyr = _Pyramid(out_dir, comp.width, comp.height, comp.tile, tile_size, fmt,
+                       quality, pool, reuse=only is not None)
+        if only is None:
+            for tx, ty, tile in comp.tiles():
+                pyr.add(pyr.max_level, ty, tx, tile)
+        else:
+            drawn = comp.tiles(only)
+            nxt = next(drawn, None)
+            for key in sorted({int(k) for k in only}):
+                ty, tx = divmod(key, comp.cols)
+                if nxt is not None and nxt[:2] == (tx, ty):
+                    tile, nxt = nxt[2], next(drawn, None)
+                else:                              # nothing left to draw: black
+                    _, _, w, h = comp.tile_box(key)
+                    tile = np.zeros((h, w, 3), np.uint8)
+                pyr.add(pyr.max_level, ty, tx, tile)
+        pyr.close()
+    manifest = out_dir / "tiles.dzi"
+    _replace_text(manifest,
+                  '<?xml version="1.0" encoding="UTF-8"?>\n'
+                  f'<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" Format="{fmt}" '
+                  f'Overlap="0" TileSize="{tile_size}">'
+                  f'<Size Width="{comp.width}" Height="{comp.height}"/></Image>\n')
+    zst = manifest.with_name(manifest.name + ".zst")
+    zst.unlink(missing_ok=True)
+    if shutil.which("zstd"):                       # Caddy: file_server { precompressed zstd }
+        subprocess.run(["zstd", "-q", "-19", str(manifest)], check=True)
+    return {"levels": pyr.max_level + 1, "tiles": pyr.written, "tile_size": tile_size,
+            "format": fmt, "dirty": None if only is None else len(set(only)),
+            "seconds": time.time() - t0}
+
+
+def _replace_text(path: Path, text: str) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(text)
+    os.replace(tmp, path)
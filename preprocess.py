@@ -0,0 +1,199 @@
+# preprocess.py
+#!/usr/bin/env python3
+"""Cached input preprocessing declared per config in configs.yaml.
+
+    umap:
+      - name: pca50_cosine
+        preprocess: [{pca: 50}, l2]          # steps run in order
+        ...
+
+Steps
+  pca: 50          PCA to 50 dims          pca: 0.95   to 95 % explained variance
+  grp: 64          Gaussian random projection to 64 dims
+  srp: 64          sparse random projection to 64 dims
+  standardize      zero mean, unit variance per dimension
+  l2               unit-norm rows
+A step's argument may also be a dict of keyword arguments for the sklearn
+estimator (e.g. {pca: {n_components: 50, whiten: true}}); random steps
+default to random_state 0 so a pipeline is deterministic.
+
+The transformed subset is computed once per (subset, tier, pipeline) and
+kept as float32 under ``<DR_CACHE>/prep/s<subset_id>_<tier>-<pipeline id>/``
+(matrix.npy, the fitted steps in pipeline.pkl, meta.json with stats). The
+pipeline id – a readable slug plus a hash of the canonical steps – is
+stored in each *_configs row's `preprocess` column, so it is part of a
+run's identity, and is the `prep` key the kNN and distance caches use.
+"""
+import json, os, pickle, time, zlib
+from pathlib import Path
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+import db
+
+PREP_DIR = Path(db.CACHE_DIR) / "prep"
+STEPS = ("pca", "grp", "srp", "standardize", "l2")
+
+Step = Tuple[str, Any]
+
+
+def parse(spec) -> List[Step]:
+    """Normalise a config's `preprocess:` value to [(step, arg), ...]."""
+    if not spec:
+        return []
+    if isinstance(spec, (str, dict)):
+        spec = [spec]
+    steps = []
+    for item in spec:
+        if isinstance(item, str):
+            name, arg = item, None
+        elif isinstance(item, dict) and len(item) == 1:
+            (name, arg), = item.items()
+        else:
+            raise ValueError(f"preprocess step must be a name or a one-key mapping, got {item!r}")
+        if name not in STEPS:
+            raise ValueError(f"Unknown preprocess step {name!r}; expected one of {STEPS}")
+        if name in ("pca", "grp", "srp") and arg is None:
+            raise ValueError(f"preprocess step {name!r} needs a target dimension")
+        steps.append((name, None if arg is True else arg))
+    return steps
+
+
+def pipeline_id(steps: List[Step]) -> Optional[str]:
+    """'pca50+l2-1a2b3c4d'; None for no preprocessing."""
+    if not steps:
+        return None
+    canon = json.dumps(steps, sort_keys=True)
+    slug = "+".join(name + (str(arg) if isinstance(arg, (int, float)) else "")
+                    for name, arg in steps)[:40]
+    return f"{slug}-{zlib.crc32(canon.encode()):08x}"
+
+
+def prep_key(steps: List[Step], tier: str = "f32") -> str:
+    """Cache key of the matrix a method sees: the tier, plus the pipeline id."""
+    pid = pipeline_id(steps)
+    return f"{tier}-{pid}" if pid else tier
+
+
+def _estimator(name: str, arg):
+    kwargs = dict(arg) if isinstance(arg, dict) else {"n_components": arg}
+    if name == "pca":
+        from sklearn.decomposition import PCA
+        if isinstance(kwargs["n_components"], float):
+            kwargs.setdefault("svd_solver", "full")      # variance targets need it
+        kwargs.setdefault("random_state", 0)
+        return PCA(**kwargs)
+    from sklearn.random_projection import GaussianRandomProjection, SparseRandomProjection
+    kwargs.setdefault("random_state", 0)
+    return (GaussianRandomProjection if name == "grp" else SparseRandomProjection)(**kwargs)
+
+
+def _l2(X: np.ndarray) -> np.ndarray:
+    return X / np.maximum(np.linalg.norm(X, axis=1, keepdims=True), 1e-12)
+
+
+def fit(X: np.ndarray, steps: List[Step]) -> Tuple[np.ndarray, list]:
+    """Fit every step on X → (float32 result, fitted steps for transform())."""
+    X = np.asarray(X, dtype=np.float32)
+    fitted = []
+    for name, arg in steps:
+        if name == "standardize":
+            mean, std = X.mean(axis=0), X.std(axis=0)
+            std[std == 0] = 1
+            fitted.append((name, (mean, std)))
+            X = (X - mean) / std
+        elif name == "l2":
+            fitted.append((name, None))
+            X = _l2(X)
+        else:
+            est = _estimator(name, arg)
+            X = est.fit_transform(X)
+            fitted.append((name, est))
+        X = np.asarray(X, dtype=np.float32)
+    return np.ascontiguousarray(X), fitted
+
+
+def transform(X: np.ndarray, fitted: list) -> np.ndarray:
+    """Apply fitted steps to new rows (out-of-sample placement)."""
+    X = np.asarray(X, dtype=np.float32)
+    for name, state in fitted:
+        if name == "standardize":
+            X = (X - state[0]) / state[1]
+        elif name == "l2":
+            X = _l2(X)
+        else:
+            X = state.transform(X)
+        X = np.asarray(X, dtype=np.float32)
+    return X
+
+
+def _stats(X: np.ndarray) -> dict:
+    return {"n": int(X.shape[0]), "dim": int(X.shape[1]),
+            "min": float(X.min()), "max": float(X.max()),
+            "mean_norm": float(np.linalg.norm(X, axis=1).mean()),
+            "has_nan": bool(np.isnan(X).any()), "has_inf": bool(np.isinf(X).any())}
+
+
+def prep_dir(subset_id: int, key: str) -> Path:
+    return PREP_DIR / f"s{subset_id}_{key}"
+
+
+def _load(root: Path, n: int, rewrites: int):
+    try:
+        with open(root / "meta.json") as f:
+            meta = json.load(f)
+        if meta["n_in"] != n or meta["rewrites"] != rewrites:
+            return None
+        # copy-on-write: methods may scribble on their input, the cache stays intact
+        return np.load(root / "matrix.npy", mmap_mode="c"), meta["stats"]
+    except (FileNotFoundError, ValueError, KeyError):
+        return None
+
+
+def get_preprocessed(X: np.ndarray, subset_id: int, steps: List[Step], tier: str = "f32",
+                     stats: Optional[dict] = None):
+    """(matrix, stats, prep key) of subset *subset_id* after *steps*.
+
+    No steps: X, stats and the tier are returned untouched. Otherwise the
+    transformed matrix is read from the cache (memory-mapped float32) or
+    fitted on X and written there first.
+    """
+    if not steps:
+        return X, stats, tier
+    from embstore import _locked, _save, _write_meta, state
+    with db.conn() as c:
+        rewrites = state(c)[1]
+    root = prep_dir(subset_id, prep_key(steps, tier))
+    hit = _load(root, len(X), rewrites)
+    if hit is None:
+        with _locked(root):
+            hit = _load(root, len(X), rewrites)      # another process may have built it
+            if hit is None:
+                t0 = time.time()
+                Xp, fitted = fit(X, steps)
+                _save(root / "matrix.npy", Xp)
+                tmp = root / f"pipeline.pkl.tmp{os.getpid()}"
+                with open(tmp, "wb") as f:
+                    pickle.dump(fitted, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp, root / "pipeline.pkl")
+                _write_meta(root, {"subset_id": subset_id, "tier": tier, "steps": steps,
+                                   "pipeline": pipeline_id(steps), "n_in": len(X),
+                                   "dim_in": int(X.shape[1]), "rewrites": rewrites,
+                                   "stats": _stats(Xp), "seconds": round(time.time() - t0, 3)})
+                print(f"[preprocess] {pipeline_id(steps)}: {X.shape[1]} → {Xp.shape[1]} dims "
+                      f"for subset {subset_id} in {time.time() - t0:.2f}s")
+                hit = _load(root, len(X), rewrites)
+    Xp, pstats = hit
+    return Xp, pstats, prep_key(steps, tier)
+
+
+def load_pipeline(subset_id: int, pipeline: Optional[str], tier: str = "f32") -> list:
+    """Fitted steps of a cached pipeline, by the id stored in `preprocess`."""
+    if not pipeline:
+        return []
+    path = prep_dir(subset_id, f"{tier}-{pipeline}") / "pipeline.pkl"
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"{path} missing; re-run the config to rebuild its preprocessing")
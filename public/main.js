@@ -12,6 +12,7 @@
   } from "./ui.js";
   
   import { thumbnails, resized, artists } from "./load.js";
+  import { loadDzi, drawTiles } from "./tiles.js";
   
   /* ------------------------------------------------------------------
      DOM ready
@@ -48,6 +49,7 @@
       current : AppState.LOADING_DATA,
       points  : [],
       bitmaps : { full:null, half:null },
+      dzi     : null,                      // tile pyramid (viz.py --tiles)
       transform : d3.zoomIdentity,
       selectedPoint : null,
   
@@ -69,11 +71,22 @@
   
     /* ---------- helper : view painters ---------- */
     function updateView() {
+      if (state.dzi) {
+        drawTiles(ctx, dimensions(canvas), state.transform, state.dzi, scheduleView);
+        return;
+      }
       const bmp = state.current===AppState.DETAIL ? state.bitmaps.half
                                                   : state.bitmaps.full;
       renderView(ctx, dimensions(canvas), state.transform, bmp);
     }
   
+    let viewQueued = false;
+    function scheduleView() {              // tiles landing → one redraw per frame
+      if (viewQueued) return;
+      viewQueued = true;
+      requestAnimationFrame(() => { viewQueued = false; updateView(); });
+    }
+
     function renderVizPoints() {
       svgOverlay.selectAll('*').remove();
       if (!state.points.length) return;
@@ -126,7 +139,10 @@
       const viz_id = configSel.value;
       if (!viz_id){ alert("Select a config first"); return; }
       try {
-        await initializeApp(viz_id);
+        const res = await fetch(`/api/viz-config?viz_id=${viz_id}`);
+        const vizConfig = res.ok ? await res.json() : null;
+        if (vizConfig?.low_res?.endsWith(".dzi")) await initializeTiles(vizConfig);
+        else await initializeApp(viz_id);
       } catch(e) {
         console.error(e);
         alert("Failed to load visualisation: "+e.message);
@@ -156,6 +172,7 @@
        ================================================================== */
        async function initializeApp(config_id){
         /* -- load projection & config -- */
+        state.dzi = null;
         state.transition(AppState.LOADING_DATA);
       
         const ptRes = await fetch(`/api/projection-points?config_id=${config_id}`);
@@ -178,6 +195,16 @@
         canvas.style.display = "block";
       }
   
+    /* -- tiled visualisation: nothing to build, tiles stream in on view -- */
+    async function initializeTiles(vizConfig){
+      state.transition(AppState.LOADING_DATA);
+      state.dzi    = await loadDzi(vizConfig.low_res);
+      state.points = [];
+      setupInteractions(state.dzi.width, state.dzi.height);
+      state.transition(AppState.VIEWING);
+      canvas.style.display = "block";
+    }
+
     /* ------------------------------------------------------------------
        Bitmap builder
        ------------------------------------------------------------------ */
@@ -203,11 +230,11 @@
     /* ------------------------------------------------------------------
        Zoom / click interactions
        ------------------------------------------------------------------ */
-    function setupInteractions(){
+    function setupInteractions(width=MAX_BITMAP_SIZE, height=MAX_BITMAP_SIZE){
       const onZoom=t=>{ state.transform=t; updateView(); renderVizPoints(); };
       const zoomBehaviour=setupZoom(canvas,onZoom);
   
-      const fit=getFitScale(dimensions(canvas),MAX_BITMAP_SIZE,MAX_BITMAP_SIZE);
+      const fit=getFitScale(dimensions(canvas),width,height);
       state.transform=d3.zoomIdentity.scale(fit);
       d3.select(canvas).call(zoomBehaviour.transform,state.transform);
   
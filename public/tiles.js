@@ -0,0 +1,88 @@
+// Deep-zoom (DZI) tile layer for `viz.py --tiles` output.
+// Only the tiles in view are fetched, from the pyramid level that matches the
+// zoom; until a tile arrives the nearest coarser loaded tile is stretched in
+// its place. viz.py does not write blank tiles, so a 404 just means black.
+const TILE_ROOT = "http://localhost:3001/visualizations";
+const CACHE_TILES = 512;
+
+// Fetch and parse <viz_id>/tiles.dzi (path relative to assets/visualizations)
+async function loadDzi(path) {
+  const res = await fetch(`${TILE_ROOT}/${path}`);
+  if (!res.ok) throw new Error(`failed to load ${path}`);
+  const doc = new DOMParser().parseFromString(await res.text(), "application/xml");
+  const image = doc.documentElement;
+  const size = image.getElementsByTagName("Size")[0];
+  const width = +size.getAttribute("Width");
+  const height = +size.getAttribute("Height");
+  return {
+    base: `${TILE_ROOT}/${path.replace(/\.dzi$/, "_files")}`,
+    format: image.getAttribute("Format"),
+    tileSize: +image.getAttribute("TileSize"),
+    width,
+    height,
+    maxLevel: Math.ceil(Math.log2(Math.max(width, height))),
+    cache: new Map(), // "level/col_row" → Image | null (missing) | "loading"
+  };
+}
+
+// Cached tile, or undefined after starting its download (onLoad fires when it lands)
+function tile(dzi, level, col, row, onLoad) {
+  const key = `${level}/${col}_${row}`;
+  if (dzi.cache.has(key)) {
+    const t = dzi.cache.get(key);
+    dzi.cache.delete(key); // re-insert: Map order doubles as LRU order
+    dzi.cache.set(key, t);
+    return t === "loading" ? undefined : t;
+  }
+  dzi.cache.set(key, "loading");
+  const img = new Image();
+  img.crossOrigin = "anonymous";
+  img.onload = () => { dzi.cache.set(key, img); onLoad(); };
+  img.onerror = () => dzi.cache.set(key, null);
+  img.src = `${dzi.base}/${key}.${dzi.format}`;
+  while (dzi.cache.size > CACHE_TILES) dzi.cache.delete(dzi.cache.keys().next().value);
+  return undefined;
+}
+
+// Draw the visible part of the pyramid for a d3 zoom transform
+function drawTiles(ctx, dims, transform, dzi, onLoad) {
+  const { k, x, y } = transform;
+  const level = Math.max(0, Math.min(dzi.maxLevel, dzi.maxLevel + Math.ceil(Math.log2(k))));
+  const s = 2 ** (level - dzi.maxLevel); // level px per canvas px
+  const span = dzi.tileSize / s; // canvas px covered by one tile
+  const cols = Math.ceil(dzi.width / span), rows = Math.ceil(dzi.height / span);
+  const c0 = Math.max(0, Math.floor(-x / k / span));
+  const c1 = Math.min(cols - 1, Math.floor((dims.width - x) / k / span));
+  const r0 = Math.max(0, Math.floor(-y / k / span));
+  const r1 = Math.min(rows - 1, Math.floor((dims.height - y) / k / span));
+
+  ctx.clearRect(0, 0, dims.width, dims.height);
+  ctx.save();
+  ctx.setTransform(k, 0, 0, k, x, y);
+  ctx.fillStyle = "#000";
+  ctx.fillRect(0, 0, dzi.width, dzi.height);
+  for (let r = r0; r <= r1; r++) {
+    for (let c = c0; c <= c1; c++) {
+      const img = tile(dzi, level, c, r, onLoad);
+      if (img) {
+        ctx.drawImage(img, c * span, r * span, img.width / s, img.height / s);
+        continue;
+      }
+      if (img === null) continue; // blank tile
+      // stand-in: the first coarser level that has the covering tile loaded
+      for (let l = level - 1, f = 2; l >= 0; l--, f *= 2) {
+        const t = dzi.cache.get(`${l}/${Math.floor(c / f)}_${Math.floor(r / f)}`);
+        if (t === null) break;
+        if (!t || t === "loading") continue;
+        const sub = dzi.tileSize / f;
+        const sx = (c % f) * sub, sy = (r % f) * sub;
+        const w = Math.min(sub, t.width - sx), h = Math.min(sub, t.height - sy);
+        if (w > 0 && h > 0) ctx.drawImage(t, sx, sy, w, h, c * span, r * span, w * f / s, h * f / s);
+        break;
+      }
+    }
+  }
+  ctx.restore();
+}
+
+export { loadDzi, drawTiles };
@@ -0,0 +1,221 @@
+# registry.py
+#!/usr/bin/env python3
+"""Every DR method, what it can do and what it costs – without importing it.
+
+    import registry
+    registry.METHODS["umap"].knn          # 15: takes knncache's graph, default k
+    registry.load("umap")                 # imports methods/umap.py only now
+
+Fields of a `Method`:
+  module     import path of the wrapper in methods/
+  params     its *_configs columns (db.py builds the tables from these)
+  transform  fit() returns a model that can place new points (models.py)
+  knn        default n_neighbors if it accepts knncache's shared kNN graph
+  distances  n×n float64 work arrays it allocates on top of distcache's
+             shared matrix; 0 = does not take a distance matrix
+  n_jobs     honours an n_jobs parameter
+  threads    threads one run keeps busy (sweep.py's core budget)
+  memory     how peak memory grows with subset size n: "n", "n log n", "n^2"
+  imports    heavy libraries the wrapper pulls in (numba, torch, ...)
+  prepare    (cfg, meta) → (cfg for the method, cfg for the DB), for the
+             few methods whose configs need rewriting
+  list_params  parameters that take a list themselves, so run.py does not
+             expand them into a grid (see run.expand_grid)
+
+version(name) fingerprints the installed libraries and the wrapper source
+for run.py's run hashes, so an upgrade or an edited wrapper is a new run.
+
+This module imports nothing heavier than the standard library, so db.py,
+`run.py --help` and the schema never pay for a method library. `python
+registry.py` prints the table, marking methods whose libraries are missing.
+"""
+import functools, importlib, importlib.util, json, sys, zlib
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+
+class Method(NamedTuple):
+    module: str
+    params: Tuple[str, ...]
+    transform: bool = False
+    knn: Optional[int] = None
+    distances: int = 0
+    n_jobs: bool = False
+    threads: int = 1
+    memory: str = "n"
+    imports: Tuple[str, ...] = ()
+    prepare: Optional[Callable] = None
+    list_params: Tuple[str, ...] = ()
+
+
+def _slisemap_labels(cfg: dict, meta: dict):
+    """SLISEMAP is supervised: y is the artist of each point, as an integer label."""
+    artists = meta["artists"].tolist()
+    labels = {name: idx for idx, name in enumerate(sorted(set(artists)))}
+    cfg_for_db = cfg.copy()                       # y is per-run data, not a parameter
+    cfg["y"] = [labels[name] for name in artists]
+    return cfg, cfg_for_db
+
+
+def _tsimcne_epochs(cfg: dict, meta: dict):
+    """total_epochs may be a list of stage lengths; store it as '500,50,250'."""
+    cfg_for_db = cfg.copy()
+    if isinstance(cfg_for_db.get("total_epochs"), list):
+        cfg_for_db["total_epochs"] = ",".join(str(x) for x in cfg_for_db["total_epochs"])
+    return cfg, cfg_for_db
+
+
+def _sk(name: str, params, **kw) -> Method:
+    return Method(f"methods.sklearn.{name}", tuple(params), imports=("sklearn",), **kw)
+
+
+METHODS: Dict[str, Method] = {
+    "umap": Method(
+        "methods.umap",
+        ("n_neighbors", "min_dist", "spread", "set_op_mix_ratio", "local_connectivity",
+         "n_components", "metric", "random_state"),
+        transform=True, knn=15, threads=4, memory="n log n",
+        imports=("umap", "numba", "pynndescent")),
+    "tsne": Method(
+        "methods.tsne",
+        ("perplexity", "n_components", "random_state", "learning_rate", "n_iter",
+         "early_exaggeration", "n_iter_without_progress", "min_grad_norm", "metric",
+         "early_exaggeration_iter", "theta", "negative_gradient_method", "initialization",
+         "n_jobs"),
+        transform=True, n_jobs=True, threads=4, memory="n log n", imports=("openTSNE",)),
+    "isomap":   _sk("isomap", ("n_neighbors", "n_components"),
+                    transform=True, knn=5, n_jobs=True, threads=2, memory="n^2"),
+    "lle":      _sk("lle", ("n_neighbors", "n_components", "random_state"),
+                    transform=True, knn=15, n_jobs=True, threads=2, memory="n log n"),
+    "spectral": _sk("spectral", ("n_neighbors", "n_components", "random_state"),
+                    knn=10, n_jobs=True, threads=2, memory="n log n"),
+    "mds":      _sk("mds", ("n_components", "random_state"),
+                    distances=3, n_jobs=True, threads=2, memory="n^2"),
+    "sammon_random": Method(
+        "methods.sammon_random", ("n_dims", "n_iter", "tol", "input_type", "random_state"),
+        distances=2, memory="n^2", imports=("evomap",)),
+    "pca":      _sk("pca", ("n_components", "random_state"), transform=True),
+    "ipca":     _sk("ipca", ("n_components", "batch_size", "random_state"), transform=True),
+    "svd":      _sk("svd", ("n_components", "random_state"), transform=True),
+    "fa":       _sk("fa", ("n_components", "random_state"), transform=True),
+    "ica":      _sk("ica", ("n_components", "max_iter", "random_state"), transform=True),
+    "agg":      _sk("agg", ("n_clusters",), transform=True),
+    "kpca":     _sk("kpca", ("n_components", "kernel", "gamma", "fit_inverse_transform",
+                             "random_state"), transform=True, memory="n^2"),
+    "nystroem_pca": _sk("nystroem_pca", ("n_components", "nystroem_components", "kernel",
+                                         "gamma", "random_state"), transform=True),
+    "grp":      _sk("grp", ("n_components", "eps", "random_state"), transform=True),
+    "srp":      _sk("srp", ("n_components", "density", "eps", "random_state"), transform=True),
+    "nmf":      _sk("nmf", ("n_components", "init", "random_state"), transform=True),
+    "dictlearn": _sk("dictlearn", ("n_components", "random_state"), transform=True),
+    "phate": Method(
+        "methods.phate", ("n_components", "knn", "decay", "t", "gamma", "random_state"),
+        threads=4, memory="n^2", imports=("phate", "graphtools")),
+    "trimap": Method(
+        "methods.trimap",
+        ("n_dims", "n_inliers", "n_outliers", "n_random", "distance", "weight_temp", "lr",
+         "n_iters", "random_state", "opt_method", "apply_pca"),
+        threads=4, memory="n log n", imports=("trimap", "numba", "annoy")),
+    "spacemap": Method(
+        "methods.spacemap",
+        ("n_components", "n_near_field", "n_middle_field", "d_local", "d_global", "eta",
+         "n_epochs", "init", "metric", "verbose", "plot_results", "num_plots"),
+        threads=4, memory="n log n", imports=("spacemap", "numba")),
+    "glle": Method(
+        "methods.glle",
+        ("method", "k_neighbors", "max_iterations", "n_components",
+         "n_generation_of_embedding", "verbosity"),
+        memory="n^2", imports=("GLLE",)),
+    "paramrepulsor": Method(
+        "methods.paramrepulsor",
+        ("n_components", "n_neighbors", "n_epochs", "lr", "spread", "repulsion_strength",
+         "apply_pca", "init", "verbose"),
+        transform=True, threads=4, memory="n log n", imports=("parampacmap", "torch")),
+    "pacmap": Method(
+        "methods.pacmap",
+        ("n_components", "n_neighbors", "MN_ratio", "FP_ratio", "num_iters", "lr",
+         "apply_pca", "init", "random_state", "verbose", "preprocess_pca", "backend"),
+        threads=4, memory="n log n", imports=("pacmap", "numba")),
+    "clmds": Method(
+        "methods.clmds", ("n_clusters", "max_iter", "random_state"),
+        distances=1, memory="n^2", imports=("cluster_mds",)),
+    "tsne_pso": Method(
+        "methods.tsne_pso",
+        ("n_components", "perplexity", "n_particles", "n_iter", "random_state",
+         "inertia_weight", "h", "f", "use_hybrid", "learning_rate", "init", "metric",
+         "early_exaggeration", "min_grad_norm", "parameter_optimization",
+         "dynamic_weight_adaptation", "small_dataset_handling", "numerical_robustness"),
+        n_jobs=True, memory="n^2", imports=("tsne_pso",)),
+    "slisemap": Method(
+        "methods.slisemap", ("radius", "lasso", "use_slipmap", "y"),
+        memory="n^2", imports=("slisemap", "torch"), prepare=_slisemap_labels),
+    "tsimcne": Method(
+        "methods.tsimcne", ("n_components", "total_epochs", "random_state"),
+        transform=True, threads=4, imports=("tsimcne", "torch"), prepare=_tsimcne_epochs,
+        list_params=("total_epochs",)),
+}
+
+PARAM_COLS: Dict[str, List[str]] = {name: list(m.params) for name, m in METHODS.items()}
+
+
+def get(name: str) -> Method:
+    try:
+        return METHODS[name]
+    except KeyError:
+        raise KeyError(f"Unknown method {name!r}; expected one of {sorted(METHODS)}") from None
+
+
+def load(name: str):
+    """Import the wrapper module of *name* (the first call pays for its libraries)."""
+    return importlib.import_module(get(name).module)
+
+
+def available(name: str) -> bool:
+    """Are the method's libraries installed? Checked without importing them."""
+    return all(importlib.util.find_spec(lib) is not None for lib in get(name).imports)
+
+
+def describe(name: str) -> dict:
+    """JSON-safe metadata of one method (the `methods` table, /api/methods)."""
+    m = get(name)
+    return {"params": list(m.params), "transform": m.transform, "knn": m.knn,
+            "distances": m.distances, "n_jobs": m.n_jobs, "threads": m.threads,
+            "memory": m.memory, "imports": list(m.imports), "list_params": list(m.list_params)}
+
+
+@functools.lru_cache(maxsize=None)
+def _distributions() -> dict:
+    from importlib import metadata
+    return metadata.packages_distributions()
+
+
+def version(name: str) -> str:
+    """'umap-learn==0.5.12 numba==0.61.0 ... methods.umap@1a2b3c4d', without importing.
+
+    Changes when a library is upgraded or the wrapper is edited.
+    """
+    from importlib import metadata
+    m = get(name)
+    parts = []
+    for lib in m.imports:
+        for dist in sorted(set(_distributions().get(lib, [lib]))):
+            try:
+                parts.append(f"{dist}=={metadata.version(dist)}")
+            except metadata.PackageNotFoundError:
+                parts.append(f"{dist}==?")
+    spec = importlib.util.find_spec(m.module)
+    if spec is not None and spec.origin:
+        with open(spec.origin, "rb") as f:
+            parts.append(f"{m.module}@{zlib.crc32(f.read()):08x}")
+    return " ".join(parts)
+
+
+if __name__ == "__main__":
+    if "--json" in sys.argv[1:]:
+        print(json.dumps({name: describe(name) for name in METHODS}, indent=2))
+    else:
+        print(f"{'method':<15}{'memory':<9}{'thr':>4}  {'knn':>4}  {'dist':>4}  transform  n_jobs  libraries")
+        for name, m in METHODS.items():
+            missing = "" if available(name) else "  (missing)"
+            print(f"{name:<15}{m.memory:<9}{m.threads:>4}  {m.knn or '-':>4}  {m.distances or '-':>4}  "
+                  f"{'yes' if m.transform else '-':<9}  {'yes' if m.n_jobs else '-':<6}  "
+                  f"{', '.join(m.imports)}{missing}")
@@ -1,66 +1,336 @@
 # run.py
 #!/usr/bin/env python3
-"""CLI runner for any DR method defined in configs.yaml."""
-import argparse, importlib, time, yaml, sys
-import db
+"""CLI runner for any DR method defined in configs.yaml.
+
+Every run is content-addressed (run_hash): a config whose hash already has
+stored points is not fitted again unless --force. Entries with list-valued
+parameters are grids; each cell is its own config (see expand_grid).
+"""
+import argparse, hashlib, itertools, json, time, yaml, sys
+import db, distcache, jit, knncache, models, preprocess, registry
+
+# Keys of a configs.yaml entry that are not method parameters (see split_config)
+RUN_KEYS = ("name", "subset_strategy", "subset_size", "subset_seed", "embedding_tier",
+            "preprocess")
+
+def _label(value) -> str:
+    return "-".join(map(str, value)) if isinstance(value, list) else str(value)
+
+def expand_grid(method: str, cfg: dict) -> list:
+    """A configs.yaml entry → one entry per combination of its list values.
+
+    Cells are named "name[key=value,...]". preprocess and a method's own
+    list-valued parameters (registry list_params) are grid axes only when
+    given as a list of lists.
+    """
+    m = registry.METHODS.get(method)
+    own = set(m.list_params) if m else set()
+    axes = {k: v for k, v in cfg.items()
+            if isinstance(v, list) and v and k != "name"
+            and (k not in own and k != "preprocess" or all(isinstance(x, list) for x in v))}
+    if not axes:
+        return [cfg]
+    cells = []
+    for combo in itertools.product(*axes.values()):
+        cell = dict(cfg, **dict(zip(axes, combo)))
+        cell["name"] = f"{cfg['name']}[{','.join(f'{k}={_label(v)}' for k, v in zip(axes, combo))}]"
+        cells.append(cell)
+    return cells
+
+def check_config(method: str, cfg: dict) -> None:
+    """Reject keys that are neither RUN_KEYS nor parameters of *method*: the
+    wrapper would drop them, yet they would make a new run hash."""
+    m = registry.METHODS.get(method)
+    unknown = [k for k in cfg if m is not None and k not in m.params and k not in RUN_KEYS]
+    if unknown:
+        raise ValueError(f"configs.yaml {method} “{cfg.get('name')}”: unknown key(s) "
+                         f"{', '.join(unknown)}; {method} takes {', '.join(m.params)}")
 
 def load_configs() -> dict:
+    """configs.yaml, with grid entries expanded into their cells."""
     with open("configs.yaml", "r") as f:
-        return yaml.safe_load(f)
+        raw = yaml.safe_load(f)
+    for method, entries in raw.items():
+        for c in entries or []:
+            check_config(method, c)
+    return {method: [cell for c in entries or [] for cell in expand_grid(method, c)]
+            for method, entries in raw.items()}
 
-def main(argv=None):
-    cfgs = load_configs()
-    p = argparse.ArgumentParser()
-    p.add_argument("--method", required=True, choices=cfgs.keys())
-    p.add_argument("--config", required=True)
-    args = p.parse_args(argv)
+def find_configs(cfgs: dict, method: str, config: str) -> list:
+    """The entry named *config*, or every cell of the grid of that name."""
+    entries = cfgs.get(method, [])
+    return ([c for c in entries if c["name"] == config] or
+            [c for c in entries if c["name"].startswith(config + "[")])
 
-    cfg = next((c.copy() for c in cfgs[args.method]
-                if c["name"] == args.config), None)
-    if cfg is None:
-        sys.exit(f"No config “{args.config}” for {args.method}")
+def load_method(method: str):
+    jit.prepare(method)           # numba-based methods compile into the shared cache
+    return registry.load(method)
 
-    subset = cfg.pop("subset_strategy", "artist_first5")
-    size   = cfg.pop("subset_size", 250)
+def split_config(cfg: dict) -> dict:
+    """Pop the run-level keys off a configs.yaml entry (copied in place).
 
-    embeddings, meta = db.fetch_subset(subset, size)
-    sklearn_methods = {
-        'agg', 'dictlearn', 'fa', 'grp', 'ica', 'ipca', 'isomap', 'kpca', 'lle', 'mds',
-        'nmf', 'nystroem_pca', 'pca', 'spectral', 'srp', 'svd'
+    What is left in cfg are the method's own parameters.
+    """
+    steps = preprocess.parse(cfg.pop("preprocess", None))
+    return {
+        "subset": cfg.pop("subset_strategy", "artist_first5"),
+        "size":   cfg.pop("subset_size", 250),
+        "seed":   cfg.pop("subset_seed", 0),
+        "tier":   cfg.pop("embedding_tier", "f32"),   # f32 | f16 | i8 (see embstore.py)
+        "steps":  steps,
+        "pipeline": preprocess.pipeline_id(steps),
     }
-    if args.method in sklearn_methods:
-        mod = importlib.import_module(f"methods.sklearn.{args.method}")
-    else:
-        mod = importlib.import_module(f"methods.{args.method}")
-
-    if args.method == "slisemap":
-        # Encode 'artist' field from meta as integer labels for y
-        artists = [m["artist"] for m in meta]
-        unique_artists = {name: idx for idx, name in enumerate(sorted(set(artists)))}
-        # Store y separately from config to avoid database issues
-        y = [unique_artists[name] for name in artists]
-        cfg["y"] = y  # Used by SLISEMAP
-        cfg_for_db = cfg.copy()
-        del cfg_for_db["y"]  # Remove y before storing in database
-    elif args.method == "tsimcne":
-        cfg_for_db = cfg.copy()
-        # Convert total_epochs to comma-separated string for DB if it's a list
-        if isinstance(cfg_for_db.get("total_epochs"), list):
-            cfg_for_db["total_epochs"] = ",".join(str(x) for x in cfg_for_db["total_epochs"])
-    else:
-        cfg_for_db = cfg
 
-    start  = time.time()
-    coords = mod.run(embeddings, cfg)
-    runtime = time.time() - start
+def run_hash(method: str, cfg: dict, spec: dict, subset_id: int) -> str:
+    """Content address of a run of split config *cfg* on *subset_id*.
+
+    Covers the subset's members, the embedding tier and preprocessing, every
+    method parameter in registry params (seeds included) and
+    registry.version(method); the config's name is not part of it.
+    """
+    params = registry.get(method).params
+    key = {"method": method, "version": registry.version(method),
+           "subset": db.subset_digest(subset_id), "tier": spec["tier"],
+           "preprocess": spec["pipeline"],
+           "params": {k: v for k, v in cfg.items() if k in params}}
+    return hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()
+
+def memoized(method: str, key: str, save_model: bool = False):
+    """config_id of a completed run with hash *key* (and a model, if one is wanted)."""
+    cfg_id = db.find_run(method, key)
+    if cfg_id is not None and save_model and not models.model_path(method, cfg_id).exists():
+        return None
+    return cfg_id
+
+def load_inputs(spec: dict):
+    """Subset of a split config → (embeddings, meta, stats, subset_id, prep)."""
+    # Every config with the same (strategy, size, seed) reuses one subset
+    subset_id = db.get_subset(spec["subset"], spec["size"], spec["seed"])
+    embeddings, meta, stats = db.load_subset(subset_id, with_stats=True, tier=spec["tier"])
+    # prep identifies the matrix methods see; the kNN/distance caches key off it
+    embeddings, stats, prep = preprocess.get_preprocessed(
+        embeddings, subset_id, spec["steps"], spec["tier"], stats)
+    return embeddings, meta, stats, subset_id, prep
+
+def method_config(method: str, cfg: dict, meta: dict):
+    """(cfg passed to the method, cfg stored in the DB); see registry.Method.prepare."""
+    prepare = registry.get(method).prepare
+    return prepare(cfg, meta) if prepare else (cfg, cfg)
+
+def attach_caches(method: str, cfg: dict, run_cfg: dict, embeddings, spec: dict,
+                  subset_id: int, prep: str, cfgs: dict, save_model: bool = False) -> None:
+    """Add the shared kNN graph / distance matrix a method can use to run_cfg.
 
+    Raises distcache.DistanceBudgetError when the O(n²) matrix would not fit.
+    """
+    # Neighbour-graph methods share one cached kNN graph per (subset, prep,
+    # metric), built at the largest k in configs.yaml. A saved model has to
+    # own its search index for transform(), so --save-model searches afresh.
+    if knncache.wants_graph(method, cfg) and not save_model:
+        metric = knncache.config_metric(cfg)
+        k = max(knncache.config_k(method, cfg),
+                knncache.largest_k(cfgs, spec["subset"], spec["size"], spec["seed"], metric))
+        run_cfg["knn_graph"] = knncache.get_graph(embeddings, subset_id, k, metric, prep=prep)
+
+    # O(n²) methods share one memory-mapped float32 distance matrix per subset
+    if distcache.wants_distances(method, cfg):
+        run_cfg["dist_matrix"] = distcache.get_distances(embeddings, subset_id, method, prep=prep)
+
+def fit(mod, embeddings, run_cfg: dict, save_model: bool = False):
+    """Run the method → (coords, fitted model or None, runtime, numba compile time).
+
+    Compile time is None for methods that do not use numba; it is part of runtime.
+    """
+    start = time.time()
+    model = None
+    with jit.compile_timer() as compiled:
+        if save_model and hasattr(mod, "fit"):
+            coords, model = mod.fit(embeddings, run_cfg)
+        else:
+            coords = mod.run(embeddings, run_cfg)
+    return coords, model, time.time() - start, compiled["seconds"]
+
+def record(method: str, cfg_for_db: dict, spec: dict, subset_id: int, meta: dict,
+           coords, runtime: float, model=None, dim: int = None, save_model: bool = False,
+           compile_time: float = None, run_hash: str = None) -> int:
+    """Write a finished run (config row, points, model artifact) → config_id."""
     # Use the database-safe config for storage
-    cfg_id = db.upsert_config(args.method, cfg_for_db, subset, size, runtime)
-    db.save_points(args.method, cfg_id, meta, coords)
-    print(
-        f"✅ {args.method}:{args.config}  "
-        f"cfg_id={cfg_id}  pts={len(coords)}  time={runtime:.2f}s"
-    )
+    cfg_id = db.upsert_config(method, cfg_for_db, spec["subset"], spec["size"], runtime,
+                              subset_id, spec["pipeline"], compile_time, run_hash,
+                              spec["tier"])
+    db.save_points(method, cfg_id, meta, coords)
+    if model is not None:
+        path = models.save_model(method, cfg_id, model, tier=spec["tier"], dim=dim,
+                                 subset_id=subset_id, pipeline=spec["pipeline"])
+        print(f"model saved to {path}")
+    else:
+        # a re-run replaces the points, so an older artifact no longer matches
+        models.discard_model(method, cfg_id)
+        if save_model:
+            print(f"{method} has no native transform; models.py will place new points by kNN")
+    return cfg_id
+
+def subset_coords(pts: dict, meta: dict):
+    """A recorded run's coords in its subset's row order, or None if the run lacks
+    some of the subset's points. Points added later (models.place) are left out."""
+    import numpy as np
+    ids = meta["rowids"]
+    point_ids = pts["point_ids"]
+    if np.array_equal(point_ids, ids):
+        return pts["coords"]
+    order = np.argsort(point_ids, kind="stable")
+    idx = order[np.minimum(np.searchsorted(point_ids, ids, sorter=order), len(order) - 1)]
+    if len(order) == 0 or not np.array_equal(point_ids[idx], ids):
+        return None
+    return pts["coords"][idx]
+
+def score(method: str, cfg: dict, embeddings, meta: dict, coords, subset_id: int, prep: str,
+          graph=None) -> list:
+    """metrics.evaluate() of a fitted layout → run_metrics rows.
+
+    Input-space neighbours come from the run's kNN graph if it is deep
+    enough, else from knncache at metrics.KS's largest k.
+    """
+    import metrics
+    metric = knncache.config_metric(cfg)
+    k = min(max(metrics.KS), len(coords) - 1)
+    if graph is None or graph.metric != metric or graph.k < k:
+        graph = knncache.get_graph(embeddings, subset_id, k, metric, prep=prep)
+    high = graph.neighbors(min(k, graph.k) + 1)[0][:, 1:]      # column 0 is the point itself
+    return metrics.evaluate(embeddings, coords, meta["artists"], high,
+                            metric=metric)
+
+def summarize_metrics(rows) -> dict:
+    """Whole-run scores of run_metrics rows → {"trustworthiness@10": 0.93, ...}."""
+    return {f"{m}@{k}" if k else m: v for m, k, label, v, _ in rows if not label}
+
+class UnknownConfig(LookupError):
+    pass
+
+def run_config(method: str, config: str, cfgs: dict, save_model: bool = False,
+               load=load_inputs, force: bool = False, metrics: bool = False) -> dict:
+    """Fit and record one named config → summary of the run.
+
+    A grid name runs each of its cells → {"method", "config", "cells": [summary, ...]}.
+    *load* maps a split config to load_inputs()'s tuple (worker.py caches it).
+    """
+    matches = find_configs(cfgs, method, config)
+    if not matches:
+        raise UnknownConfig(f"No config “{config}” for {method}")
+    runs = [execute(method, c.copy(), cfgs, save_model, load, force, metrics)[0]
+            for c in matches]
+    if len(matches) == 1 and matches[0]["name"] == config:
+        return runs[0]
+    return {"method": method, "config": config, "cells": runs}
+
+def execute(method: str, cfg: dict, cfgs: dict, save_model: bool = False, load=load_inputs,
+            force: bool = False, metrics: bool = False):
+    """Fit and record a configs.yaml-style entry (consumed) → (summary, coords).
+
+    A run whose hash is already recorded is read back instead (cached=True).
+    metrics=True also scores the layout (metrics.py) into run_metrics.
+    """
+    config = cfg.get("name")
+    spec = split_config(cfg)
+    subset_id = db.get_subset(spec["subset"], spec["size"], spec["seed"])
+    key = run_hash(method, cfg, spec, subset_id)
+    cfg_id = None if force else memoized(method, key, save_model)
+    if cfg_id is not None:
+        row = db.get_dr_config(method, cfg_id)
+        pts = db.get_projection_points(method, cfg_id, as_arrays=True)
+        coords = pts["coords"]
+        summary = {"method": method, "config": config, "config_id": cfg_id,
+                   "subset_id": subset_id, "points": len(coords), "runtime": row["runtime"],
+                   "compile_time": row["compile_time"],
+                   "model_saved": models.model_path(method, cfg_id).exists(),
+                   "cached": True, "run_hash": key}
+        if metrics:
+            rows = [(r["metric"], r["k"], r["label"], r["value"], r["n"])
+                    for r in db.get_metrics(method, cfg_id)]
+            if not rows:                  # recorded without scores: score it now
+                embeddings, meta, _, _, prep = load(spec)
+                sub = subset_coords(pts, meta)   # placed points are not in the subset
+                if sub is None:
+                    print(f"⚠️  {method} cfg_id={cfg_id} lacks points of subset {subset_id}; "
+                          f"not scoring it (--force refits)")
+                else:
+                    rows = score(method, cfg, embeddings, meta, sub, subset_id, prep)
+                    db.save_metrics(method, cfg_id, rows)
+            if rows:
+                summary["metrics"] = summarize_metrics(rows)
+        return summary, coords
+
+    embeddings, meta, stats, subset_id, prep = load(spec)
+    mod = load_method(method)
+    cfg, cfg_for_db = method_config(method, cfg, meta)
+
+    # Corpus stats recorded by the embedding store; wrappers print these
+    # instead of rescanning the matrix.
+    run_cfg = dict(cfg, input_stats=stats)
+    attach_caches(method, cfg, run_cfg, embeddings, spec, subset_id, prep, cfgs, save_model)
+
+    coords, model, runtime, compile_time = fit(mod, embeddings, run_cfg, save_model)
+    cfg_id = record(method, cfg_for_db, spec, subset_id, meta, coords, runtime,
+                    model, embeddings.shape[1], save_model, compile_time, key)
+    summary = {"method": method, "config": config, "config_id": cfg_id, "subset_id": subset_id,
+               "points": len(coords), "runtime": runtime, "compile_time": compile_time,
+               "model_saved": model is not None, "cached": False, "run_hash": key}
+    if metrics:
+        rows = score(method, cfg, embeddings, meta, coords, subset_id, prep,
+                     run_cfg.get("knn_graph"))
+        db.save_metrics(method, cfg_id, rows)
+        summary["metrics"] = summarize_metrics(rows)
+    return summary, coords
+
+def describe_metrics(scores: dict) -> str:
+    """'T@10=0.912 C@10=0.934 knn@10=0.412 shepard=0.58 silhouette=-0.05'."""
+    short = {"trustworthiness@10": "T@10", "continuity@10": "C@10",
+             "knn_preservation@10": "knn@10", "shepard": "shepard", "silhouette": "silhouette"}
+    return " ".join(f"{name}={scores[key]:.3f}" for key, name in short.items()
+                    if scores.get(key) is not None)
+
+def describe_run(res: dict) -> str:
+    """One-line report of a run summary."""
+    label = f"{res['method']}:{res['config']}"
+    scores = f"  {describe_metrics(res['metrics'])}" if res.get("metrics") else ""
+    if res["cached"]:
+        return (f"⏭  {label}  cfg_id={res['config_id']}  already recorded (--force to refit)"
+                + scores)
+    return (f"✅ {label}  cfg_id={res['config_id']}  subset={res['subset_id']}  "
+            f"pts={res['points']}  time={res['runtime']:.2f}s" +
+            (f" (compile {res['compile_time']:.2f}s)" if res["compile_time"] else "") + scores)
+
+def main(argv=None):
+    cfgs = load_configs()
+    p = argparse.ArgumentParser()
+    p.add_argument("--method", choices=cfgs.keys())
+    p.add_argument("--config")
+    p.add_argument("--save-model", action="store_true",
+                   help="keep the fitted model so new points can be placed with models.py")
+    p.add_argument("--force", action="store_true",
+                   help="refit even if a run with the same hash is already recorded")
+    p.add_argument("--metrics", action="store_true",
+                   help="score the layout after the fit (metrics.py → run_metrics)")
+    p.add_argument("--serve", action="store_true",
+                   help="stay up and take JSON-line run requests (see worker.py)")
+    p.add_argument("--socket", help="with --serve: listen on this Unix socket instead of stdin")
+    p.add_argument("--preload", nargs="*", default=[], metavar="METHOD",
+                   help="with --serve: import these methods before the first request")
+    args = p.parse_args(argv)
+
+    if args.serve:
+        import worker
+        return worker.serve(args.socket, args.preload)
+    if not args.method or not args.config:
+        p.error("--method and --config are required (or --serve)")
+
+    try:
+        res = run_config(args.method, args.config, cfgs, args.save_model, force=args.force,
+                         metrics=args.metrics)
+    except (UnknownConfig, distcache.DistanceBudgetError) as e:
+        sys.exit(f"❌ {e}")
+    for cell in res.get("cells", [res]):
+        print(describe_run(cell))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
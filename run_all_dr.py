@@ -1,10 +1,5 @@
-import yaml
-import subprocess
+# Re-run every spacemap / trimap / phate config; see sweep.py for the options.
+import sys
+import sweep
 
-with open("configs.yaml") as f:
-    cfgs = yaml.safe_load(f)
-
-for method in ["spacemap", "trimap", "phate"]:
-    for c in cfgs[method]:
-        print(f"Running {method}:{c['name']}")
-        subprocess.run(["python", "run.py", "--method", method, "--config", c["name"]]) 
\ No newline at end of file
+sys.exit(sweep.main(["--methods", "spacemap", "trimap", "phate", *sys.argv[1:]]))
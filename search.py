@@ -0,0 +1,201 @@
+# search.py
+#!/usr/bin/env python3
+"""Successive-halving hyperparameter search over a grid of one method's params.
+
+    python search.py --method umap --config fast \
+        --grid n_neighbors=5,10,15,30,50 min_dist=0.0,0.1,0.25,0.5
+    python search.py --method tsne --config basic --grid perplexity=5,15,30,50 --eta 2
+
+Each grid cell is the base config (--config) with the grid values
+substituted. Rung 0 fits every candidate on a small random subset; each
+following rung keeps the best 1/eta and fits them on an eta-times larger
+one, and the last rung runs the survivors on the base config's own subset.
+Fits go through run.py (preprocessing, kNN/distance caches, numba cache)
+and are recorded in the method's *_configs table like any other run – the
+cheap rungs included, under their own subset_size – so repeating a search
+only fits the candidates that are not recorded yet. Candidates are scored by
+kNN preservation (metrics.py) at --k against the input-space neighbours of
+knncache.py's shared graph.
+
+Prints a leaderboard per rung, the points fitted against the full grid's,
+and the winner as a configs.yaml entry; the search is logged as JSON under
+``<DR_CACHE>/search/``.
+"""
+import argparse, itertools, json, math, sys, time
+from pathlib import Path
+
+import yaml
+import db, knncache, metrics, registry
+import run as runner
+
+SEARCH_DIR = Path(db.CACHE_DIR) / "search"
+# Parameters a subset has to be comfortably larger than for a fit to make sense
+NEIGHBOURHOOD_PARAMS = ("n_neighbors", "knn", "k_neighbors", "perplexity", "n_near_field")
+# Run-level keys a grid may vary besides the method's own parameters
+GRID_RUN_KEYS = ("preprocess", "embedding_tier")
+
+
+def parse_grid(items) -> dict:
+    """['n_neighbors=5,15', 'metric=cosine,euclidean'] → {name: [values]}."""
+    grid = {}
+    for item in items:
+        key, sep, values = item.partition("=")
+        if not sep or not values:
+            raise ValueError(f"--grid expects name=v1,v2,..., got {item!r}")
+        grid[key] = [yaml.safe_load(v) for v in values.split(",")]
+    return grid
+
+
+def check_grid(method: str, grid: dict) -> None:
+    """Reject grid names that are not parameters of *method* (registry.py): the
+    method would drop them, and every candidate would fit the same thing."""
+    params = registry.get(method).params
+    unknown = [k for k in grid if k not in params and k not in GRID_RUN_KEYS]
+    if unknown:
+        raise ValueError(f"{method} has no parameter {', '.join(map(repr, unknown))}; "
+                         f"its parameters are {', '.join(params)} "
+                         f"(and {', '.join(GRID_RUN_KEYS)})")
+
+
+def candidates(base: dict, grid: dict) -> list:
+    keys = list(grid)
+    return [dict(base, **dict(zip(keys, combo)))
+            for combo in itertools.product(*(grid[k] for k in keys))]
+
+
+def schedule(n_full: int, n_candidates: int, eta: int, min_size: int) -> list:
+    """Subset size of each rung, smallest first; the last is the full subset."""
+    rungs = 1 + int(math.log(max(n_candidates, 1), eta) + 1e-9)
+    while rungs > 1 and n_full // eta ** (rungs - 1) < min_size:
+        rungs -= 1
+    return [n_full // eta ** (rungs - 1 - r) for r in range(rungs)]
+
+
+def size_floor(pool: list, min_size: int) -> int:
+    """Smallest rung every candidate can run on: 3× its largest neighbourhood."""
+    sizes = [3 * v for c in pool for key, v in c.items()
+             if key in NEIGHBOURHOOD_PARAMS and isinstance(v, (int, float))]
+    return max([min_size] + sizes)
+
+
+class _Loader:
+    """runner.load_inputs, memoised per subset."""
+
+    def __init__(self):
+        self.memo = {}
+
+    def __call__(self, spec: dict):
+        key = (spec["subset"], spec["size"], spec["seed"], spec["tier"], spec["pipeline"])
+        if key not in self.memo:
+            self.memo[key] = runner.load_inputs(spec)
+        return self.memo[key]
+
+
+def evaluate(method: str, cfg: dict, cfgs: dict, k: int, metric: str, load: _Loader) -> dict:
+    summary, coords = runner.execute(method, dict(cfg), cfgs, load=load)
+    # a memoized run skips loading, so load the subset for the graph here
+    X, meta, _, subset_id, prep = load(runner.split_config(dict(cfg)))
+    if len(coords) != len(X):         # a cached run with placed points (models.place)
+        coords = runner.subset_coords(
+            db.get_projection_points(method, summary["config_id"], as_arrays=True), meta)
+        if coords is None:
+            raise ValueError(f"cfg_id={summary['config_id']} lacks points of subset {subset_id}")
+    graph = knncache.get_graph(X, subset_id, k, metric, prep=prep)
+    high = graph.neighbors(k + 1)[0][:, 1:]          # column 0 is the point itself
+    summary["score"] = metrics.knn_preservation(high, coords, k)
+    return summary
+
+
+def search(method: str, base: dict, grid: dict, cfgs: dict, eta: int = 3, k: int = 10,
+           min_size: int = 100, metric: str = "euclidean") -> dict:
+    check_grid(method, grid)
+    spec = runner.split_config(dict(base))
+    full_id = db.get_subset(spec["subset"], spec["size"], spec["seed"])
+    with db.conn() as c:
+        n_full = c.execute("SELECT n FROM subsets WHERE subset_id=?", (full_id,)).fetchone()[0]
+    pool = candidates(base, grid)
+    floor = size_floor(pool, min_size)
+    sizes = schedule(n_full, len(pool), eta, floor)
+    if len(sizes) == 1 and len(pool) > 1:
+        print(f"⚠️  one rung only ({n_full}-point subset, {floor}-point floor, eta={eta}): "
+              f"every candidate is fitted on the full subset, an exhaustive grid, not halving")
+    load, rungs, fitted = _Loader(), [], 0
+    t0 = time.time()
+
+    for r, size in enumerate(sizes):
+        last = r == len(sizes) - 1
+        results = []
+        for cand in pool:
+            cfg = dict(cand)
+            if not last:     # cheap rungs: random subsets growing by eta towards the full one
+                cfg.update(subset_strategy="random", subset_size=size)
+            params = {key: cand[key] for key in grid}
+            try:
+                res = evaluate(method, cfg, cfgs, k, metric, load)
+                fitted += 0 if res["cached"] else res["points"]
+            except Exception as e:
+                res = {"score": float("-inf"), "error": f"{type(e).__name__}: {e}"}
+            results.append(dict(res, params=params, candidate=cand))
+        results.sort(key=lambda x: x["score"], reverse=True)
+        rungs.append({"size": size, "results": results})
+
+        print(f"\nrung {r}: {len(pool)} candidates on {size} points")
+        for i, x in enumerate(results):
+            if "error" in x:
+                print(f"  {i + 1:>3}. failed  {x['params']}  {x['error']}")
+            else:
+                print(f"  {i + 1:>3}. knn@{k}={x['score']:.4f}  {x['runtime']:6.2f}s  "
+                      f"cfg_id={x['config_id']}  {x['params']}" + ("  (cached)" if x["cached"] else ""))
+        ok = [x for x in results if "error" not in x]
+        if not ok:
+            raise RuntimeError("every candidate failed")
+        pool = [x["candidate"] for x in ok[:max(1, len(ok) // eta)]] if not last else pool
+
+    best = rungs[-1]["results"][0]
+    return {"method": method, "base": base.get("name"), "grid": grid, "eta": eta, "k": k,
+            "metric": metric, "seconds": time.time() - t0, "points_fitted": fitted,
+            "points_full_grid": len(candidates(base, grid)) * n_full,
+            "rungs": [{"size": g["size"],
+                       "results": [{key: v for key, v in x.items() if key != "candidate"}
+                                   for x in g["results"]]} for g in rungs],
+            "best": best}
+
+
+def main(argv=None):
+    cfgs = runner.load_configs()
+    ap = argparse.ArgumentParser(description="Successive-halving search over parameter ranges.")
+    ap.add_argument("--method", required=True, choices=cfgs.keys())
+    ap.add_argument("--config", required=True, help="base config the grid is applied to")
+    ap.add_argument("--grid", nargs="+", required=True, metavar="PARAM=V1,V2,...")
+    ap.add_argument("--eta", type=int, default=3, help="keep 1/eta per rung, grow subsets eta×")
+    ap.add_argument("--k", type=int, default=10, help="neighbours for the kNN-preservation score")
+    ap.add_argument("--min-size", type=int, default=100,
+                    help="smallest subset a rung may use (at least 3× the largest n_neighbors)")
+    ap.add_argument("--metric", default="euclidean", help="input-space metric for scoring")
+    args = ap.parse_args(argv)
+    if args.eta < 2:
+        ap.error("--eta must be at least 2")
+
+    base = next((c for c in cfgs[args.method] if c["name"] == args.config), None)
+    if base is None:
+        sys.exit(f"No config “{args.config}” for {args.method}")
+    try:
+        res = search(args.method, base, parse_grid(args.grid), cfgs, args.eta, args.k,
+                     args.min_size, args.metric)
+    except (ValueError, RuntimeError) as e:
+        sys.exit(f"❌ {e}")
+
+    SEARCH_DIR.mkdir(parents=True, exist_ok=True)
+    log = SEARCH_DIR / f"{args.method}-{args.config}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    with open(log, "w") as f:
+        json.dump(res, f, indent=2, default=str)
+    best = res["best"]
+    print(f"\n✅ best knn@{args.k}={best['score']:.4f}  cfg_id={best['config_id']}  "
+          f"{best['params']}  in {res['seconds']:.1f}s; fitted {res['points_fitted']} points "
+          f"vs {res['points_full_grid']} for the full grid ({log})")
+    entry = dict(best["candidate"], name=f"{args.config}_search")
+    print(yaml.safe_dump({args.method: [entry]}, sort_keys=False))
+
+
+if __name__ == "__main__":
+    main()
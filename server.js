@@ -1,51 +1,139 @@
-import { getConfigs, getConfig, getProjectionPoints, getVizConfig, getVizPoints, getAllVizConfigs, artists, PARAM_COLS } from "./db.js";
+import { getConfigs, getConfig, getProjectionPoints, getVizConfig, getVizPoints, getAllVizConfigs, artists, PARAM_COLS, METHODS } from "./db.js";
 import { serveStatic, spawn } from "bun";
 
 const PY = "./.venv/bin/python"; // or just "python3" if your venv is activated
 
+// ─── Warm `run.py --serve` workers (see worker.py) ───
+// Each worker answers one JSON-line request at a time; requests go to the
+// worker with the shortest queue. Workers are pinged every PING_MS and
+// respawned if they exit, stop answering (pings are answered mid-run), or
+// have been on one run for longer than DR_RUN_TIMEOUT_S.
+const N_WORKERS = Number(process.env.DR_WORKERS || 1);
+const PING_MS = 30000;
+const RUN_TIMEOUT_S = Number(process.env.DR_RUN_TIMEOUT_S || 6 * 3600);
+
+class PyWorker {
+  constructor() {
+    this.nextId = 1;
+    this.pending = new Map(); // id → { resolve, reject }
+    this.proc = spawn([PY, "run.py", "--serve"], { stdin: "pipe", stdout: "pipe", stderr: "inherit" });
+    this.ready = new Promise((resolve, reject) => {
+      this.onReady = resolve;
+      this.onDead = reject;
+    });
+    this.ready.catch(() => {}); // a worker that dies before starting is surfaced by request()
+    this.alive = true;
+    this.read();
+    this.proc.exited.then((code) => this.fail(`python worker exited (${code})`));
+  }
+
+  async read() {
+    const decoder = new TextDecoder();
+    let buf = "";
+    for await (const chunk of this.proc.stdout) {
+      buf += decoder.decode(chunk, { stream: true });
+      let nl;
+      while ((nl = buf.indexOf("\n")) >= 0) {
+        const line = buf.slice(0, nl);
+        buf = buf.slice(nl + 1);
+        if (!line.trim()) continue;
+        const reply = JSON.parse(line);
+        if (reply.id === null) { this.onReady(reply); continue; }
+        const p = this.pending.get(reply.id);
+        this.pending.delete(reply.id);
+        if (p) p.resolve(reply);
+      }
+    }
+  }
+
+  request(msg, timeoutMs) {
+    const id = this.nextId++;
+    return new Promise((resolve, reject) => {
+      this.pending.set(id, { resolve, reject });
+      this.proc.stdin.write(JSON.stringify({ ...msg, id }) + "\n");
+      this.proc.stdin.flush();
+      if (timeoutMs) {
+        setTimeout(() => {
+          if (this.pending.delete(id)) reject(new Error("python worker timed out"));
+        }, timeoutMs);
+      }
+    });
+  }
+
+  fail(reason) {
+    this.alive = false;
+    this.onDead(new Error(reason));
+    for (const p of this.pending.values()) p.reject(new Error(reason));
+    this.pending.clear();
+  }
+
+  kill() {
+    this.fail("python worker restarted");
+    this.proc.kill();
+  }
+}
+
+const workers = {
+  pool: Array.from({ length: N_WORKERS }, () => new PyWorker()),
+
+  pick() {
+    this.pool = this.pool.map((w) => (w.alive ? w : new PyWorker()));
+    return this.pool.reduce((a, b) => (b.pending.size < a.pending.size ? b : a));
+  },
+
+  async request(msg) {
+    const w = this.pick();
+    await w.ready;
+    return w.request(msg);
+  },
+
+  async ping() {
+    return Promise.all(this.pool.map(async (w) => {
+      try {
+        if (!w.alive) throw new Error("not running");
+        await w.ready;
+        // one ping in flight per worker; overlapping callers share it
+        w.pinging ??= w.request({ cmd: "ping" }, 10000).finally(() => { w.pinging = null; });
+        const { result } = await w.pinging;
+        if (result.busy_s > RUN_TIMEOUT_S) {
+          throw new Error(`run ${result.busy} still going after ${Math.round(result.busy_s)}s`);
+        }
+        return { ok: true, ...result };
+      } catch (e) {
+        w.kill();
+        return { ok: false, error: e.message };
+      }
+    }));
+  }
+};
+
+setInterval(() => workers.ping(), PING_MS);
+
 Bun.serve({
   port: 3000,
   async fetch(req) {
     const url = new URL(req.url);
     const path = url.pathname;
 
-    // ─── 1) Run a Python script ───
+    // ─── 1) Run a config on a warm Python worker ───
     if (path === "/api/run" && req.method === "POST") {
+      const headers = {
+        "Content-Type": "application/json",
+        "X-Content-Type-Options": "nosniff",
+        "X-Frame-Options": "SAMEORIGIN"
+      };
       try {
         const { method, config } = await req.json();
-        const proc = spawn([
-          PY,
-          "run.py",
-          "--method", method,
-          "--config", config
-        ]);
-        let stdout = "";
-        let stderr = "";
-        const decoder = new TextDecoder();
-        if (proc.stdout) {
-          for await (const chunk of proc.stdout) {
-            stdout += decoder.decode(chunk);
-          }
-        }
-        if (proc.stderr) {
-          for await (const chunk of proc.stderr) {
-            stderr += decoder.decode(chunk);
-          }
-        }
-        const { exitCode } = await proc.exited;
-        console.log("PYTHON RUN:", { stdout, stderr, exitCode });
-        const headers = {
-          "Content-Type": "application/json",
-          "X-Content-Type-Options": "nosniff",
-          "X-Frame-Options": "SAMEORIGIN"
-        };
-        if (exitCode !== undefined && exitCode !== 0) {
+        const reply = await workers.request({ cmd: "run", method, config });
+        console.log("PYTHON RUN:", { id: reply.id, ok: reply.ok, seconds: reply.seconds });
+        if (!reply.ok) {
           return new Response(JSON.stringify({
             success: false,
-            error: stderr || stdout || "Unknown error",
-            stdout,
-            stderr,
-            exitCode
+            error: reply.error.message,
+            errorType: reply.error.type,
+            traceback: reply.error.traceback,
+            stdout: reply.output,
+            exitCode: 1
           }), {
             status: 500,
             headers
@@ -53,9 +141,11 @@ Bun.serve({
         }
         return new Response(JSON.stringify({
           success: true,
-          output: stdout,
-          stderr: stderr || null,
-          exitCode: exitCode === undefined ? 0 : exitCode
+          output: reply.output,
+          result: reply.result,
+          seconds: reply.seconds,
+          stderr: null,
+          exitCode: 0
         }), {
           status: 200,
           headers
@@ -68,6 +158,12 @@ Bun.serve({
       }
     }
 
+    if (path === "/api/workers") {
+      return new Response(JSON.stringify(await workers.ping()), {
+        headers: { "Content-Type": "application/json" }
+      });
+    }
+
     // ─── Python executable info endpoint ───
     if (path === "/api/python-env") {
       return new Response(JSON.stringify({ python: PY }), {
@@ -197,6 +293,12 @@ Bun.serve({
         headers: { "Content-Type": "application/json", "Access-Control-Allow-Origin": "*" },
       });
     }
+    // Method capabilities from registry.py (transform, knn, memory, ...)
+    if (path === "/api/methods") {
+      return new Response(JSON.stringify(METHODS), {
+        headers: { "Content-Type": "application/json", "Access-Control-Allow-Origin": "*" },
+      });
+    }
     return new Response(JSON.stringify({ error: "Not found" }), { status: 404 });
   }
 });
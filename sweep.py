@@ -0,0 +1,284 @@
+# sweep.py
+#!/usr/bin/env python3
+"""Run many configs from configs.yaml in parallel, in-process.
+
+Usage:  python sweep.py                                  # every config
+        python sweep.py --methods umap tsne --cores 32
+        python sweep.py --methods pca isomap --configs fast basic --save-model
+        python sweep.py --threads umap=8 tsne=16
+
+Worker processes stay alive across runs, so Python/NumPy/torch/numba imports
+are paid once per worker rather than once per config. Each subset (after
+preprocessing) is loaded once in the parent and handed to the workers
+through shared memory. Jobs are admitted while the threads they use fit in
+the --cores budget (`threads` in registry.py, a config's own n_jobs, or
+--threads overrides), and each worker caps BLAS/numba/torch to that count.
+Only the parent writes to the database. A run that raises, or whose worker
+dies, is reported and the sweep carries on; the summary gives throughput in
+runs/hour. Per-run stdout/stderr goes to --log-dir. Configs whose run hash
+is already recorded are skipped (--force refits them), and --configs names
+a grid entry's cells by the entry's name.
+"""
+import argparse, os, pickle, sys, time, traceback
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import redirect_stderr, redirect_stdout
+from multiprocessing import get_context, shared_memory
+from pathlib import Path
+
+import numpy as np
+import db, registry
+import run as runner
+
+
+def job_threads(method: str, cfg: dict, overrides: dict, cores: int) -> int:
+    n = overrides.get(method) or cfg.get("n_jobs") or registry.get(method).threads
+    if n is None or n < 1:            # n_jobs: -1 → everything we have
+        n = cores
+    return max(1, min(int(n), cores))
+
+
+# ── worker side ────────────────────────────────────────────────────────────
+def _attach(name: str):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)     # Python ≥ 3.13
+    except TypeError:
+        # spawned workers share the parent's resource tracker, which unlinks
+        # the block once, when the parent does
+        return shared_memory.SharedMemory(name=name)
+
+
+def _limit_threads(n: int) -> None:
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(n)
+    except ImportError:
+        pass
+    numba = sys.modules.get("numba")
+    if numba is not None:
+        numba.set_num_threads(min(n, numba.config.NUMBA_NUM_THREADS))
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(n)
+
+
+def _work(job: dict) -> dict:
+    """Fit one config on the shared subset; never raises."""
+    shm = _attach(job["shm"])
+    log = Path(job["log"])
+    out = {"ok": False}
+    try:
+        with open(log, "w") as f, redirect_stdout(f), redirect_stderr(f):
+            try:
+                X = np.ndarray(job["shape"], dtype=job["dtype"], buffer=shm.buf)
+                X.flags.writeable = False           # shared by every run on this subset
+                mod = runner.load_method(job["method"])
+                _limit_threads(job["threads"])
+                run_cfg = dict(job["cfg"], input_stats=job["stats"])
+                runner.attach_caches(job["method"], job["cfg"], run_cfg, X, job["spec"],
+                                     job["subset_id"], job["prep"], job["cfgs"], job["save_model"])
+                try:
+                    coords, model, runtime, compile_time = runner.fit(mod, X, run_cfg,
+                                                                      job["save_model"])
+                except ValueError as e:
+                    if "read-only" not in str(e):
+                        raise
+                    # the wrapper writes into its input: give it a private copy
+                    coords, model, runtime, compile_time = runner.fit(mod, X.copy(), run_cfg,
+                                                                      job["save_model"])
+                out = {"ok": True, "runtime": runtime, "compile_time": compile_time,
+                       "coords": np.array(coords, dtype=np.float32),
+                       # pickle now: the model may hold views of the shared block
+                       "model": pickle.dumps(model) if model is not None else None,
+                       "metrics": None}
+                if job["meta"] is not None:
+                    try:
+                        out["metrics"] = runner.score(
+                            job["method"], job["cfg"], X, job["meta"], out["coords"],
+                            job["subset_id"], job["prep"], run_cfg.get("knn_graph"))
+                    except Exception:             # the fit itself still counts
+                        traceback.print_exc()
+                del X, run_cfg, coords, model
+            except BaseException as e:
+                traceback.print_exc()
+                out = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+    finally:
+        try:
+            shm.close()
+        except BufferError:                     # something still holds a view; GC will
+            pass
+    return out
+
+
+# ── parent side ────────────────────────────────────────────────────────────
+class _Group:
+    """One loaded (and preprocessed) subset in shared memory."""
+
+    def __init__(self, spec: dict):
+        X, self.meta, self.stats, self.subset_id, self.prep = runner.load_inputs(spec)
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        self.shape, self.dtype, self.dim = X.shape, X.dtype.str, X.shape[1]
+        self.shm = shared_memory.SharedMemory(create=True, size=max(X.nbytes, 1))
+        np.ndarray(X.shape, X.dtype, buffer=self.shm.buf)[:] = X
+
+    def release(self) -> None:
+        self.shm.close()
+        self.shm.unlink()
+
+
+def select_jobs(cfgs: dict, methods, names) -> list:
+    jobs = []
+    for method in methods or cfgs:
+        if method not in cfgs:
+            sys.exit(f"No method “{method}” in configs.yaml")
+        for c in cfgs[method]:
+            if not names or c["name"] in names or c["name"].partition("[")[0] in names:
+                jobs.append((method, c["name"], dict(c)))
+    return jobs
+
+
+def sweep(cfgs: dict, jobs: list, cores: int, overrides: dict, save_model: bool = False,
+          log_dir: Path = Path(db.CACHE_DIR) / "sweep_logs", force: bool = False,
+          metrics: bool = False) -> dict:
+    log_dir.mkdir(parents=True, exist_ok=True)
+    pending, per_group, loaded, cached = [], Counter(), {}, []
+    for method, name, cfg in jobs:
+        spec = runner.split_config(cfg)
+        run_hash = runner.run_hash(method, cfg, spec,
+                                   db.get_subset(spec["subset"], spec["size"], spec["seed"]))
+        cfg_id = None if force else runner.memoized(method, run_hash, save_model)
+        if cfg_id is not None:
+            cached.append(f"{method}:{name}")
+            print(f"⏭  {method}:{name}  cfg_id={cfg_id}  already recorded")
+            continue
+        key = (spec["subset"], spec["size"], spec["seed"], spec["tier"], spec["pipeline"])
+        per_group[key] += 1
+        pending.append({"method": method, "name": name, "cfg": cfg, "spec": spec, "key": key,
+                        "hash": run_hash, "threads": job_threads(method, cfg, overrides, cores)})
+
+    ctx = get_context("spawn")
+    pool = ProcessPoolExecutor(max_workers=cores, mp_context=ctx)
+    running, used = {}, 0
+    ok, failed, fit_time = [], [], 0.0
+    t0 = time.time()
+
+    def finish(job, res):
+        nonlocal fit_time
+        g = loaded[job["key"]]
+        label = f"{job['method']}:{job['name']}"
+        if res.get("ok"):
+            try:
+                model = pickle.loads(res["model"]) if res["model"] else None
+                cfg_id = runner.record(job["method"], job["db_cfg"], job["spec"], g.subset_id,
+                                       g.meta, res["coords"], res["runtime"], model, g.dim,
+                                       save_model, res["compile_time"], job["hash"])
+                if res["metrics"] is not None:
+                    db.save_metrics(job["method"], cfg_id, res["metrics"])
+                fit_time += res["runtime"]
+                ok.append(label)
+                scores = runner.summarize_metrics(res["metrics"] or [])
+                print(f"✅ {label}  cfg_id={cfg_id}  subset={g.subset_id}  "
+                      f"pts={len(res['coords'])}  time={res['runtime']:.2f}s" +
+                      (f" (compile {res['compile_time']:.2f}s)" if res["compile_time"] else "") +
+                      (f"  {runner.describe_metrics(scores)}" if scores else ""))
+            except Exception as e:
+                res = {"ok": False, "error": f"recording failed: {type(e).__name__}: {e}"}
+        if not res.get("ok"):
+            failed.append((label, res["error"]))
+            print(f"❌ {label}  {res['error']}  (log: {job['log']})")
+        per_group[job["key"]] -= 1
+        if per_group[job["key"]] == 0:
+            g.release()
+            del loaded[job["key"]]
+
+    try:
+        while pending or running:
+            # first pending job whose threads fit; anything fits an idle pool
+            while pending:
+                job = next((j for j in pending if used + j["threads"] <= cores), None)
+                if job is None:
+                    break
+                pending.remove(job)
+                if job["key"] not in loaded:
+                    try:
+                        loaded[job["key"]] = _Group(job["spec"])
+                    except Exception as e:
+                        failed.append((f"{job['method']}:{job['name']}", f"loading subset: {e}"))
+                        print(f"❌ {job['method']}:{job['name']}  loading subset: {e}")
+                        per_group[job["key"]] -= 1
+                        continue
+                g = loaded[job["key"]]
+                cfg, job["db_cfg"] = runner.method_config(job["method"], job["cfg"], g.meta)
+                job["log"] = str(log_dir / f"{job['method']}-{job['name']}.log")
+                fut = pool.submit(_work, {
+                    "method": job["method"], "cfg": cfg, "spec": job["spec"], "cfgs": cfgs,
+                    "shm": g.shm.name, "shape": g.shape, "dtype": g.dtype, "stats": g.stats,
+                    "subset_id": g.subset_id, "prep": g.prep, "threads": job["threads"],
+                    "save_model": save_model, "log": job["log"],
+                    "meta": g.meta if metrics else None,
+                })
+                running[fut] = job
+                used += job["threads"]
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            broken = False
+            for fut in done:
+                job = running.pop(fut)
+                used -= job["threads"]
+                try:
+                    res = fut.result()
+                except BrokenProcessPool:
+                    broken = True
+                    res = {"ok": False, "error": "worker process died"}
+                finish(job, res)
+            if broken:                  # a crashed worker takes the pool down with it
+                pool.shutdown(wait=False, cancel_futures=True)
+                pool = ProcessPoolExecutor(max_workers=cores, mp_context=ctx)
+    finally:
+        pool.shutdown()
+        for g in loaded.values():
+            g.release()
+
+    wall = time.time() - t0
+    return {"ok": ok, "failed": failed, "cached": cached, "wall": wall, "fit_time": fit_time,
+            "runs_per_hour": len(ok) / wall * 3600 if wall else 0.0}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Parallel sweep over configs.yaml.")
+    ap.add_argument("--methods", nargs="*", help="methods to run (default: all)")
+    ap.add_argument("--configs", nargs="*", help="only configs with these names")
+    ap.add_argument("--cores", type=int, default=os.cpu_count(), help="total thread budget")
+    ap.add_argument("--threads", nargs="*", default=[], metavar="METHOD=N",
+                    help="override a method's thread count")
+    ap.add_argument("--save-model", action="store_true", help="as in run.py")
+    ap.add_argument("--force", action="store_true",
+                    help="refit runs whose hash is already recorded")
+    ap.add_argument("--metrics", action="store_true",
+                    help="score each layout in its worker (metrics.py → run_metrics)")
+    ap.add_argument("--log-dir", type=Path, default=Path(db.CACHE_DIR) / "sweep_logs")
+    args = ap.parse_args(argv)
+
+    overrides = {}
+    for item in args.threads:
+        method, _, n = item.partition("=")
+        overrides[method] = int(n)
+    cfgs = runner.load_configs()
+    jobs = select_jobs(cfgs, args.methods, args.configs)
+    print(f"sweep: {len(jobs)} runs on {args.cores} cores")
+    res = sweep(cfgs, jobs, args.cores, overrides, args.save_model, args.log_dir, args.force,
+                args.metrics)
+
+    print(f"\n{len(res['ok'])} ok, {len(res['failed'])} failed, "
+          f"{len(res['cached'])} already recorded in {res['wall']:.1f}s  "
+          f"({res['runs_per_hour']:.0f} runs/hour; fit time {res['fit_time']:.1f}s, "
+          f"{res['fit_time'] / max(res['wall'], 1e-9):.1f}× wall)")
+    for label, err in res["failed"]:
+        print(f"  ❌ {label}: {err}")
+    return 1 if res["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
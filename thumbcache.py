@@ -0,0 +1,269 @@
+# thumbcache.py
+#!/usr/bin/env python3
+"""Pre-decoded thumbnails shared by every mosaic (viz.py, mosaic.py).
+
+Decoding AVIF is most of the cost of a mosaic, and viz_configs.yaml renders
+many configs over the same artworks. The thumbnails are therefore decoded
+once, at a few fixed sizes, into packed raw RGB files that every render
+memory-maps read-only:
+
+    <DR_CACHE>/thumbs/<crc32 of the thumbnail dir>/
+        pixels_<size>[.<gen>].bin
+                            uint8 RGB, thumbnails fitted into size×size,
+                            back to back (h*w*3 bytes each)
+        index.npz           names, mtime_ns, per size: offset and (h, w)
+                            and the pixels file's generation; h == 0
+                            marks a file Pillow could not read
+        meta.json           thumbnail dir, sizes, counts
+
+`update()` scans the directory once, decodes only new or changed files
+(by mtime) on a process pool, appends them and rewrites the index. Files
+that are gone are dropped. A pixels file is compacted once more than half
+of it is dead, into the next generation's file: readers take no lock, so
+the index swap is the only commit point and the old file is unlinked
+after it. `ThumbCache.load` is a mosaic.Compositor loader. A thumbnail
+whose cached size is the cell is a zero-copy view of the mapping; a smaller
+cell is resized straight from the mapped pages. Pillow's frombuffer wraps
+them without a copy and is ~3× faster than a pyvips pipeline per 100 px
+thumbnail. "Missing" means "not in the index", so a render does no
+per-point stat(). Disk: ~240 KB per thumbnail for the default sizes.
+
+    python thumbcache.py build [--dir assets/thumbnails] [--workers 8]
+    python thumbcache.py status | clear
+"""
+import argparse, json, os, shutil, time, zlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import db
+
+THUMBS_DIR = Path(db.CACHE_DIR) / "thumbs"
+THUMB_DIR = Path("assets/thumbnails")
+SIZES = (64, 128, 256)
+
+
+def cache_dir(thumb_dir=THUMB_DIR) -> Path:
+    key = zlib.crc32(str(Path(thumb_dir).resolve()).encode())
+    return THUMBS_DIR / f"{key:08x}"
+
+
+def _decode(path: str, sizes=SIZES):
+    """[(h, w, RGB bytes)] of *path* fitted into each size×size, largest first;
+    None if Pillow cannot read it."""
+    import pillow_avif                             # registers AVIF support in Pillow
+    from PIL import Image
+    try:
+        with Image.open(path) as im:
+            im.draft("RGB", (max(sizes), max(sizes)))
+            im = im.convert("RGB")
+            out = []
+            for s in sorted(sizes, reverse=True):  # each size shrunk from the previous
+                im.thumbnail((s, s), Image.Resampling.LANCZOS, reducing_gap=2.0)
+                out.append((im.height, im.width, im.tobytes()))
+            return out
+    except OSError:
+        return None
+
+
+def _read_index(root: Path):
+    try:
+        with np.load(root / "index.npz") as z:
+            return {k: z[k] for k in z.files}
+    except (FileNotFoundError, ValueError, KeyError):
+        return None
+
+
+def _write_index(root: Path, index: dict) -> None:
+    tmp = root / "index.tmp.npz"
+    with open(tmp, "wb") as f:
+        np.savez(f, **index)
+    os.replace(tmp, root / "index.npz")
+
+
+def _pixels_path(root: Path, size: int, gen: int) -> Path:
+    return root / (f"pixels_{size}.bin" if gen == 0 else f"pixels_{size}.{gen}.bin")
+
+
+def _compact(root: Path, index: dict, k: int, size: int) -> Path:
+    """Copy the live thumbnails of size *size*, in index order, into the next
+    generation's pixels file → the old file, to unlink once the index is out."""
+    gen = int(index["gen"][k])
+    path = _pixels_path(root, size, gen)
+    src = np.memmap(path, np.uint8, mode="r")
+    off = index["off"][:, k].copy()
+    with open(_pixels_path(root, size, gen + 1), "wb") as f:
+        pos = 0
+        for i, (h, w) in enumerate(index["hw"][:, k].tolist()):
+            nbytes = h * w * 3
+            f.write(src[off[i]:off[i] + nbytes])
+            off[i] = pos
+            pos += nbytes
+    del src
+    index["off"][:, k] = off
+    index["gen"][k] = gen + 1
+    return path
+
+
+def update(thumb_dir=THUMB_DIR, sizes=SIZES, workers: int = None) -> dict:
+    """Bring the cache of *thumb_dir* up to date → counts and timing."""
+    from embstore import _locked, _write_meta
+    thumb_dir, sizes = Path(thumb_dir), tuple(sorted(sizes, reverse=True))
+    root = cache_dir(thumb_dir)
+    t0 = time.time()
+    with _locked(root):
+        old = _read_index(root)
+        if old is not None and tuple(old["sizes"].tolist()) != sizes:
+            old = None                             # different sizes: start over
+        if old is None:
+            for s in sizes:
+                for path in root.glob(f"pixels_{s}.*bin"):
+                    path.unlink()
+        gen = (old["gen"].copy() if old is not None and "gen" in old
+               else np.zeros(len(sizes), np.int64))
+        prev = {} if old is None else dict(zip(old["names"].tolist(), range(len(old["names"]))))
+
+        with os.scandir(thumb_dir) as it:
+            files = sorted((e.name, e.stat().st_mtime_ns) for e in it if e.is_file())
+        names = [n for n, _ in files]
+        mtime = np.array([m for _, m in files], dtype=np.int64)
+        off = np.zeros((len(files), len(sizes)), np.int64)
+        hw = np.zeros((len(files), len(sizes), 2), np.int32)
+        todo = []
+        for i, (name, m) in enumerate(files):
+            j = prev.get(name)
+            if j is not None and old["mtime"][j] == m:
+                off[i], hw[i] = old["off"][j], old["hw"][j]
+            else:
+                todo.append(i)
+
+        unreadable = 0
+        if todo:
+            # appending leaves every offset a reader already holds valid
+            outs = [open(_pixels_path(root, s, gen[k]), "ab") for k, s in enumerate(sizes)]
+            pos = [f.seek(0, os.SEEK_END) for f in outs]
+            paths = [str(thumb_dir / names[i]) for i in todo]
+            with ProcessPoolExecutor(workers) as pool:
+                for i, res in zip(todo, pool.map(_decode, paths, chunksize=64)):
+                    if res is None:
+                        unreadable += 1
+                        continue
+                    for k, (h, w, raw) in enumerate(res):
+                        outs[k].write(raw)
+                        off[i, k], hw[i, k] = pos[k], (h, w)
+                        pos[k] += len(raw)
+            for f in outs:
+                f.close()
+
+        index = {"names": np.array(names, dtype=str), "mtime": mtime, "off": off, "hw": hw,
+                 "sizes": np.array(sizes, dtype=np.int64), "gen": gen}
+        stale = []
+        for k, s in enumerate(sizes):
+            path = _pixels_path(root, s, gen[k])
+            live = int((hw[:, k, 0].astype(np.int64) * hw[:, k, 1] * 3).sum())
+            if path.exists() and path.stat().st_size > 2 * live + (1 << 20):
+                stale.append(_compact(root, index, k, s))
+        _write_index(root, index)
+        for path in stale:                         # open maps keep their pages
+            path.unlink()
+        stats = {"thumb_dir": str(thumb_dir.resolve()), "sizes": list(sizes),
+                 "files": len(names), "decoded": len(todo), "unreadable": unreadable,
+                 "removed": len(set(prev) - set(names)), "seconds": round(time.time() - t0, 3)}
+        _write_meta(root, stats)
+    return stats
+
+
+class ThumbCache:
+    """Read side of one cache directory: its index plus read-only memmaps."""
+
+    def __init__(self, thumb_dir=THUMB_DIR):
+        root = cache_dir(thumb_dir)
+        for _ in range(3):
+            index = _read_index(root)
+            if index is None:
+                raise FileNotFoundError(f"no thumbnail cache for {thumb_dir}; "
+                                        f"run thumbcache.update() or `python thumbcache.py build`")
+            self.pixels = self._map(root, index)
+            if self.pixels is not None:
+                break
+        else:
+            raise RuntimeError(f"thumbnail cache {root} keeps being compacted; try again")
+        self.sizes = tuple(index["sizes"].tolist())
+        self.row = dict(zip(index["names"].tolist(), range(len(index["names"]))))
+        self.off, self.hw = index["off"], index["hw"]
+
+    @staticmethod
+    def _map(root: Path, index: dict):
+        """Memmaps of the index's pixels files, or None if one it needs is gone
+        (compacted and unlinked since the index was read: read it again)."""
+        gen = index["gen"].tolist() if "gen" in index else [0] * len(index["sizes"])
+        pixels = []
+        for k, (s, g) in enumerate(zip(index["sizes"].tolist(), gen)):
+            try:
+                pixels.append(np.memmap(_pixels_path(root, s, g), np.uint8, mode="r"))
+            except (FileNotFoundError, ValueError):    # ValueError: empty file
+                if index["hw"][:, k, 0].any():
+                    return None
+                pixels.append(np.empty(0, np.uint8))
+        return pixels
+
+    def __contains__(self, name) -> bool:
+        i = self.row.get(name)
+        return i is not None and self.hw[i, 0, 0] > 0
+
+    def get(self, name, size: int):
+        """(h, w, 3) view of *name* at the smallest cached size >= *size* (else the
+        largest), or None if it is not in the cache."""
+        i = self.row.get(name)
+        if i is None:
+            return None
+        fits = [k for k, s in enumerate(self.sizes) if s >= size]
+        k = fits[-1] if fits else 0                # sizes are stored largest first
+        h, w = self.hw[i, k].tolist()
+        if h == 0:
+            return None
+        o = int(self.off[i, k])
+        return self.pixels[k][o:o + h * w * 3].reshape(h, w, 3)
+
+    def load(self, path, cell: int):
+        """mosaic.Compositor loader: thumbnail of thumb_dir/<name> fitted into cell×cell."""
+        img = self.get(Path(path).name, cell)
+        if img is None or max(img.shape[:2]) <= cell:
+            return img
+        from PIL import Image
+        h, w = img.shape[:2]
+        im = Image.frombuffer("RGB", (w, h), img, "raw", "RGB", 0, 1)   # wraps, no copy
+        im.thumbnail((cell, cell), Image.Resampling.LANCZOS, reducing_gap=2.0)
+        return np.asarray(im)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Pre-decoded thumbnail cache for viz.py.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    for name, help in (("build", "decode new/changed thumbnails into the cache"),
+                       ("status", "show the cache directory and its size"),
+                       ("clear", "delete the cache")):
+        p = sub.add_parser(name, help=help)
+        p.add_argument("--dir", type=Path, default=THUMB_DIR, help="thumbnail directory")
+        if name == "build":
+            p.add_argument("--workers", type=int, default=None, help="decode processes")
+    args = ap.parse_args(argv)
+
+    root = cache_dir(args.dir)
+    if args.cmd == "build":
+        s = update(args.dir, workers=args.workers)
+        print(f"✅ {s['files']:,} thumbnails ({s['decoded']:,} decoded, {s['removed']:,} removed, "
+              f"{s['unreadable']:,} unreadable) in {s['seconds']:.1f}s → {root}")
+    elif args.cmd == "status":
+        files = list(root.glob("*")) if root.exists() else []
+        size = sum(p.stat().st_size for p in files)
+        meta = json.loads((root / "meta.json").read_text()) if (root / "meta.json").exists() else {}
+        print(f"{root}: {meta.get('files', 0):,} thumbnails, sizes {meta.get('sizes', [])}, "
+              f"{size / 2**20:.1f} MiB")
+    else:
+        shutil.rmtree(root, ignore_errors=True)
+        print(f"removed {root}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,27 +2,28 @@
 # viz.py  –  build a 16 384 × 16 384 mosaic from DR projection points
 #
 # Usage:  python viz.py --method umap --config 42
+#         python viz.py --method umap --config 42 --tiles --canvas 65536   # DZI pyramid
 #
-# Requires: pyvips  +  pillow-avif-plugin
+# With --tiles, a re-run for the same method/config_id diffs its points
+# against the previous tiled viz and redraws only the tiles that changed
+# (--full forces a complete render).
+#
+# Batch mode (viz_configs.yaml) renders on a process pool of --workers,
+# admitting renders while their estimated peak memory fits --mem-budget-gb;
+# per-render output goes to --log-dir and a failed render does not stop the rest.
+#
+# Requires: pyvips (libvips with libheif/AV1)  +  pillow-avif-plugin (thumbnails)
 #           pip install pyvips pillow-avif-plugin
 
-import argparse, os, math, struct, time, yaml  # added yaml
+import argparse, json, os, math, resource, shutil, sys, time, yaml  # added yaml
 from pathlib import Path
 
-import pyvips                           # libvips bindings
 import db                               # your db.py module
-import pillow_avif                      # registers AVIF support in Pillow
-from PIL import Image
+import mosaic                           # tile-by-tile compositor
+import thumbcache                       # pre-decoded thumbnails, memory-mapped
 import numpy as np
-
-# --- Pillow AVIF loader helper ---
-def load_thumb(path):
-    """Read AVIF with Pillow and return a 3-band pyvips image."""
-    pil = Image.open(path).convert("RGB")          # Pillow decodes AVIF
-    arr = np.asarray(pil)                          # H×W×3 uint8
-    return pyvips.Image.new_from_memory(
-        arr.tobytes(), arr.shape[1], arr.shape[0], 3, format="uchar"
-    )
+# pyvips / Pillow are imported where the mosaic is drawn, so the coordinate
+# pipeline (prepare, normalise) and its benchmark run without them.
 
 # ----------------------------------------------------------------------
 # Parameters
@@ -30,43 +31,80 @@ CANVAS_W = CANVAS_H = 16_384
 THUMB_DIR = Path("assets/thumbnails")
 OUT_DIR   = Path("assets/visualizations")          # will hold final AVIF files
 MAX_IMAGES_BEFORE_SHRINK = 4_000
+THUMB_PX  = 256                         # cell a thumbnail is fitted into at scale 1
 TEXT_PAD  = 40                          # px from top/right edge
 FONT_SIZE = 60                          # for annotation text
+MARGIN    = 128                         # px kept free on every side of the layout
+AVIF_Q    = 75                          # libheif Q (not pillow-avif's quality scale)
+AVIF_EFFORT = 2                         # AV1 encoder effort, 0 (fast) … 9 (small)
 # ----------------------------------------------------------------------
 
-def normalise(points):
-    """Map raw (x,y) to integer canvas coords in [0, 16383]."""
-    xs = [p["x"] for p in points]
-    ys = [p["y"] for p in points]
-    min_x, max_x = min(xs), max(xs)
-    min_y, max_y = min(ys), max(ys)
+def normalise(coords, width=CANVAS_W, height=CANVAS_H, margin=MARGIN):
+    """Map an (n, ≥2) layout to int32 canvas coords (viz_x, viz_y).
 
-    span_x = max_x - min_x or 1.0
-    span_y = max_y - min_y or 1.0
+    One scale for both axes (the layout keeps its aspect ratio), centred in
+    the canvas minus *margin* px on every side; NaN/inf rows land at the
+    centre.
+    """
+    xy = np.asarray(coords, dtype=np.float64)[:, :2]
+    ok = np.isfinite(xy).all(axis=1)
+    lo = xy[ok].min(axis=0) if ok.any() else np.zeros(2)
+    hi = xy[ok].max(axis=0) if ok.any() else np.zeros(2)
+    span = hi - lo
+    room = np.array([width - 1 - 2 * margin, height - 1 - 2 * margin], dtype=np.float64)
+    wide = span > 0                                # both False: a single point
+    scale = float(np.min(room[wide] / span[wide])) if wide.any() else 0.0
+    offset = margin + (room - span * scale) / 2 - lo * scale
+    xy = np.where(ok[:, None], xy * scale + offset, margin + room / 2)
+    out = np.rint(xy).astype(np.int32)
+    return out[:, 0], out[:, 1]
 
-    normed = []
-    for p in points:
-        nx = int(round(((p["x"] - min_x) / span_x) * (CANVAS_W - 1)))
-        ny = int(round(((p["y"] - min_y) / span_y) * (CANVAS_H - 1)))
-        normed.append({**p, "viz_x": nx, "viz_y": ny})
-    return normed
+def prepare(method, config_id, width=CANVAS_W, height=CANVAS_H):
+    """Pre-render step: a run's points as arrays plus their canvas positions.
 
-def build_mosaic(normed, scale_factor, out_path, label):
-    """Paste every thumbnail onto a huge blank canvas and save."""
-    canvas = pyvips.Image.black(CANVAS_W, CANVAS_H, bands=3)
+    → dict(point_ids, filenames, artists, viz_x, viz_y), or None if the run has no points.
+    """
+    pts = db.get_projection_points(method, config_id, as_arrays=True)
+    if pts is None or len(pts["point_ids"]) == 0:
+        return None
+    viz_x, viz_y = normalise(pts["coords"], width, height)
+    return {"point_ids": pts["point_ids"], "filenames": pts["filenames"],
+            "artists": pts["artists"], "viz_x": viz_x, "viz_y": viz_y}
 
-    for p in normed:
-        thumb_path = THUMB_DIR / p["filename"]
-        if not thumb_path.exists():
-            print(f"WARNING: missing thumbnail {thumb_path}")
-            continue
+def record_viz(method, config_id, low_res, pts):
+    """Store a rendered visualization: viz_config row + its viz_points → viz_id."""
+    viz_id = db.insert_viz_config(method, low_res, config_id, db.pack_ids(pts["point_ids"]))
+    db.insert_viz_points(viz_id, pts["point_ids"], pts["viz_x"], pts["viz_y"])
+    return viz_id
 
-        thumb = load_thumb(str(thumb_path))
+def peak_rss_mib():
+    """Peak resident set size of this process so far, in MiB."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
 
-        if scale_factor < 1.0:                      # shrink if necessary
-            thumb = thumb.resize(scale_factor)      # Lanczos, good default
+def build_mosaic(pts, scale_factor, out_path, label, threads=None, load=mosaic.decode,
+                 quality=AVIF_Q, effort=AVIF_EFFORT, encode_threads=None):
+    """Composite every thumbnail onto the canvas tile by tile and save → stats dict.
 
-        canvas = canvas.insert(thumb, p["viz_x"], p["viz_y"])
+    load: thumbnail loader, e.g. thumbcache.ThumbCache(THUMB_DIR).load.
+    effort: AV1 encoder CPU effort, 0 (fastest) … 9 (smallest file).
+    encode_threads: libvips/encoder threads (default: VIPS_CONCURRENCY or all cores).
+    """
+    import pyvips
+    t0 = time.time()
+    cell = max(1, round(THUMB_PX * scale_factor))
+    comp = mosaic.Compositor(THUMB_DIR, pts["filenames"], pts["viz_x"], pts["viz_y"],
+                             cell, CANVAS_W, CANVAS_H, threads=threads, load=load)
+    # np.zeros is lazily zeroed: pages no tile lands on are never touched
+    arr = np.zeros((CANVAS_H, CANVAS_W, 3), np.uint8)
+    for tx, ty, tile in comp.tiles():
+        x, y = tx * comp.tile, ty * comp.tile
+        arr[y:y + tile.shape[0], x:x + tile.shape[1]] = tile
+    t_composite = time.time() - t0
+    if comp.missing:
+        print(f"WARNING: {len(comp.missing)} missing thumbnails in {THUMB_DIR}, e.g. "
+              f"{', '.join(sorted(comp.missing)[:3])}")
+    # wraps arr without a copy; everything below is a lazy pyvips pipeline
+    canvas = pyvips.Image.new_from_memory(arr.data, CANVAS_W, CANVAS_H, 3, format="uchar")
 
     # ── overlay annotation text in the top-right corner ──────────────────
     text = pyvips.Image.text(label, width=2000, height=FONT_SIZE + 10,
@@ -78,80 +116,335 @@ def build_mosaic(normed, scale_factor, out_path, label):
 
     OUT_DIR.mkdir(parents=True, exist_ok=True)
 
-    # ── export the Vips canvas to raw RGB bytes ────────────────────
-    raw = canvas.write_to_memory()  # raw interleaved RGB, uchar
-    arr = np.frombuffer(raw, dtype=np.uint8)
-    arr = arr.reshape((CANVAS_H, CANVAS_W, 3))
+    # ── stream the pipeline into libheif's AV1 encoder ──────────────────
+    # libvips hands the encoder its own thread count (vips concurrency), a
+    # process-wide setting: restored afterwards for whatever this process runs next
+    prev_threads = pyvips.vips_lib.vips_concurrency_get()
+    if encode_threads:
+        pyvips.vips_lib.vips_concurrency_set(encode_threads)
+    try:
+        canvas.heifsave(str(out_path), compression="av1", Q=quality, effort=effort, keep="none")
+    finally:
+        pyvips.vips_lib.vips_concurrency_set(prev_threads)
+    return {"thumbnails": len(pts["filenames"]) - len(comp.missing),
+            "missing": len(comp.missing), "cell": cell, "composite_s": t_composite,
+            "encode_s": time.time() - t0 - t_composite, "wall_s": time.time() - t0,
+            "peak_rss_mib": peak_rss_mib()}
+
+def thumb_scale(n, width=CANVAS_W):
+    """Thumbnail shrink factor: MAX_IMAGES_BEFORE_SHRINK full-size thumbnails per
+    16k² of canvas, so a 4× wider canvas holds 16× as many at full size."""
+    return min(1.0, width / CANVAS_W * math.sqrt(MAX_IMAGES_BEFORE_SHRINK / n))
+
+def build_tiles(pts, scale_factor, out_dir, width, height, threads=None, fmt="webp",
+                load=mosaic.decode, cell=None, only=None):
+    """Composite every thumbnail into a DZI tile pyramid under out_dir → stats dict.
+
+    cell/only: thumbnail cell and changed tiles from plan_update; out_dir then
+    already holds (hardlinks to) the previous pyramid.
+    """
+    t0 = time.time()
+    cell = cell or max(1, round(THUMB_PX * scale_factor))
+    # composited in DZI-tile-sized blocks: finer units for incremental redraws
+    comp = mosaic.Compositor(THUMB_DIR, pts["filenames"], pts["viz_x"], pts["viz_y"],
+                             cell, width, height, tile=mosaic.DZI_TILE, threads=threads,
+                             load=load)
+    stats = mosaic.write_pyramid(comp, out_dir, fmt=fmt, only=only)
+    mosaic._replace_text(Path(out_dir) / "render.json", json.dumps(
+        {"cell": cell, "width": width, "height": height, "tile": comp.tile,
+         "tile_size": stats["tile_size"], "format": fmt}))
+    if comp.missing:
+        print(f"WARNING: {len(comp.missing)} missing thumbnails in {THUMB_DIR}, e.g. "
+              f"{', '.join(sorted(comp.missing)[:3])}")
+    # an incremental redraw only decodes the thumbnails on its dirty tiles
+    return {**stats, "thumbnails": comp.decoded,
+            "missing": len(comp.missing), "cell": cell, "wall_s": time.time() - t0,
+            "peak_rss_mib": peak_rss_mib()}
+
+def plan_update(prev, pts, scale_factor, width, height, fmt, out_root):
+    """What a re-render of *prev* (a tiled viz_config row) needs → dict(cell, only,
+    added, removed, moved), or a string saying why it has to be a full render.
+
+    The new layout keeps the previous cell size if it is within 5 %, so
+    adding a few points does not resize every thumbnail.
+    """
+    try:
+        meta = json.loads((Path(out_root) / str(prev["viz_id"]) / "render.json").read_text())
+    except (FileNotFoundError, ValueError):
+        return f"viz_id={prev['viz_id']} has no render.json"
+    if (meta["width"], meta["height"], meta["format"]) != (width, height, fmt):
+        return "canvas size or tile format changed"
+    cell = max(1, round(THUMB_PX * scale_factor))
+    if abs(cell - meta["cell"]) > 0.05 * meta["cell"]:
+        return f"thumbnail cell {meta['cell']} → {cell} px"
+    cell = meta["cell"]
+
+    old_ids = db.unpack_ids(prev["point_ids"])     # draw order
+    old = db.get_viz_points(prev["viz_id"], as_arrays=True)
+    if len(old_ids) != len(old["point_ids"]):
+        return f"viz_id={prev['viz_id']} has an old-style point_ids blob"
+    pos = np.searchsorted(old["point_ids"], old_ids)
+    ox, oy = old["viz_x"][pos], old["viz_y"][pos]
+    new_ids, nx, ny = pts["point_ids"], pts["viz_x"], pts["viz_y"]
+    in_new, in_old = np.isin(old_ids, new_ids), np.isin(new_ids, old_ids)
+    if not np.array_equal(old_ids[in_new], new_ids[in_old]):
+        return "draw order changed"
+    # both sides restricted to the shared points are now in the same order
+    moved = (ox[in_new] != nx[in_old]) | (oy[in_new] != ny[in_old])
+    dirty = np.union1d(
+        mosaic.touched(np.concatenate([ox[~in_new], ox[in_new][moved]]),
+                       np.concatenate([oy[~in_new], oy[in_new][moved]]), cell, width, height,
+                       meta["tile"]),
+        mosaic.touched(np.concatenate([nx[~in_old], nx[in_old][moved]]),
+                       np.concatenate([ny[~in_old], ny[in_old][moved]]), cell, width, height,
+                       meta["tile"]))
+    return {"cell": cell, "only": dirty, "added": int((~in_old).sum()),
+            "removed": int((~in_new).sum()), "moved": int(moved.sum())}
+
+def render_tiles(method, config_id, pts, scale, side, out_root, threads=None, fmt="webp",
+                 load=mosaic.decode, full=False):
+    """Tiled render of one run into out_root/<viz_id>/, incremental against the
+    run's previous tiled viz unless *full* → (viz_id, stats)."""
+    prev = None if full else db.latest_viz_config(method, config_id, ".dzi")
+    plan = plan_update(prev, pts, scale, side, side, fmt, out_root) if prev else "first render"
+    # built under a temporary name, moved to <viz_id>/ once recorded
+    tmp = Path(out_root) / f".{method}_{config_id}_{time.time_ns()}"
+    if isinstance(plan, dict):
+        if len(plan["only"]) == 0:
+            print(f"No layout changes since viz_id={prev['viz_id']}")
+            return prev["viz_id"], None
+        print(f"Incremental vs viz_id={prev['viz_id']}: +{plan['added']} -{plan['removed']} "
+              f"~{plan['moved']} points → {len(plan['only'])} tiles to redraw")
+        shutil.copytree(Path(out_root) / str(prev["viz_id"]), tmp, copy_function=os.link)
+        stats = build_tiles(pts, scale, tmp, side, side, threads, fmt, load,
+                            cell=plan["cell"], only=plan["only"])
+    else:
+        if not full:
+            print(f"Full render ({plan})")
+        stats = build_tiles(pts, scale, tmp, side, side, threads, fmt, load)
+    viz_id = record_viz(method, config_id, "", pts)
+    tmp.rename(Path(out_root) / str(viz_id))
+    db.update_viz_config_image(viz_id, f"{viz_id}/tiles.dzi")
+    return viz_id, stats
+
+
+# Peak-memory model for one render, used to admit batch renders (measured with
+# 2000 cached 256 px thumbnails): the AVIF path peaks at ~6.5× the raw
+# canvas (numpy canvas, libheif's copy, AV1 encoder buffers),
+# a tiled render at a fixed ~0.8 GiB plus a few rows of DZI_TILE blocks.
+RENDER_BASE_MIB = 200                   # interpreter, pyvips, Pillow, decode pool
+AVIF_CANVAS_COPIES = 7
+TILES_BASE_MIB = 800
+TILES_BANDS = 3
+
+def render_mem_mib(tiles, side=CANVAS_W):
+    """Estimated peak RSS of one render in MiB."""
+    if tiles:
+        return TILES_BASE_MIB + TILES_BANDS * side * mosaic.DZI_TILE * 3 / 2**20
+    return RENDER_BASE_MIB + AVIF_CANVAS_COPIES * CANVAS_W * CANVAS_H * 3 / 2**20
+
+def render_one(method, config_id, tiles=False, side=CANVAS_W, fmt="webp", threads=None,
+               full=False, load=mosaic.decode, effort=AVIF_EFFORT):
+    """Render one run as an AVIF mosaic, or with *tiles* a DZI pyramid of side²
+    px → (viz_id, stats); None if the run has no points, stats None if a tiled
+    re-render found nothing to redraw."""
+    method = method.lower()
+    # 1️⃣  Fetch points as arrays + canvas positions (aspect kept, MARGIN px border)
+    side = side if tiles else CANVAS_W
+    pts = prepare(method, config_id, side, side)
+    if pts is None:
+        print(f"No points for method={method}, config_id={config_id}")
+        return None
+    n = len(pts["point_ids"])
+    # ── fetch DR hyperparameters and build an annotation string ────────────────
+    cfg_params = db.get_dr_config(method, config_id)
+    param_items = [
+        f"{key}={val}"
+        for key, val in cfg_params.items()
+        if key != "config_id"
+    ]
+    params_str = ", ".join(param_items)
+    label = f"{method.upper()} (config {config_id}): {params_str}"
+    # 2️⃣  Decide thumbnail scaling
+    scale = thumb_scale(n, side)
+    if scale < 1.0:
+        print(f"Shrinking thumbnails by factor {scale:.3f} ...")
+    # 3️⃣  Build mosaic
+    SCRIPT_DIR = Path(__file__).resolve().parent
+    OUT_DIR = SCRIPT_DIR / "assets" / "visualizations"
+    OUT_DIR.mkdir(parents=True, exist_ok=True)
+    if tiles:
+        viz_id, stats = render_tiles(method, config_id, pts, scale, side, OUT_DIR,
+                                     threads, fmt, load, full)
+        if stats is None:
+            return viz_id, None
+        print(f"Wrote {OUT_DIR / str(viz_id)}: {stats['levels']} levels, {stats['tiles']} "
+              f"tiles from {stats['thumbnails']} thumbnails in {stats['wall_s']:.1f}s, "
+              f"peak RSS {stats['peak_rss_mib']:,.0f} MiB")
+        print(f"Inserted viz_id={viz_id} with {n} points into DB.")
+        return viz_id, stats
+    out_file = OUT_DIR / f"{method}_{config_id}_{int(time.time())}.avif"
+    stats = build_mosaic(pts, scale, out_file, label, threads=threads, load=load,
+                         effort=effort, encode_threads=threads)
+    print(f"Wrote {out_file}: {stats['thumbnails']} thumbnails in {stats['wall_s']:.1f}s "
+          f"(composite {stats['composite_s']:.1f}s, encode {stats['encode_s']:.1f}s), "
+          f"peak RSS {stats['peak_rss_mib']:,.0f} MiB")
+    # 4️⃣  Insert into viz_config and viz_points
+    viz_id = record_viz(method, config_id, out_file.name, pts)
+    print(f"Inserted viz_id={viz_id} with {n} points into DB.")
+    return viz_id, stats
+
+def _work(job):
+    """Worker side of render_batch: one render, output to its log → result dict."""
+    from contextlib import redirect_stderr, redirect_stdout
+    import traceback
+    t0 = time.time()
+    with open(job["log"], "w") as log, redirect_stdout(log), redirect_stderr(log):
+        try:
+            load = mosaic.decode
+            if job["thumb_cache"] and THUMB_DIR.is_dir():
+                load = thumbcache.ThumbCache(THUMB_DIR).load
+            res = render_one(job["method"], job["config_id"], job["tiles"], job["side"],
+                             job["fmt"], job["threads"], job["full"], load, job["effort"])
+            viz_id, stats = res if res else (None, None)
+            return {"ok": True, "viz_id": viz_id, "stats": stats, "seconds": time.time() - t0}
+        except Exception as e:
+            traceback.print_exc()
+            return {"ok": False, "error": f"{type(e).__name__}: {e}", "seconds": time.time() - t0}
+
+def render_batch(entries, workers, budget_mib, log_dir, tiles=False, side=CANVAS_W,
+                 fmt="webp", threads=None, full=False, thumb_cache=True, effort=AVIF_EFFORT):
+    """Render (method, config_id) pairs on a process pool → dict(ok, failed, wall).
+
+    A render is admitted while the estimated peaks (render_mem_mib) of the
+    running ones fit in *budget_mib*; an idle pool takes anything. Renders
+    of the same run never overlap, so a tiled re-render diffs against a
+    finished pyramid. A render that raises, or whose worker dies, is
+    reported and the batch carries on.
+    """
+    from collections import Counter
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+    from concurrent.futures.process import BrokenProcessPool
+    from multiprocessing import get_context
+    log_dir = Path(log_dir)
+    log_dir.mkdir(parents=True, exist_ok=True)
+    est = render_mem_mib(tiles, side)
+    threads = threads or max(1, (os.cpu_count() or 1) // workers)
+    total = len(entries)
+    pending = [{"method": m.lower(), "config_id": c, "tiles": tiles, "side": side, "fmt": fmt,
+                "threads": threads, "full": full, "thumb_cache": thumb_cache, "mem": est,
+                "effort": effort,
+                "log": str(log_dir / f"{m.lower()}-{c}.log")} for m, c in entries]
+    ctx = get_context("spawn")
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=ctx)
+    running, used, busy = {}, 0.0, Counter()
+    ok, failed, done_n = [], [], 0
+    t0 = time.time()
+    try:
+        while pending or running:
+            while pending and len(running) < workers:
+                job = next((j for j in pending if busy[(j["method"], j["config_id"])] == 0
+                            and (not running or used + j["mem"] <= budget_mib)), None)
+                if job is None:
+                    break
+                pending.remove(job)
+                if job["mem"] > budget_mib:
+                    print(f"⚠️  {job['method']}:{job['config_id']} needs ~{job['mem']:,.0f} MiB, "
+                          f"more than the {budget_mib:,.0f} MiB budget; running it alone")
+                job["start"] = time.time()
+                running[pool.submit(_work, job)] = job
+                used += job["mem"]
+                busy[(job["method"], job["config_id"])] += 1
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            broken = False
+            for fut in done:
+                job = running.pop(fut)
+                used -= job["mem"]
+                busy[(job["method"], job["config_id"])] -= 1
+                try:
+                    res = fut.result()
+                except BrokenProcessPool:
+                    broken = True
+                    res = {"ok": False, "error": "worker process died (out of memory?)",
+                           "seconds": time.time() - job["start"]}
+                done_n += 1
+                label = f"{job['method']}:{job['config_id']}"
+                if res["ok"]:
+                    ok.append(label)
+                    stats = res["stats"]
+                    what = ("no points" if res["viz_id"] is None else
+                            f"viz_id={res['viz_id']} unchanged" if stats is None else
+                            f"viz_id={res['viz_id']}  peak RSS {stats['peak_rss_mib']:,.0f} MiB")
+                    print(f"[{done_n}/{total}] ✅ {label}  {what}  {res['seconds']:.1f}s")
+                else:
+                    failed.append((label, res["error"]))
+                    print(f"[{done_n}/{total}] ❌ {label}  {res['error']}  "
+                          f"{res['seconds']:.1f}s  (log: {job['log']})")
+            if broken:                  # a crashed worker takes the pool down with it
+                pool.shutdown(wait=False, cancel_futures=True)
+                pool = ProcessPoolExecutor(max_workers=workers, mp_context=ctx)
+    finally:
+        pool.shutdown()
+    return {"ok": ok, "failed": failed, "wall": time.time() - t0}
 
-    # ── convert to PIL and save as AVIF ─────────────────────────────
-    img = Image.fromarray(arr, mode="RGB")
-    img.save(str(out_path), format="AVIF", quality=80)
+def _default_budget_gb():
+    if os.environ.get("DR_VIZ_MEM_GB"):
+        return float(os.environ["DR_VIZ_MEM_GB"])
+    return 0.8 * os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") / 2**30
 
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--method", help="DR method name (e.g. umap)")
     ap.add_argument("--config", type=int, help="config_id to visualise")
     ap.add_argument("--viz-config", type=str, default="viz_configs.yaml", help="YAML file listing visualizations to generate")
+    ap.add_argument("--tiles", action="store_true", help="write a DZI tile pyramid to assets/visualizations/<viz_id>/ instead of one AVIF")
+    ap.add_argument("--canvas", type=int, default=CANVAS_W, help="canvas side in px for --tiles (default %(default)s; 65536 works)")
+    ap.add_argument("--tile-format", default="webp", choices=sorted(mosaic.FORMATS), help="pyramid tile format")
+    ap.add_argument("--full", action="store_true", help="with --tiles: redraw everything instead of diffing against the previous viz")
+    ap.add_argument("--threads", type=int, default=None, help="thumbnail decode/composite and AVIF encode threads per render (default: all cores, split between --workers)")
+    ap.add_argument("--avif-effort", type=int, default=AVIF_EFFORT, choices=range(10), metavar="0-9", help="AV1 encoder effort: 0 fastest, 9 smallest file (default %(default)s)")
+    ap.add_argument("--no-thumb-cache", action="store_true", help="decode every thumbnail instead of reading thumbcache.py's store")
+    ap.add_argument("--workers", type=int, default=os.cpu_count(), help="batch mode: renders at once, at most (default: all cores)")
+    ap.add_argument("--mem-budget-gb", type=float, default=_default_budget_gb(), help="batch mode: RAM the running renders may use together, by estimated peak (default: $DR_VIZ_MEM_GB or 80%% of RAM)")
+    ap.add_argument("--log-dir", type=Path, default=Path(db.CACHE_DIR) / "viz_logs", help="batch mode: per-render output")
     args = ap.parse_args()
 
-    def run_one(method, config_id):
-        method = method.lower()
-        # 1️⃣  Fetch raw points + DR parameters
-        raw_pts = db.get_projection_points(method, config_id)   # list of tuples
-        if not raw_pts:
-            print(f"No points for method={method}, config_id={config_id}")
-            return
-        # convert to dicts expected by normalise()
-        points = [
-            dict(point_id=r[0], filename=r[1], artist=r[2], x=r[3], y=r[4],
-                 method=method, config_id=config_id)
-            for r in raw_pts
-        ]
-        # ── fetch DR hyperparameters and build an annotation string ────────────────
-        cfg_params = db.get_dr_config(method, config_id)
-        param_items = [
-            f"{key}={val}"
-            for key, val in cfg_params.items()
-            if key != "config_id"
-        ]
-        params_str = ", ".join(param_items)
-        label = f"{method.upper()} (config {config_id}): {params_str}"
-        # 2️⃣  Normalise coordinates
-        normed = normalise(points)
-        # 3️⃣  Decide thumbnail scaling
-        scale = 1.0
-        if len(normed) > MAX_IMAGES_BEFORE_SHRINK:
-            scale = math.sqrt(MAX_IMAGES_BEFORE_SHRINK / len(normed))
-            print(f"Shrinking thumbnails by factor {scale:.3f} ...")
-        # 4️⃣  Build mosaic
-        SCRIPT_DIR = Path(__file__).resolve().parent
-        OUT_DIR = SCRIPT_DIR / "assets" / "visualizations"
-        OUT_DIR.mkdir(parents=True, exist_ok=True)
-        out_file = OUT_DIR / f"{method}_{config_id}_{int(time.time())}.avif"
-        build_mosaic(normed, scale, out_file, label)
-        print(f"Wrote {out_file}")
-        # 5️⃣  Insert into viz_config and viz_points
-        point_id_blob = struct.pack(f"{len(points)}I", *(p["point_id"] for p in points))
-        viz_id = db.insert_viz_config(method, out_file.name, config_id, point_id_blob)
-        db.insert_viz_points(viz_id, normed)
-        print(f"Inserted viz_id={viz_id} with {len(normed)} points into DB.")
+    # One cache refresh per invocation; every mosaic below reads the same mapping
+    cached = not args.no_thumb_cache and THUMB_DIR.is_dir()
+    if cached:
+        s = thumbcache.update(THUMB_DIR)
+        print(f"Thumbnail cache: {s['files']:,} files, {s['decoded']:,} (re)decoded in {s['seconds']:.1f}s")
 
     # Batch mode: if --viz-config is provided and exists, process all entries
     if args.viz_config and os.path.exists(args.viz_config):
         with open(args.viz_config, "r") as f:
             viz_list = yaml.safe_load(f)
+        entries = []
         for entry in viz_list:
             method = entry.get("method")
             config_id = entry.get("config_id")
             if not method or config_id is None:
                 print(f"Skipping invalid entry: {entry}")
                 continue
-            print(f"\n=== Visualizing: method={method}, config_id={config_id} ===")
-            run_one(method, config_id)
+            entries.append((method, config_id))
+        budget = args.mem_budget_gb * 1024
+        print(f"Visualizing {len(entries)} runs on up to {args.workers} workers, "
+              f"~{render_mem_mib(args.tiles, args.canvas):,.0f} MiB each, "
+              f"{budget:,.0f} MiB budget")
+        res = render_batch(entries, args.workers, budget, args.log_dir, args.tiles, args.canvas,
+                           args.tile_format, args.threads, args.full, cached, args.avif_effort)
+        print(f"\n{len(res['ok'])} ok, {len(res['failed'])} failed in {res['wall']:.1f}s")
+        for label, err in res["failed"]:
+            print(f"  ❌ {label}: {err}")
+        return 1 if res["failed"] else 0
     elif args.method and args.config is not None:
-        run_one(args.method, args.config)
+        load = thumbcache.ThumbCache(THUMB_DIR).load if cached else mosaic.decode
+        render_one(args.method, args.config, args.tiles, args.canvas, args.tile_format,
+                   args.threads, args.full, load, args.avif_effort)
     else:
         print("Specify either --method and --config, or provide a viz config YAML file.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,204 @@
+# worker.py
+#!/usr/bin/env python3
+"""Long-lived run.py worker: JSON-line requests in, JSON-line replies out.
+
+    python run.py --serve                          # requests on stdin, replies on stdout
+    python run.py --serve --socket /tmp/dr.sock    # same protocol on a Unix socket
+    python run.py --serve --preload umap tsne      # import heavy methods up front
+
+One request per line, one reply line per request (``id`` is echoed back):
+
+    {"id": 1, "cmd": "run", "method": "umap", "config": "fast", "save_model": false,
+     "force": false, "metrics": false}
+    {"id": 1, "ok": true, "result": {"config_id": 42, "points": 250, ...},
+     "output": "<what the method printed>", "seconds": 0.81}
+    {"id": 2, "ok": false, "error": {"type": "UnknownConfig", "message": "...",
+     "traceback": "..."}, "output": "...", "seconds": 0.0}
+
+A run already recorded under the same hash comes back with ``"cached":
+true`` without refitting unless ``force``; a grid name returns ``"cells"``.
+Commands: ``run``; ``ping`` (pid, uptime, runs served, loaded methods,
+configs.yaml mtime, the run in progress and for how long); ``shutdown``.
+Imports, the database connection and the last few loaded subsets stay warm
+between requests; configs.yaml is re-read whenever its mtime changes.
+Requests are handled one at a time – run several workers for concurrency
+(server.js keeps a pool) – except that in stdin mode a ping is answered
+straight away, mid-run, so a health check can tell busy from hung. In stdin
+mode the process's own stdout is pointed at stderr so stray prints from
+native libraries cannot corrupt the reply stream.
+"""
+import io, json, os, queue, socketserver, sys, threading, time, traceback
+from collections import OrderedDict
+from contextlib import redirect_stdout
+
+import db, embstore
+import run as runner
+
+INPUT_CACHE_SIZE = int(os.environ.get("DR_WORKER_SUBSETS", 4))
+
+
+class Worker:
+    def __init__(self, preload=()):
+        self.started = time.time()
+        self.runs = 0
+        self.current = None                   # (label, start) of the request in progress
+        self.cfgs, self.cfgs_mtime = None, None
+        self.inputs = OrderedDict()           # spec key → (store state, load_inputs tuple)
+        self.reload_configs()
+        for method in preload:
+            runner.load_method(method)
+
+    def reload_configs(self) -> None:
+        mtime = os.stat("configs.yaml").st_mtime_ns
+        if mtime != self.cfgs_mtime:
+            self.cfgs, self.cfgs_mtime = runner.load_configs(), mtime
+
+    def load(self, spec: dict):
+        """runner.load_inputs, kept for the last few subsets until embeddings change."""
+        key = (spec["subset"], spec["size"], spec["seed"], spec["tier"], spec["pipeline"])
+        with db.conn() as c:
+            state = embstore.state(c)
+        hit = self.inputs.get(key)
+        if hit is not None and hit[0] == state:
+            self.inputs.move_to_end(key)
+            return hit[1]
+        inputs = runner.load_inputs(spec)
+        self.inputs[key] = (state, inputs)
+        while len(self.inputs) > INPUT_CACHE_SIZE:
+            self.inputs.popitem(last=False)
+        return inputs
+
+    def ping(self) -> dict:
+        current = self.current
+        return {"pid": os.getpid(), "uptime": round(time.time() - self.started, 3),
+                "runs": self.runs, "configs_mtime": self.cfgs_mtime,
+                "busy": current and current[0],
+                "busy_s": current and round(time.time() - current[1], 3),
+                "subsets_cached": len(self.inputs),
+                "methods": sorted(m[len("methods."):] for m in sys.modules
+                                  if m.startswith("methods.") and m != "methods.sklearn")}
+
+    def handle(self, req: dict) -> dict:
+        t0, out = time.time(), io.StringIO()
+        reply = {"id": req.get("id")}
+        try:
+            cmd = req.get("cmd", "run")
+            with redirect_stdout(out):
+                if cmd == "ping":
+                    result = self.ping()
+                elif cmd == "shutdown":
+                    result = {"pid": os.getpid()}
+                elif cmd == "run":
+                    self.reload_configs()
+                    if not req.get("method") or not req.get("config"):
+                        raise ValueError("run needs 'method' and 'config'")
+                    self.current = (f"{req['method']}:{req['config']}", t0)
+                    try:
+                        result = runner.run_config(req["method"], req["config"], self.cfgs,
+                                                   bool(req.get("save_model")), load=self.load,
+                                                   force=bool(req.get("force")),
+                                                   metrics=bool(req.get("metrics")))
+                    finally:
+                        self.current = None
+                    self.runs += 1
+                else:
+                    raise ValueError(f"Unknown cmd {cmd!r}; expected run, ping or shutdown")
+            reply.update(ok=True, result=result)
+        except Exception as e:
+            reply.update(ok=False, error={"type": type(e).__name__, "message": str(e),
+                                          "traceback": traceback.format_exc()})
+        reply.update(output=out.getvalue(), seconds=round(time.time() - t0, 3))
+        return reply
+
+    def handle_line(self, line: str):
+        """One request line → (reply line, stop?)."""
+        try:
+            req = json.loads(line)
+            if not isinstance(req, dict):
+                raise ValueError("request must be a JSON object")
+        except ValueError as e:
+            reply = {"id": None, "ok": False, "output": "", "seconds": 0.0,
+                     "error": {"type": "BadRequest", "message": str(e), "traceback": ""}}
+            return json.dumps(reply) + "\n", False
+        reply = self.handle(req)
+        return json.dumps(reply, default=str) + "\n", req.get("cmd") == "shutdown"
+
+
+def _ping_id(line: str):
+    """The id of a ping request line, else None (not a ping, or unparseable)."""
+    try:
+        req = json.loads(line)
+    except ValueError:
+        return None
+    if isinstance(req, dict) and req.get("cmd") == "ping" and req.get("id") is not None:
+        return req["id"]
+    return None
+
+
+def _serve_stdio(w: Worker) -> None:
+    replies = os.fdopen(os.dup(1), "w")
+    os.dup2(2, 1)                 # anything else written to fd 1 lands on stderr
+    sys.stdout = sys.stderr
+    lock = threading.Lock()
+
+    def send(reply: str) -> None:
+        with lock:
+            replies.write(reply)
+            replies.flush()
+
+    send(json.dumps({"id": None, "ok": True, "result": w.ping()}) + "\n")
+    # stdin is read on its own thread so a ping is answered while a run is
+    # going; it skips handle(), whose redirect_stdout would race the run's
+    todo = queue.Queue()
+
+    def read() -> None:
+        for line in sys.stdin:
+            if not line.strip():
+                continue
+            ping = _ping_id(line)
+            if ping is None:
+                todo.put(line)
+            else:
+                send(json.dumps({"id": ping, "ok": True, "result": w.ping(), "output": "",
+                                 "seconds": 0.0}) + "\n")
+        todo.put(None)
+
+    threading.Thread(target=read, daemon=True).start()
+    for line in iter(todo.get, None):
+        reply, stop = w.handle_line(line)
+        send(reply)
+        if stop:
+            break
+
+
+def _serve_socket(w: Worker, path: str) -> None:
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for raw in self.rfile:
+                if not raw.strip():
+                    continue
+                reply, stop = w.handle_line(raw.decode())
+                self.wfile.write(reply.encode())
+                self.wfile.flush()
+                if stop:
+                    # shutdown() blocks until serve_forever returns; don't wait on ourselves
+                    import threading
+                    threading.Thread(target=self.server.shutdown).start()
+                    return
+
+    if os.path.exists(path):
+        os.unlink(path)
+    with socketserver.UnixStreamServer(path, Handler) as server:
+        print(f"worker {os.getpid()} listening on {path}", file=sys.stderr)
+        try:
+            server.serve_forever()
+        finally:
+            os.unlink(path)
+
+
+def serve(socket_path=None, preload=()) -> None:
+    w = Worker(preload)
+    if socket_path:
+        _serve_socket(w, socket_path)
+    else:
+        _serve_stdio(w)